@@ -1,16 +1,16 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QPushButton, QFileDialog, QGroupBox,
                              QSpinBox, QComboBox, QMessageBox, QFormLayout, QCheckBox, 
                              QColorDialog, QRadioButton, QScrollArea)
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor
-from PIL import Image, ImageOps, ImageDraw
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.utils import ImageReader
+import cache
+import codificadores
+import engine
+import painel
+import worker
 import os
-import math
 
 #___________________________Splash Screen___________________________
 
@@ -21,9 +21,10 @@ class PhotoResizerApp(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Redimensionador de Fotos com Logo - By Hélio Tomé")
-        self.setGeometry(100, 100, 650, 680)
-        self.setMaximumSize(650, 680)
-        self.setMinimumSize(650, 680)
+        self.setGeometry(100, 100, 965, 680)
+        self.setMaximumSize(965, 680)
+        self.setMinimumSize(965, 680)
+        self.logo_previa = None
         
         self.setStyleSheet("""
             QGroupBox {
@@ -56,7 +57,13 @@ class PhotoResizerApp(QMainWindow):
         scroll = QScrollArea()
         scroll.setWidget(central_widget)
         scroll.setWidgetResizable(True)
-        self.setCentralWidget(scroll)
+        self.preview = painel.PainelPrevia(self.ler_configuracao, self.logo_da_previa)
+        window_widget = QWidget()
+        window_layout = QHBoxLayout(window_widget)
+        window_layout.setContentsMargins(0, 0, 10, 0)
+        window_layout.addWidget(scroll, 1)
+        window_layout.addWidget(self.preview)
+        self.setCentralWidget(window_widget)
         
         main_layout = QVBoxLayout(central_widget)
         main_layout.setSpacing(8)
@@ -70,6 +77,7 @@ class PhotoResizerApp(QMainWindow):
         self.origin_folder_btn.clicked.connect(self.select_origin_folder)
         self.origin_folder_label = QLabel("Nenhuma pasta selecionada")
         self.origin_folder_label.setWordWrap(True)
+        self.recursive_checkbox = QCheckBox("Incluir subpastas")
         
         self.dest_folder_btn = QPushButton("Selecionar Pasta de Destino")
         self.dest_folder_btn.clicked.connect(self.select_dest_folder)
@@ -83,6 +91,7 @@ class PhotoResizerApp(QMainWindow):
         
         input_layout.addWidget(self.origin_folder_btn)
         input_layout.addWidget(self.origin_folder_label)
+        input_layout.addWidget(self.recursive_checkbox)
         input_layout.addWidget(self.dest_folder_btn)
         input_layout.addWidget(self.dest_folder_label)
         input_layout.addWidget(self.logo_file_btn)
@@ -172,6 +181,21 @@ class PhotoResizerApp(QMainWindow):
         self.border_width_input.setValue(5)
         border_layout.addRow("Espessura (px):", self.border_width_input)
         
+        dash_layout = QHBoxLayout()
+        self.dash_length_input = QSpinBox()
+        self.dash_length_input.setRange(1, 200)
+        self.dash_length_input.setValue(6)
+        self.dash_gap_input = QSpinBox()
+        self.dash_gap_input.setRange(0, 200)
+        self.dash_gap_input.setValue(14)
+        self.dash_full_checkbox = QCheckBox("Espessura total")
+        dash_layout.addWidget(QLabel("Traço:"))
+        dash_layout.addWidget(self.dash_length_input)
+        dash_layout.addWidget(QLabel("Intervalo:"))
+        dash_layout.addWidget(self.dash_gap_input)
+        dash_layout.addWidget(self.dash_full_checkbox)
+        border_layout.addRow("Pontilhado (px):", dash_layout)
+        
         self.border_color_btn = QPushButton("Cor da Borda")
         self.border_color_btn.clicked.connect(self.select_border_color)
         self.border_color_preview = QLabel()
@@ -187,6 +211,34 @@ class PhotoResizerApp(QMainWindow):
         border_group.setLayout(border_layout)
         output_layout.addWidget(border_group)
         
+        # Output encoder settings
+        encoder_group = QGroupBox("Formato dos Arquivos")
+        encoder_layout = QFormLayout()
+        
+        self.output_format_combo = QComboBox()
+        for formato_saida in codificadores.formatos_disponiveis():
+            self.output_format_combo.addItem(codificadores.NOMES[formato_saida], formato_saida)
+        encoder_layout.addRow("Formato:", self.output_format_combo)
+        
+        quality_layout = QHBoxLayout()
+        self.quality_input = QSpinBox()
+        self.quality_input.setRange(1, 100)
+        self.quality_input.setValue(95)
+        self.progressive_checkbox = QCheckBox("JPEG progressivo")
+        quality_layout.addWidget(self.quality_input)
+        quality_layout.addWidget(self.progressive_checkbox)
+        encoder_layout.addRow("Qualidade:", quality_layout)
+        
+        self.size_limit_input = QSpinBox()
+        self.size_limit_input.setRange(0, 100000)
+        self.size_limit_input.setSingleStep(50)
+        self.size_limit_input.setSuffix(" KB")
+        self.size_limit_input.setSpecialValueText("Sem limite")
+        encoder_layout.addRow("Tamanho máximo:", self.size_limit_input)
+        
+        encoder_group.setLayout(encoder_layout)
+        output_layout.addWidget(encoder_group)
+        
         pdf_group = QGroupBox("Configurações de PDF")
         pdf_layout = QFormLayout()
         
@@ -199,6 +251,10 @@ class PhotoResizerApp(QMainWindow):
         self.pdf_filename_input.setText("fotos.pdf")
         pdf_layout.addRow("Nome do PDF:", self.pdf_filename_input)
         
+        self.cache_checkbox = QCheckBox("Reaproveitar imagens já processadas (cache)")
+        self.cache_checkbox.setChecked(True)
+        pdf_layout.addRow(self.cache_checkbox)
+        
         pdf_group.setLayout(pdf_layout)
         output_layout.addWidget(pdf_group)
         
@@ -214,6 +270,16 @@ class PhotoResizerApp(QMainWindow):
             min-height: 35px;
         """)
         
+        self.cancel_btn = QPushButton("CANCELAR")
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.setStyleSheet("padding: 8px; min-height: 35px;")
+        
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.process_btn, 3)
+        buttons_layout.addWidget(self.cancel_btn, 1)
+        self.worker = None
+        
         self.status_label = QLabel("Pronto para processar imagens")
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_label.setStyleSheet("font-weight: bold; padding: 5px;")
@@ -224,12 +290,36 @@ class PhotoResizerApp(QMainWindow):
         
         main_layout.addWidget(input_group)
         main_layout.addWidget(output_group)
-        main_layout.addWidget(self.process_btn)
+        main_layout.addLayout(buttons_layout)
         main_layout.addWidget(self.status_label)
         main_layout.addWidget(credit_label)
         
         self.toggle_border_controls(False)
 
+        for spin in (self.width_input, self.height_input, self.left_margin_input,
+                     self.right_margin_input, self.top_margin_input, self.bottom_margin_input,
+                     self.vertical_adjust_input, self.border_width_input, self.dash_length_input,
+                     self.dash_gap_input):
+            spin.valueChanged.connect(self.preview.agendar)
+        for combo in (self.dpi_input, self.logo_pos_combo):
+            combo.currentIndexChanged.connect(self.preview.agendar)
+        for checkbox in (self.border_checkbox, self.dash_full_checkbox):
+            checkbox.stateChanged.connect(self.preview.agendar)
+        self.border_type_dashed.toggled.connect(self.preview.agendar)
+        self.recursive_checkbox.stateChanged.connect(self.listar_amostras)
+
+    def logo_da_previa(self):
+        if not hasattr(self, 'logo_file'):
+            return None
+        mtime = os.path.getmtime(self.logo_file)
+        if self.logo_previa is None or self.logo_previa[:2] != (self.logo_file, mtime):
+            self.logo_previa = (self.logo_file, mtime, engine.carregar_logo(self.logo_file))
+        return self.logo_previa[2]
+
+    def listar_amostras(self, *_):
+        if hasattr(self, 'origin_folder'):
+            self.preview.listar(self.origin_folder)
+
     def set_default_values(self):
         self.width_input.setValue(10)
         self.height_input.setValue(15)
@@ -247,12 +337,16 @@ class PhotoResizerApp(QMainWindow):
         self.border_color_preview.setEnabled(enabled)
         self.border_type_solid.setEnabled(enabled)
         self.border_type_dashed.setEnabled(enabled)
+        self.dash_length_input.setEnabled(enabled)
+        self.dash_gap_input.setEnabled(enabled)
+        self.dash_full_checkbox.setEnabled(enabled)
 
     def select_border_color(self):
         color = QColorDialog.getColor()
         if color.isValid():
             self.border_color = color.name()
             self.border_color_preview.setStyleSheet(f"background-color: {self.border_color};")
+            self.preview.agendar()
 
     def select_origin_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Selecionar Pasta com Fotos")
@@ -260,6 +354,7 @@ class PhotoResizerApp(QMainWindow):
             self.origin_folder = folder
             self.origin_folder_label.setText(folder)
             self.origin_folder_label.setStyleSheet("color: green;")
+            self.listar_amostras()
 
     def select_dest_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Selecionar Pasta de Destino")
@@ -275,225 +370,143 @@ class PhotoResizerApp(QMainWindow):
             self.logo_file = file
             self.logo_file_label.setText(file)
             self.logo_file_label.setStyleSheet("color: green;")
+            self.preview.agendar()
 
-    def cm_to_pixels(self, cm, dpi):
-        return int((cm * dpi) / 2.54)
-    
-    def hex_to_rgb(self, hex_color):
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    
-    def corrigir_orientacao(self, imagem):
-        try:
-            exif = imagem._getexif()
-            if exif:
-                orientacao = exif.get(274)
-                if orientacao == 3:
-                    imagem = imagem.rotate(180, expand=True)
-                elif orientacao == 6:
-                    imagem = imagem.rotate(270, expand=True)
-                elif orientacao == 8:
-                    imagem = imagem.rotate(90, expand=True)
-        except (AttributeError, KeyError, IndexError):
-            pass
-        return imagem
-    
-    def redimensionar_mantendo_proporcao(self, imagem, novo_tamanho):
-        imagem.thumbnail(novo_tamanho, Image.LANCZOS)
-        nova_imagem = Image.new('RGB', novo_tamanho, 'white')
-        pos_x = (novo_tamanho[0] - imagem.width) // 2
-        pos_y = (novo_tamanho[1] - imagem.height) // 2
-        nova_imagem.paste(imagem, (pos_x, pos_y))
-        return nova_imagem
-    
-    def adicionar_borda_solida(self, imagem, espessura, cor):
-        if espessura <= 0:
-            return imagem
-        cor_rgb = self.hex_to_rgb(cor)
-        return ImageOps.expand(imagem, border=espessura, fill=cor_rgb)
-    
-    def adicionar_borda_pontilhada(self, imagem, espessura, cor):
-        if espessura <= 0:
-            return imagem
-            
-        cor_rgb = self.hex_to_rgb(cor)
-        largura, altura = imagem.size
-        
-        temp_img = ImageOps.expand(imagem, border=espessura, fill=cor_rgb)
-        draw = ImageDraw.Draw(temp_img)
-        
-        coords = [
-            (0, 0, largura + 2*espessura - 1, espessura - 1),
-            (0, altura + espessura, largura + 2*espessura - 1, altura + 2*espessura - 1),
-            (0, 0, espessura - 1, altura + 2*espessura - 1),
-            (largura + espessura, 0, largura + 2*espessura - 1, altura + 2*espessura - 1)
-        ]
-        
-        for coord in coords:
-            for i in range(0, max(coord[2]-coord[0], coord[3]-coord[1]), 10):
-                if i % 20 < 10:
-                    if coord[2] - coord[0] > coord[3] - coord[1]:
-                        draw.line([coord[0]+i, coord[1], coord[0]+i+5, coord[1]], fill="white")
-                    else:
-                        draw.line([coord[0], coord[1]+i, coord[0], coord[1]+i+5], fill="white")
-        
-        return temp_img
-    
-    def adicionar_borda(self, imagem, espessura, cor, pontilhada=False):
-        if pontilhada:
-            return self.adicionar_borda_pontilhada(imagem, espessura, cor)
-        else:
-            return self.adicionar_borda_solida(imagem, espessura, cor)
-    
-    def criar_pdf(self, imagens, pdf_path, dpi):
-        try:
-            a4_landscape = landscape(A4)
-            page_width, page_height = a4_landscape
-
-            width_cm = self.width_input.value()
-            height_cm = self.height_input.value()
-            img_width_pt = width_cm * 28.35
-            img_height_pt = height_cm * 28.35
-
-            margin = 28.35
-            space_between = 28.35
-
-            if (2 * img_width_pt + space_between + 2 * margin) > page_width:
-                QMessageBox.warning(self, "Aviso", 
-                    "As imagens são muito largas para caberem 2 por página. Será gerado 1 por página.")
-                img_per_page = 1
-            else:
-                img_per_page = 2
-
-            c = canvas.Canvas(pdf_path, pagesize=a4_landscape)
+    def ler_configuracao(self):
+        add_border = self.border_checkbox.isChecked()
+        return engine.Configuracao(
+            largura_cm=self.width_input.value(),
+            altura_cm=self.height_input.value(),
+            dpi=300 if self.dpi_input.currentText().startswith("300") else 72,
+            logo_file=getattr(self, 'logo_file', None),
+            logo_pos=self.logo_pos_combo.currentText(),
+            margem_esquerda=self.left_margin_input.value(),
+            margem_direita=self.right_margin_input.value(),
+            margem_superior=self.top_margin_input.value(),
+            margem_inferior=self.bottom_margin_input.value(),
+            ajuste_vertical=self.vertical_adjust_input.value(),
+            borda=add_border,
+            borda_espessura=self.border_width_input.value() if add_border else 0,
+            borda_cor=self.border_color if add_border else "#FFFFFF",
+            borda_pontilhada=self.border_type_dashed.isChecked() if add_border else False,
+            borda_traco=self.dash_length_input.value(),
+            borda_intervalo=self.dash_gap_input.value(),
+            borda_traco_cheio=self.dash_full_checkbox.isChecked(),
+            exportar_pdf=self.pdf_checkbox.isChecked(),
+            pdf_nome=self.pdf_filename_input.text(),
+            formato_saida=self.output_format_combo.currentData(),
+            qualidade=self.quality_input.value(),
+            jpeg_progressivo=self.progressive_checkbox.isChecked(),
+            tamanho_maximo_kb=self.size_limit_input.value(),
+            recursivo=self.recursive_checkbox.isChecked(),
+        )
 
-            for i in range(0, len(imagens), img_per_page):
-                if i > 0:
-                    c.showPage()
+    def atualizar_progresso(self, processadas, concluidas, total, taxa, eta):
+        self.status_label.setText(
+            f"Processando... {processadas} imagens processadas ({concluidas}/{total}) - "
+            f"{taxa:.1f} img/s - restante {worker.formatar_eta(eta if eta >= 0 else None)}")
 
-                for j in range(img_per_page):
-                    if i + j < len(imagens):
-                        img = ImageReader(imagens[i + j])
-                        
-                        if img_per_page == 2:
-                            x = margin + j * (img_width_pt + space_between)
-                        else:
-                            x = (page_width - img_width_pt) / 2
-                        
-                        y = page_height - margin - img_height_pt
-                        c.drawImage(img, x, y, width=img_width_pt, height=img_height_pt)
+    def mostrar_aviso(self, mensagem):
+        QMessageBox.warning(self, "Aviso", mensagem)
 
-            c.save()
-            return True
-        except Exception as e:
-            print(f"Erro ao criar PDF: {e}")
-            return False
-    
     def process_images(self):
         try:
             if not hasattr(self, 'origin_folder') or not hasattr(self, 'dest_folder') or not hasattr(self, 'logo_file'):
                 QMessageBox.warning(self, "Atenção", "Por favor, selecione todas as pastas e o arquivo do logo!")
                 return
                 
-            width_cm = self.width_input.value()
-            height_cm = self.height_input.value()
-            dpi = 300 if self.dpi_input.currentText().startswith("300") else 72
-            logo_pos = self.logo_pos_combo.currentText()
-            
-            add_border = self.border_checkbox.isChecked()
-            border_width = self.border_width_input.value() if add_border else 0
-            border_color = self.border_color if add_border else "#FFFFFF"
-            border_dashed = self.border_type_dashed.isChecked() if add_border else False
-            
-            export_pdf = self.pdf_checkbox.isChecked()
-            pdf_filename = self.pdf_filename_input.text()
-            if not pdf_filename.lower().endswith('.pdf'):
-                pdf_filename += '.pdf'
-            
-            left_margin = self.left_margin_input.value()
-            right_margin = self.right_margin_input.value()
-            top_margin = self.top_margin_input.value()
-            bottom_margin = self.bottom_margin_input.value()
-            vertical_adjust = self.vertical_adjust_input.value()
-            
-            width_px = self.cm_to_pixels(width_cm, dpi)
-            height_px = self.cm_to_pixels(height_cm, dpi)
-            tamanho_final = (width_px, height_px)
+            config = self.ler_configuracao()
             
             try:
-                logo = Image.open(self.logo_file).convert("RGBA")
+                logo = engine.carregar_logo(config.logo_file)
             except Exception as e:
                 QMessageBox.critical(self, "Erro", f"Não foi possível carregar o logo: {str(e)}")
                 return
             
-            os.makedirs(self.dest_folder, exist_ok=True)
-            
-            processed = 0
-            processed_images = []
-            
-            for arquivo in os.listdir(self.origin_folder):
-                if arquivo.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                    entrada = os.path.join(self.origin_folder, arquivo)
-                    saida = os.path.join(self.dest_folder, arquivo)
-                    
-                    try:
-                        with Image.open(entrada) as img:
-                            img = self.corrigir_orientacao(img)
-                            img = self.redimensionar_mantendo_proporcao(img, tamanho_final)
-                            
-                            if logo_pos == "Canto Inferior Direito":
-                                pos_x = img.width - logo.width - right_margin
-                                pos_y = img.height - logo.height - bottom_margin + vertical_adjust
-                            elif logo_pos == "Canto Inferior Esquerdo":
-                                pos_x = left_margin
-                                pos_y = img.height - logo.height - bottom_margin + vertical_adjust
-                            elif logo_pos == "Canto Superior Direito":
-                                pos_x = img.width - logo.width - right_margin
-                                pos_y = top_margin + vertical_adjust
-                            elif logo_pos == "Canto Superior Esquerdo":
-                                pos_x = left_margin
-                                pos_y = top_margin + vertical_adjust
-                            else:
-                                pos_x = (img.width - logo.width) // 2
-                                pos_y = (img.height - logo.height) // 2 + vertical_adjust
-                            
-                            pos_x = max(0, pos_x)
-                            pos_y = max(0, pos_y)
-                            
-                            img.paste(logo, (int(pos_x), int(pos_y)), logo)
-                            
-                            if add_border:
-                                img = self.adicionar_borda(img, border_width, border_color, border_dashed)
-                            
-                            img.save(saida, quality=95)
-                            processed += 1
-                            processed_images.append(saida)
-                            self.status_label.setText(f"Processando... {processed} imagens processadas")
-                            QApplication.processEvents()
-                            
-                    except Exception as e:
-                        print(f"Erro ao processar {arquivo}: {e}")
-            
-            if export_pdf and processed_images:
-                pdf_path = os.path.join(self.dest_folder, pdf_filename)
-                if self.criar_pdf(processed_images, pdf_path, dpi):
-                    pdf_msg = f"\nPDF criado: {pdf_filename}"
-                else:
-                    pdf_msg = "\nErro ao criar o PDF"
-            else:
-                pdf_msg = ""
+            self.worker = worker.ProcessamentoWorker(self.origin_folder, self.dest_folder, config, logo,
+                                                     trabalhadores=engine.TRABALHADORES_PADRAO,
+                                                     cache=cache.CacheSaida() if self.cache_checkbox.isChecked() else None,
+                                                     parent=self)
+            self.worker.progresso.connect(self.atualizar_progresso)
+            self.worker.aviso.connect(self.mostrar_aviso)
+            self.worker.concluido.connect(self.processamento_concluido)
+            self.worker.falhou.connect(self.processamento_falhou)
+            self.worker.finished.connect(self.worker.deleteLater)
             
-            QMessageBox.information(self, "Concluído", 
-                                  f"Processamento finalizado!\n{processed} imagens foram processadas e salvas em:\n{self.dest_folder}{pdf_msg}")
-            self.status_label.setText("Processamento concluído com sucesso!")
-            self.status_label.setStyleSheet("color: green; font-weight: bold;")
+            self.process_btn.setEnabled(False)
+            self.cancel_btn.setEnabled(True)
+            self.status_label.setText("Processando...")
+            self.status_label.setStyleSheet("font-weight: bold; padding: 5px;")
+            self.worker.start()
             
         except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Ocorreu um erro durante o processamento:\n{str(e)}")
-            self.status_label.setText("Erro durante o processamento")
-            self.status_label.setStyleSheet("color: red; font-weight: bold;")
+            self.processamento_falhou(str(e))
+
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.worker.cancelar()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelando após a imagem atual...")
+
+    def processamento_concluido(self, resultado):
+        self.finalizar_processamento()
+        
+        for arquivo, erro in resultado.erros:
+            print(f"Erro ao processar {arquivo}: {erro}")
+        
+        if resultado.cancelado:
+            QMessageBox.information(self, "Cancelado", 
+                                  f"Processamento cancelado.\n{resultado.processadas} imagens foram processadas e salvas em:\n{self.dest_folder}")
+            self.status_label.setText("Processamento cancelado")
+            self.status_label.setStyleSheet("color: #c60; font-weight: bold;")
+            return
+        
+        if resultado.pdf_path:
+            if resultado.pdf_ok:
+                pdf_msg = f"\nPDF criado: {os.path.basename(resultado.pdf_path)}"
+            else:
+                pdf_msg = "\nErro ao criar o PDF"
+        else:
+            pdf_msg = ""
+        
+        if resultado.cache_acertos or resultado.cache_falhas:
+            cache_msg = (f"\nCache: {resultado.cache_acertos} reaproveitadas, "
+                         f"{resultado.cache_falhas} processadas")
+        else:
+            cache_msg = ""
+        
+        if resultado.estagios:
+            estagios_msg = f"\nUtilização dos estágios: {worker.formatar_estagios(resultado.estagios)}"
+        else:
+            estagios_msg = ""
+        
+        relatorio_msg = worker.formatar_relatorio(resultado)
+        
+        QMessageBox.information(self, "Concluído", 
+                              f"Processamento finalizado!\n{resultado.processadas} imagens foram processadas e salvas em:\n{self.dest_folder}{pdf_msg}{cache_msg}{estagios_msg}{relatorio_msg}")
+        self.status_label.setText("Processamento concluído com sucesso!")
+        self.status_label.setStyleSheet("color: green; font-weight: bold;")
+
+    def processamento_falhou(self, mensagem):
+        self.finalizar_processamento()
+        QMessageBox.critical(self, "Erro", f"Ocorreu um erro durante o processamento:\n{mensagem}")
+        self.status_label.setText("Erro durante o processamento")
+        self.status_label.setStyleSheet("color: red; font-weight: bold;")
+
+    def finalizar_processamento(self):
+        self.process_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.worker = None
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.cancelar()
+            self.worker.wait()
+        self.preview.parar()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     window = PhotoResizerApp()
@@ -0,0 +1,496 @@
+"""
+Benchmark reproduzível do Redimensionador de Fotos
+
+Gera um corpus sintético determinístico (JPEG, PNG e BMP de vários
+tamanhos, JPEGs com todas as orientações EXIF e logos com transparência),
+mede as etapas isoladas (decodificação, redimensionamento, borda, logo,
+codificação, PDF) e lotes completos em 72 e 300 DPI com diferentes números
+de trabalhadores, e grava os resultados em JSON. Com ``--baseline`` os
+tempos são comparados com uma execução anterior e o comando termina com
+código 1 se algum ficar mais lento que a tolerância. Também mede a
+importação a frio de cada ponto de entrada (cli, servico e as interfaces
+gráficas) e termina com código 1 se alguma passar do orçamento.
+
+Exemplos:
+    python benchmark.py --saida resultados.json
+    python benchmark.py --rapido --baseline base.json --saida atual.json
+    python benchmark.py --so-importacao --orcamento-importacao cli=100
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import PIL
+from PIL import Image
+
+import codificadores
+import engine
+
+VERSAO = 1
+
+SEMENTE_PADRAO = 2024
+
+FORMATOS = ("JPEG", "JPEG", "JPEG", "PNG", "BMP")  # Proporção típica de uma pasta de fotos
+MEGAPIXELS = (2, 6, 12, 24)
+PROPORCOES = ((3, 2), (4, 3), (16, 9), (1, 1))
+EXTENSOES = {"JPEG": ".jpg", "PNG": ".png", "BMP": ".bmp"}
+TAG_ORIENTACAO = 0x0112
+
+MINIMO_REGRESSAO_S = 0.002  # Diferenças menores que isso são ruído de medição
+
+PASTA_PROGRAMA = os.path.dirname(os.path.abspath(__file__))
+
+# Orçamento (ms) da importação a frio de cada ponto de entrada; no executável
+# congelado essa importação se repete a cada vez que o programa é aberto
+ORCAMENTO_IMPORTACAO_MS = {
+    "cli": 120,
+    "servico": 120,
+    "app": 250,
+    "comSplash": 250,
+    "inter4": 250,
+}
+
+
+# -- Corpus sintético ---------------------------------------------------------
+
+def _textura(rng, tamanho, modo="RGB"):
+    """Imagem com variação suave e detalhes, gerada só a partir de ``rng``"""
+    bandas = len(modo)
+    pequena = Image.frombytes(modo, (48, 32), rng.randbytes(48 * 32 * bandas))
+    imagem = pequena.resize(tamanho, Image.BICUBIC)
+    detalhe = Image.frombytes("L", (tamanho[0] // 8 or 1, tamanho[1] // 8 or 1),
+                              rng.randbytes((tamanho[0] // 8 or 1) * (tamanho[1] // 8 or 1)))
+    detalhe = detalhe.resize(tamanho, Image.NEAREST).convert(modo)
+    return Image.blend(imagem, detalhe, 0.15)
+
+
+def especificacoes(quantidade, semente=SEMENTE_PADRAO, escala=1.0):
+    """Lista determinística das imagens do corpus: nome, formato, tamanho e orientação"""
+    rng = random.Random(semente)
+    itens = []
+    jpegs = 0
+    for i in range(quantidade):
+        formato = FORMATOS[i % len(FORMATOS)]
+        megapixels = rng.choice(MEGAPIXELS) * escala
+        proporcao_l, proporcao_a = rng.choice(PROPORCOES)
+        altura = int((megapixels * 1e6 * proporcao_a / proporcao_l) ** 0.5)
+        largura = int(altura * proporcao_l / proporcao_a)
+        if rng.random() < 0.3:
+            largura, altura = altura, largura  # Retrato
+        orientacao = 1
+        if formato == "JPEG":
+            orientacao = jpegs % 8 + 1  # As 8 orientações EXIF se repetem entre os JPEGs
+            jpegs += 1
+        itens.append({
+            "nome": f"{i:04d}{EXTENSOES[formato]}",
+            "formato": formato,
+            "tamanho": [max(16, largura), max(16, altura)],
+            "orientacao": orientacao,
+            "semente": rng.getrandbits(32),
+        })
+    return itens
+
+
+def gerar_logo(caminho, tamanho=(600, 240), semente=SEMENTE_PADRAO):
+    """Logo RGBA com transparência gradual e bordas recortadas"""
+    rng = random.Random(semente)
+    logo = _textura(rng, tamanho).convert("RGBA")
+    alfa = Image.linear_gradient("L").resize(tamanho).rotate(90, expand=False)
+    recorte = Image.new("L", tamanho, 0)
+    recorte.paste(255, (tamanho[0] // 10, tamanho[1] // 10, tamanho[0] * 9 // 10, tamanho[1] * 9 // 10))
+    logo.putalpha(Image.composite(alfa, recorte, recorte))
+    logo.save(caminho)
+    return caminho
+
+
+def gerar_corpus(pasta, quantidade, semente=SEMENTE_PADRAO, escala=1.0):
+    """Grava o corpus em ``pasta`` e retorna o manifesto (com o hash de cada arquivo)
+
+    Arquivos já existentes com o mesmo conteúdo esperado não são regravados.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    manifesto_path = os.path.join(pasta, "manifesto.json")
+    specs = especificacoes(quantidade, semente, escala)
+    if os.path.exists(manifesto_path):
+        with open(manifesto_path, encoding="utf-8") as f:
+            anterior = json.load(f)
+        if anterior.get("especificacoes") == specs:
+            return anterior
+
+    h_corpus = hashlib.blake2b(digest_size=16)
+    arquivos = {}
+    for spec in specs:
+        rng = random.Random(spec["semente"])
+        imagem = _textura(rng, tuple(spec["tamanho"]))
+        caminho = os.path.join(pasta, spec["nome"])
+        opcoes = {}
+        if spec["formato"] == "JPEG":
+            exif = Image.Exif()
+            exif[TAG_ORIENTACAO] = spec["orientacao"]
+            opcoes = {"quality": 90, "exif": exif}
+        imagem.save(caminho, spec["formato"], **opcoes)
+        with open(caminho, "rb") as f:
+            arquivos[spec["nome"]] = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        h_corpus.update(arquivos[spec["nome"]].encode("ascii"))
+
+    # O logo fica em uma subpasta, fora do lote
+    os.makedirs(os.path.join(pasta, "logo"), exist_ok=True)
+    gerar_logo(os.path.join(pasta, "logo", "logo.png"), semente=semente)
+
+    manifesto = {
+        "semente": semente,
+        "escala": escala,
+        "especificacoes": specs,
+        "arquivos": arquivos,
+        "hash": h_corpus.hexdigest(),
+        "logo": "logo/logo.png",
+    }
+    with open(manifesto_path, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, indent=1)
+    return manifesto
+
+
+# -- Medições -----------------------------------------------------------------
+
+def cronometrar(funcao, repeticoes, preparar=None):
+    """Executa ``funcao`` ``repeticoes`` vezes e resume os tempos
+
+    ``preparar`` gera, fora da medição, o argumento de cada execução (ex.:
+    uma cópia da imagem, para funções que a alteram no lugar).
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        argumentos = (preparar(),) if preparar else ()
+        inicio = time.perf_counter()
+        funcao(*argumentos)
+        tempos.append(time.perf_counter() - inicio)
+    return {"mediana_s": round(statistics.median(tempos), 6), "min_s": round(min(tempos), 6),
+            "repeticoes": repeticoes}
+
+
+def medir_etapas(pasta, logo, repeticoes):
+    """Tempo de cada etapa isolada sobre uma imagem JPEG grande do corpus, em 72 e 300 DPI"""
+    jpegs = sorted(nome for nome in os.listdir(pasta) if nome.endswith(".jpg"))
+    with open(os.path.join(pasta, max(jpegs, key=lambda n: os.path.getsize(os.path.join(pasta, n)))),
+              "rb") as f:
+        dados = f.read()
+
+    resultados = {}
+    for dpi in (72, 300):
+        config = engine.Configuracao(dpi=dpi, borda=True, borda_pontilhada=True, borda_espessura=8)
+        tamanho = config.tamanho_final
+
+        def decodificar():
+            with Image.open(io.BytesIO(dados)) as img:
+                return engine.decodificar_imagem(img, config)[0]
+
+        def decodificar_completa():
+            with Image.open(io.BytesIO(dados)) as img:
+                img = engine.corrigir_orientacao(img)
+                img.load()
+                return img
+
+        completa = decodificar_completa()
+        reduzida = decodificar()
+        final = reduzida.copy()
+        final.thumbnail(tamanho, Image.LANCZOS)
+        modelo = engine.ModeloSobreposicao(logo, config)
+        composta = modelo.aplicar(final)
+
+        def criar_pdf():
+            buffer = io.BytesIO()
+            composta.save(buffer, "JPEG", quality=95)
+            destino = tempfile.mkdtemp(prefix="bench-pdf-")
+            try:
+                engine.criar_pdf([buffer.getvalue()] * 20, os.path.join(destino, "b.pdf"),
+                                 config.largura_cm, config.altura_cm)
+            finally:
+                shutil.rmtree(destino, ignore_errors=True)
+
+        gap = engine.REDUCING_GAPS[config.reducao]
+        # nome -> (função, preparação do argumento); o redimensionamento altera a imagem no lugar
+        etapas = {
+            "decodificar_reduzida": (decodificar, None),
+            "decodificar_completa": (decodificar_completa, None),
+            "redimensionar_mantendo_proporcao": (
+                lambda img: engine.redimensionar_mantendo_proporcao(img, tamanho), completa.copy),
+            "redimensionar_thumbnail": (
+                lambda img: img.thumbnail(tamanho, Image.LANCZOS, reducing_gap=gap), reduzida.copy),
+            # Mesma transposição (orientação 6) antes e depois do redimensionamento
+            "orientar_completa": (lambda: engine.orientar(completa, 6), None),
+            "orientar_reduzida": (lambda: engine.orientar(final, 6), None),
+            "borda_solida": (lambda: engine.adicionar_borda_solida(final, 8, "#FF0000"), None),
+            "borda_pontilhada": (lambda: engine.adicionar_borda_pontilhada(final, 8, "#FF0000"), None),
+            "modelo_sobreposicao": (lambda: engine.ModeloSobreposicao(logo, config), None),
+            "aplicar_modelo": (lambda: modelo.aplicar(final), None),
+            "codificar_jpeg": (lambda: composta.save(io.BytesIO(), "JPEG", quality=95), None),
+            "criar_pdf_20_paginas": (criar_pdf, None),
+        }
+        # Cada perfil de codificação disponível, com as opções padrão da configuração
+        for formato_saida in codificadores.formatos_disponiveis():
+            formato = codificadores.FORMATOS_SAIDA[formato_saida]
+            if formato is not None:
+                opcoes = codificadores.opcoes(formato, config)
+                etapas[f"codificar_perfil_{formato_saida}"] = (
+                    lambda formato=formato, opcoes=opcoes: composta.save(io.BytesIO(), formato, **opcoes),
+                    None)
+        for nome, (funcao, preparar) in etapas.items():
+            print(f"  etapa {nome} ({dpi} DPI)", file=sys.stderr, flush=True)
+            resultados[f"{nome}/{dpi}"] = cronometrar(funcao, repeticoes, preparar)
+    return resultados
+
+
+def medir_lotes(pasta, logo_path, trabalhadores, modos, repeticoes):
+    """Tempo de lotes completos (com PDF) por DPI, modo e número de trabalhadores"""
+    logo = engine.carregar_logo(logo_path)
+    resultados = []
+    for dpi in (72, 300):
+        config = engine.Configuracao(dpi=dpi, logo_file=logo_path, borda=True,
+                                     borda_pontilhada=True)
+        for modo in modos:
+            base = None
+            for n in trabalhadores:
+                destino = tempfile.mkdtemp(prefix="bench-lote-")
+                tempos = []
+                try:
+                    for _ in range(repeticoes):
+                        inicio = time.perf_counter()
+                        resultado = engine.processar_lote(pasta, destino, config, logo=logo,
+                                                          trabalhadores=n, modo=modo)
+                        tempos.append(time.perf_counter() - inicio)
+                finally:
+                    shutil.rmtree(destino, ignore_errors=True)
+                tempo = statistics.median(tempos)
+                base = base or tempo
+                print(f"  lote {dpi} DPI, {modo}, {n} trabalhadores: {tempo:.2f} s",
+                      file=sys.stderr, flush=True)
+                resultados.append({
+                    "dpi": dpi, "modo": modo, "trabalhadores": n,
+                    "tempo_s": round(tempo, 4),
+                    "imagens_s": round(resultado.processadas / tempo, 2),
+                    "aceleracao": round(base / tempo, 2),
+                    "erros": len(resultado.erros),
+                })
+    return resultados
+
+
+def medir_importacao(modulo, repeticoes):
+    """Tempo da importação a frio de um ponto de entrada, cada vez em um interpretador novo
+
+    Usa ``python -X importtime``, que mede só a importação (sem a partida do
+    interpretador). Se a importação falhar (ex.: PyQt5 ausente), retorna o erro.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        processo = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                                  cwd=PASTA_PROGRAMA, capture_output=True, text=True)
+        if processo.returncode != 0:
+            linhas = processo.stderr.strip().splitlines()
+            return {"erro": linhas[-1] if linhas else f"código {processo.returncode}"}
+        for linha in processo.stderr.splitlines():
+            partes = linha.split("|")
+            # A linha do próprio módulo é a única sem recuo no nome
+            if len(partes) == 3 and partes[2] == f" {modulo}":
+                tempos.append(int(partes[1]) / 1e6)
+    return {"mediana_s": round(statistics.median(tempos), 6), "min_s": round(min(tempos), 6),
+            "repeticoes": repeticoes}
+
+
+def verificar_orcamento(importacao, orcamento_ms):
+    """Pontos de entrada cuja importação (mediana) passou do orçamento, em ms"""
+    estourados = {}
+    for modulo, dados in importacao.items():
+        limite = orcamento_ms.get(modulo)
+        if limite is not None and "mediana_s" in dados and dados["mediana_s"] * 1000 > limite:
+            estourados[modulo] = {"mediana_ms": round(dados["mediana_s"] * 1000, 1),
+                                  "orcamento_ms": limite}
+    return estourados
+
+
+# -- Comparação com a referência ---------------------------------------------
+
+def metricas(resultados):
+    """Tempos de um resultado como {nome da métrica: segundos}
+
+    Das etapas é usado o menor tempo, menos sensível a interrupções do sistema.
+    A importação dos pontos de entrada fica de fora: é verificada pelo
+    orçamento fixo (ORCAMENTO_IMPORTACAO_MS), não contra a referência.
+    """
+    valores = {f"etapa/{nome}": dados["min_s"] for nome, dados in resultados["etapas"].items()}
+    for lote in resultados["lotes"]:
+        valores[f"lote/{lote['dpi']}/{lote['modo']}/{lote['trabalhadores']}"] = lote["tempo_s"]
+    return valores
+
+
+def comparar(atual, referencia, tolerancia, minimo_s=MINIMO_REGRESSAO_S):
+    """Razão atual/referência de cada métrica comum
+
+    É regressão quando o tempo cresce mais que ``tolerancia`` (fração) e
+    mais que ``minimo_s`` segundos, para que etapas de microssegundos não
+    acusem ruído de medição.
+    """
+    atuais, anteriores = metricas(atual), metricas(referencia)
+    comparacao = {}
+    for nome in sorted(set(atuais) & set(anteriores)):
+        if not anteriores[nome]:
+            continue
+        razao = atuais[nome] / anteriores[nome]
+        regressao = razao > 1 + tolerancia and atuais[nome] - anteriores[nome] > minimo_s
+        comparacao[nome] = {"atual_s": atuais[nome], "referencia_s": anteriores[nome],
+                            "razao": round(razao, 3), "regressao": regressao}
+    return comparacao
+
+
+def info_maquina():
+    return {
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+    }
+
+
+def ler_orcamento(texto):
+    """Converte "cli=120,app=300" em {"cli": 120, "app": 300}"""
+    orcamento = {}
+    for parte in texto.split(","):
+        modulo, _, valor = parte.partition("=")
+        try:
+            orcamento[modulo.strip()] = float(valor)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"orçamento inválido: {parte!r} (use modulo=ms)")
+    return orcamento
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do processamento de fotos")
+    parser.add_argument("--saida", default="benchmark.json", help="Arquivo JSON dos resultados")
+    parser.add_argument("--baseline", help="Resultados anteriores para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.10,
+                        help="Aumento de tempo aceito antes de acusar regressão (padrão: 0.10)")
+    parser.add_argument("--corpus", help="Pasta do corpus (padrão: pasta temporária reaproveitada)")
+    parser.add_argument("--imagens", type=int, default=40, help="Imagens no corpus")
+    parser.add_argument("--semente", type=int, default=SEMENTE_PADRAO)
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help="Multiplica os megapixels das imagens (ex.: 0.1 para CI)")
+    parser.add_argument("--trabalhadores", default=None,
+                        help="Números de trabalhadores separados por vírgula (padrão: 1, 2, 4... até os núcleos)")
+    parser.add_argument("--modos", default="estagios,processos",
+                        help=f"Modos de execução separados por vírgula ({', '.join(engine.MODOS_EXECUCAO)})")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Repetições de cada etapa")
+    parser.add_argument("--repeticoes-lote", type=int, default=1, help="Repetições de cada lote")
+    parser.add_argument("--repeticoes-importacao", type=int, default=5,
+                        help="Importações a frio de cada ponto de entrada")
+    parser.add_argument("--orcamento-importacao", type=ler_orcamento, default={},
+                        help="Orçamento de importação em ms por ponto de entrada, ex.: cli=120,app=300 "
+                             "(padrão: " + ",".join(f"{m}={ms}" for m, ms in ORCAMENTO_IMPORTACAO_MS.items())
+                             + ")")
+    parser.add_argument("--so-importacao", action="store_true",
+                        help="Mede só a importação dos pontos de entrada, sem corpus nem lotes")
+    parser.add_argument("--rapido", action="store_true",
+                        help="Corpus pequeno e menos repetições (para CI)")
+    args = parser.parse_args(argv)
+
+    if args.rapido:
+        args.imagens = min(args.imagens, 10)
+        args.escala = min(args.escala, 0.25)
+        args.repeticoes = min(args.repeticoes, 3)
+        args.repeticoes_importacao = min(args.repeticoes_importacao, 3)
+    orcamento = {**ORCAMENTO_IMPORTACAO_MS, **args.orcamento_importacao}
+
+    if args.trabalhadores:
+        trabalhadores = [int(n) for n in args.trabalhadores.split(",")]
+    else:
+        trabalhadores, n = [], 1
+        while n < engine.TRABALHADORES_PADRAO:
+            trabalhadores.append(n)
+            n *= 2
+        trabalhadores.append(engine.TRABALHADORES_PADRAO)
+    modos = args.modos.split(",")
+    for modo in modos:
+        if modo not in engine.MODOS_EXECUCAO:
+            parser.error(f"modo desconhecido: {modo}")
+
+    corpus, etapas, lotes = None, {}, []
+    if not args.so_importacao:
+        pasta = args.corpus or os.path.join(
+            tempfile.gettempdir(), f"photoresizer-corpus-{args.semente}-{args.imagens}-{args.escala:g}")
+        print(f"Gerando corpus em {pasta}", file=sys.stderr, flush=True)
+        manifesto = gerar_corpus(pasta, args.imagens, args.semente, args.escala)
+        corpus = {"imagens": args.imagens, "semente": args.semente, "escala": args.escala,
+                  "hash": manifesto["hash"]}
+        logo_path = os.path.join(pasta, *manifesto["logo"].split("/"))
+        logo = engine.carregar_logo(logo_path)
+
+        print("Medindo etapas", file=sys.stderr, flush=True)
+        etapas = medir_etapas(pasta, logo, args.repeticoes)
+        print("Medindo lotes", file=sys.stderr, flush=True)
+        lotes = medir_lotes(pasta, logo_path, trabalhadores, modos, args.repeticoes_lote)
+
+    print("Medindo importações", file=sys.stderr, flush=True)
+    importacao = {}
+    for modulo in orcamento:
+        importacao[modulo] = medir_importacao(modulo, args.repeticoes_importacao)
+        if "erro" in importacao[modulo]:
+            print(f"  {modulo}: não importa ({importacao[modulo]['erro']})", file=sys.stderr)
+        else:
+            print(f"  {modulo}: {importacao[modulo]['mediana_s'] * 1000:.1f} ms "
+                  f"(orçamento {orcamento[modulo]} ms)", file=sys.stderr, flush=True)
+
+    resultados = {
+        "versao": VERSAO,
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "maquina": info_maquina(),
+        "corpus": corpus,
+        "etapas": etapas,
+        "lotes": lotes,
+        "importacao": importacao,
+        "orcamento_importacao_ms": orcamento,
+    }
+
+    codigo = 0
+    estourados = verificar_orcamento(importacao, orcamento)
+    if estourados:
+        resultados["orcamento_estourado"] = estourados
+        for modulo, dados in estourados.items():
+            print(f"ORÇAMENTO: importar {modulo} levou {dados['mediana_ms']} ms "
+                  f"(limite {dados['orcamento_ms']} ms)", file=sys.stderr)
+        codigo = 1
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            referencia = json.load(f)
+        if corpus and (referencia.get("corpus") or {}).get("hash") != corpus["hash"]:
+            print("Aviso: o corpus da referência é diferente (outra semente, escala ou versão "
+                  "do Pillow); a comparação não é exata", file=sys.stderr)
+        resultados["comparacao"] = comparar(resultados, referencia, args.tolerancia)
+        regressoes = [nome for nome, dados in resultados["comparacao"].items() if dados["regressao"]]
+        for nome, dados in resultados["comparacao"].items():
+            marca = "  REGRESSÃO" if dados["regressao"] else ""
+            print(f"{nome}: {dados['referencia_s']:.4f} s -> {dados['atual_s']:.4f} s "
+                  f"({dados['razao']:.2f}x){marca}", file=sys.stderr)
+        if regressoes:
+            codigo = 1
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=1, ensure_ascii=False)
+    print(f"Resultados gravados em {args.saida}", file=sys.stderr)
+    return codigo
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
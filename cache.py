@@ -0,0 +1,151 @@
+"""
+Cache de saída entre execuções
+
+Cada imagem processada é guardada com uma chave formada pelo hash do
+conteúdo da imagem de origem e por uma assinatura canônica de todas as
+configurações que alteram o resultado (tamanho, DPI, logo, margens, borda,
+formato de saída). Ao reprocessar uma pasta, as imagens cujo conteúdo e
+configurações não mudaram são copiadas (ou ligadas por hardlink) do cache
+em vez de decodificadas e codificadas de novo.
+
+O cache tem um limite de tamanho; quando é ultrapassado, as entradas usadas
+há mais tempo são removidas (LRU pela data de modificação, atualizada a
+cada acerto).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+# Incrementar quando o processamento mudar de forma a alterar as imagens geradas
+VERSAO_CACHE = 3
+
+LIMITE_PADRAO_MB = 2048
+
+# Campos da Configuracao que não alteram as imagens geradas
+CAMPOS_IGNORADOS = {"logo_file", "exportar_pdf", "pdf_nome", "exportar_relatorio",
+                    "relatorio_nome", "medir_reducao", "recursivo", "incluir", "excluir",
+                    "limite_megapixels"}
+
+
+def pasta_padrao():
+    """Pasta de cache do usuário (LOCALAPPDATA no Windows, XDG_CACHE_HOME nos demais)"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "PhotoResizer", "saida")
+
+
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """Hash do conteúdo de um arquivo"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def hash_dados(dados):
+    """Hash de um conteúdo já em memória (igual ao de hash_arquivo)"""
+    return hashlib.blake2b(dados, digest_size=20).hexdigest()
+
+
+def assinatura_configuracao(config, logo):
+    """Hash canônico das configurações e do logo usados no lote"""
+    dados = {chave: valor for chave, valor in config.para_dict().items()
+             if chave not in CAMPOS_IGNORADOS}
+    dados["versao"] = VERSAO_CACHE
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps(dados, sort_keys=True).encode("utf-8"))
+    h.update(repr((logo.mode, logo.size)).encode("utf-8"))
+    h.update(logo.tobytes())
+    if config.gerenciar_cores:
+        import cores  # Importado só aqui: carrega o Pillow, que o resto do cache não usa
+        # O arquivo do perfil de saída pode mudar sem mudar de nome
+        h.update(cores.dados_perfil_saida(config.perfil_cores) or b"")
+    return h.hexdigest()
+
+
+class CacheSaida:
+    """Cache de imagens processadas em disco, limitado por tamanho"""
+
+    def __init__(self, pasta=None, limite_mb=LIMITE_PADRAO_MB):
+        self.pasta = pasta or pasta_padrao()
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def chave(self, entrada, assinatura, saida, dados=None):
+        """Chave de uma imagem: conteúdo da origem + configurações + extensão de saída
+
+        ``dados`` evita reler a origem quando o conteúdo já está em memória.
+        """
+        extensao = os.path.splitext(saida)[1].lower()
+        conteudo = hash_dados(dados) if dados is not None else hash_arquivo(entrada)
+        return f"{conteudo}-{assinatura[:20]}{extensao}"
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, chave[:2], chave)
+
+    def recuperar(self, chave, saida):
+        """Coloca a imagem em cache em ``saida``; retorna False se não existir"""
+        caminho = self._caminho(chave)
+        if not os.path.exists(caminho):
+            return False
+        temporario = f"{saida}.{os.urandom(16).hex()}.tmp"
+        try:
+            try:
+                os.link(caminho, temporario)
+            except OSError:
+                shutil.copyfile(caminho, temporario)
+            os.replace(temporario, saida)
+            os.utime(caminho)  # Marca como usada recentemente
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return False
+        return True
+
+    def guardar(self, chave, saida):
+        """Copia uma imagem recém-gerada para o cache"""
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.urandom(16).hex()}.tmp"
+        try:
+            shutil.copyfile(saida, temporario)
+            os.replace(temporario, caminho)
+        except OSError:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def podar(self):
+        """Remove as entradas menos usadas até o cache caber no limite
+
+        Retorna o número de entradas removidas.
+        """
+        entradas = []
+        total = 0
+        for subpasta in os.scandir(self.pasta):
+            if not subpasta.is_dir():
+                continue
+            for entrada in os.scandir(subpasta.path):
+                if entrada.name.endswith(".tmp"):
+                    continue
+                info = entrada.stat()
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+
+        removidas = 0
+        entradas.sort()
+        for _, tamanho, caminho in entradas:
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                continue
+            total -= tamanho
+            removidas += 1
+        return removidas
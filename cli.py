@@ -0,0 +1,341 @@
+"""
+Linha de comando do Redimensionador de Fotos
+
+Executa o mesmo processamento da interface gráfica sem carregar o Qt.
+O progresso é impresso em stdout como uma linha JSON por evento.
+
+Exemplos:
+    python cli.py fotos/ saida/ --logo logo.png --dpi 72 --sem-pdf
+    python cli.py --job lote.json
+    python cli.py --job entregas.json      (com "saidas": várias versões de cada foto)
+    python cli.py entrada/ saida/ --logo logo.png --vigiar
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+import cache
+import codificadores
+import cores
+import engine
+import relatorio
+import vigia
+
+
+def emitir(evento, **dados):
+    """Imprime um evento de progresso como uma linha JSON"""
+    dados["evento"] = evento
+    print(json.dumps(dados, ensure_ascii=False), flush=True)
+
+
+def ler_estagios(texto):
+    """Converte "leitura=8,gravacao=4" em {"leitura": 8, "gravacao": 4}"""
+    estagios = {}
+    for parte in texto.split(","):
+        nome, _, valor = parte.partition("=")
+        try:
+            estagios[nome.strip()] = int(valor)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"estágio inválido: {parte!r} (use nome=N)")
+    return estagios
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description="Redimensiona fotos, aplica logo/borda e exporta PDF sem interface gráfica")
+    parser.add_argument("origem", nargs="?", help="Pasta com as fotos")
+    parser.add_argument("destino", nargs="?", help="Pasta de destino")
+    parser.add_argument("--job", help="Arquivo JSON com origem, destino e configurações")
+    parser.add_argument("--logo", dest="logo_file", help="Arquivo do logo")
+    parser.add_argument("--largura", dest="largura_cm", type=int, help="Largura em cm")
+    parser.add_argument("--altura", dest="altura_cm", type=int, help="Altura em cm")
+    parser.add_argument("--dpi", type=int, choices=[72, 300])
+    parser.add_argument("--posicao", dest="logo_pos", choices=engine.POSICOES_LOGO,
+                        help="Posição do logo")
+    parser.add_argument("--margem-esquerda", dest="margem_esquerda", type=int)
+    parser.add_argument("--margem-direita", dest="margem_direita", type=int)
+    parser.add_argument("--margem-superior", dest="margem_superior", type=int)
+    parser.add_argument("--margem-inferior", dest="margem_inferior", type=int)
+    parser.add_argument("--ajuste-vertical", dest="ajuste_vertical", type=int)
+    parser.add_argument("--borda", dest="borda", action="store_const", const=True,
+                        help="Adiciona borda às imagens")
+    parser.add_argument("--borda-espessura", dest="borda_espessura", type=int)
+    parser.add_argument("--borda-cor", dest="borda_cor", help="Cor da borda (#RRGGBB)")
+    parser.add_argument("--borda-pontilhada", dest="borda_pontilhada",
+                        action="store_const", const=True)
+    parser.add_argument("--borda-traco", dest="borda_traco", type=int,
+                        help="Comprimento dos traços da borda pontilhada (px)")
+    parser.add_argument("--borda-intervalo", dest="borda_intervalo", type=int,
+                        help="Espaço entre os traços da borda pontilhada (px)")
+    parser.add_argument("--borda-traco-cheio", dest="borda_traco_cheio",
+                        action="store_const", const=True,
+                        help="Traços na espessura total da borda")
+    parser.add_argument("--recursivo", dest="recursivo", action="store_const", const=True,
+                        help="Inclui as subpastas da origem, recriando-as no destino")
+    parser.add_argument("--incluir", dest="incluir", action="append", metavar="PADRAO",
+                        help="Processa só os arquivos que correspondem ao padrão glob (repetível)")
+    parser.add_argument("--excluir", dest="excluir", action="append", metavar="PADRAO",
+                        help="Ignora arquivos e subpastas que correspondem ao padrão glob (repetível)")
+    parser.add_argument("--sem-pdf", dest="exportar_pdf", action="store_const", const=False,
+                        help="Não exporta o PDF")
+    parser.add_argument("--pdf-nome", dest="pdf_nome", help="Nome do arquivo PDF")
+    parser.add_argument("--formato-saida", dest="formato_saida",
+                        choices=list(codificadores.FORMATOS_SAIDA),
+                        help="Formato das imagens geradas (padrão: o mesmo da origem)")
+    parser.add_argument("--qualidade", type=int, help="Qualidade de JPEG, WebP e AVIF (1-100, padrão: 95)")
+    parser.add_argument("--jpeg-progressivo", dest="jpeg_progressivo", action="store_const",
+                        const=True, help="Grava JPEGs progressivos")
+    parser.add_argument("--jpeg-sem-otimizar", dest="jpeg_otimizado", action="store_const",
+                        const=False, help="Não otimiza as tabelas de Huffman dos JPEGs")
+    parser.add_argument("--subamostragem", choices=codificadores.SUBAMOSTRAGENS,
+                        help="Subamostragem de croma dos JPEGs (padrão: 4:2:0)")
+    parser.add_argument("--compressao-png", dest="compressao_png",
+                        choices=list(codificadores.COMPRESSOES_PNG),
+                        help="Compressão dos PNGs (padrão: equilibrada)")
+    parser.add_argument("--tamanho-maximo", dest="tamanho_maximo_kb", type=int, metavar="KB",
+                        help="Tamanho máximo de cada JPEG/WebP: grava a maior qualidade que cabe")
+    parser.add_argument("--tamanho-alvo", dest="tamanho_alvo_kb", type=int, metavar="KB",
+                        help="Tamanho alvo de cada JPEG/WebP: para na primeira qualidade até 5%% abaixo")
+    parser.add_argument("--qualidade-minima", dest="qualidade_minima", type=int,
+                        help="Menor qualidade aceita para caber no limite (padrão: 40)")
+    parser.add_argument("--sem-relatorio", dest="exportar_relatorio", action="store_const",
+                        const=False, help="Não grava o relatório JSON da execução no destino")
+    parser.add_argument("--relatorio-nome", dest="relatorio_nome",
+                        help="Nome do relatório JSON da execução (padrão: relatorio.json)")
+    parser.add_argument("--decodificacao-completa", dest="decodificacao_reduzida",
+                        action="store_const", const=False,
+                        help="Decodifica JPEGs em resolução total antes de redimensionar")
+    parser.add_argument("--reducao", choices=list(engine.REDUCING_GAPS),
+                        help="Qualidade x velocidade do redimensionamento (padrão: equilibrada)")
+    parser.add_argument("--memoria-maxima", dest="memoria_maxima_mb", type=int, metavar="MB",
+                        help="Memória máxima por imagem; acima dela PNG, BMP e TIFF são lidos "
+                             "em faixas (padrão: 512, 0 = sem limite)")
+    parser.add_argument("--limite-megapixels", dest="limite_megapixels", type=int, metavar="MP",
+                        help="Recusa imagens maiores que isso (padrão: 1000, 0 = sem limite)")
+    parser.add_argument("--perfil-cores", dest="perfil_cores", metavar="ARQUIVO",
+                        help="Perfil ICC de saída (.icc/.icm; padrão: srgb)")
+    parser.add_argument("--intencao-cores", dest="intencao_cores", choices=list(cores.INTENCOES),
+                        help="Intenção de renderização da conversão de cores (padrão: perceptual)")
+    parser.add_argument("--sem-gerenciar-cores", dest="gerenciar_cores", action="store_const",
+                        const=False, help="Ignora os perfis ICC das fotos (conversão simples para RGB)")
+    parser.add_argument("--medir-reducao", dest="medir_reducao", action="store_const", const=True,
+                        help="Mede o ganho da pré-redução por formato; faz um segundo LANCZOS "
+                             "sem pré-redução em cada imagem, o que deixa o lote mais lento")
+    parser.add_argument("--cache", dest="cache_pasta",
+                        help=f"Pasta do cache de saída (padrão: {cache.pasta_padrao()})")
+    parser.add_argument("--cache-limite-mb", type=int, default=cache.LIMITE_PADRAO_MB,
+                        help="Tamanho máximo do cache em MB")
+    parser.add_argument("--sem-cache", action="store_true", help="Não usa o cache de saída")
+    parser.add_argument("--trabalhadores", type=int,
+                        help=f"Imagens processadas em paralelo (padrão: {engine.TRABALHADORES_PADRAO})")
+    parser.add_argument("--modo", choices=engine.MODOS_EXECUCAO,
+                        help="Pool de processos (padrão), de threads ou pipeline em estágios")
+    parser.add_argument("--estagios", type=ler_estagios,
+                        help="Threads por estágio no modo estagios, ex.: leitura=8,gravacao=4 "
+                             f"(estágios: {', '.join(engine.ESTAGIOS)})")
+    parser.add_argument("--vigiar", action="store_true",
+                        help="Fica vigiando a origem e processa cada foto nova assim que a cópia "
+                             "termina (sem PDF); encerre com Ctrl+C")
+    parser.add_argument("--estabilizacao", type=float, default=vigia.ESTABILIZACAO_S,
+                        help="Segundos sem mudanças para considerar uma foto copiada (--vigiar)")
+    parser.add_argument("--intervalo-varredura", type=float, default=vigia.INTERVALO_VARREDURA_S,
+                        help="Segundos entre varreduras da origem quando não há inotify (--vigiar)")
+    return parser
+
+
+def montar_versoes(saidas, destino, base):
+    """Versões de um job com "saidas": cada uma sobrepõe suas chaves às do job
+
+    O destino de cada versão é relativo ao destino do job, quando houver.
+    """
+    if not isinstance(saidas, list) or not saidas:
+        raise ValueError('"saidas" precisa ser uma lista com ao menos uma versão')
+    versoes = []
+    for numero, saida in enumerate(saidas, 1):
+        saida = dict(saida)
+        nome = saida.pop("nome", None) or f"versao{numero}"
+        destino_versao = saida.pop("destino", None)
+        if not destino_versao:
+            raise ValueError(f"A versão {nome} não tem destino")
+        if destino:
+            destino_versao = os.path.join(destino, destino_versao)
+        config = engine.Configuracao.de_dict({**base, **saida})
+        codificadores.validar(config)
+        versoes.append(engine.VersaoLote(destino_versao, config, nome))
+    return versoes
+
+
+def montar_job(args):
+    """Combina o arquivo de job com as opções da linha de comando
+
+    Retorna origem, destino, configuração, execução e as versões (vazia sem
+    "saidas" no job).
+    """
+    job = {}
+    if args.job:
+        with open(args.job, encoding="utf-8") as f:
+            job = json.load(f)
+
+    origem = args.origem or job.get("origem")
+    destino = args.destino or job.get("destino")
+    execucao = {
+        "trabalhadores": args.trabalhadores or job.get("trabalhadores", engine.TRABALHADORES_PADRAO),
+        "modo": args.modo or job.get("modo", "processos"),
+    }
+    ajustes = {**job.get("estagios", {}), **(args.estagios or {})}
+    if execucao["modo"] == "estagios":
+        execucao["estagios"] = engine.trabalhadores_estagios(execucao["trabalhadores"], **ajustes)
+    saidas = job.pop("saidas", None)
+    for chave in ("origem", "destino", "trabalhadores", "modo", "estagios"):
+        job.pop(chave, None)
+
+    campos = engine.Configuracao.__dataclass_fields__
+    for nome in campos:
+        valor = getattr(args, nome, None)
+        if valor is not None:
+            job[nome] = valor
+
+    versoes = montar_versoes(saidas, destino, job) if saidas is not None else []
+    return origem, destino, engine.Configuracao.de_dict(job), execucao, versoes
+
+
+def vigiar(origem, destino, config, logo, cache_saida, execucao, args):
+    """Processa continuamente as fotos que chegam na origem, até SIGINT/SIGTERM
+
+    O logo, o modelo de sobreposição e as threads dos estágios ficam prontos
+    entre uma chegada e outra. Cada foto gera um evento "processada" (ou
+    "erro") com a latência desde que o arquivo foi visto na origem.
+    """
+    parar = threading.Event()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sinal, lambda *_: parar.set())
+
+    os.makedirs(destino, exist_ok=True)
+    vigiada = vigia.VigiaPasta(origem, config.recursivo, config.incluir, config.excluir,
+                               ignorar=(destino,), estabilizacao=args.estabilizacao,
+                               intervalo=args.intervalo_varredura)
+    pastas = set()
+    saidas = {}
+    tarefas = (engine.montar_tarefa(origem, destino, relativo, formato, pastas,
+                                    config.formato_saida, saidas)
+               for relativo, formato in vigiada.arquivos(parar))
+    estagios = execucao.get("estagios") or engine.trabalhadores_estagios(execucao["trabalhadores"])
+    resultados = engine.processar_fluxo(tarefas, config, logo=logo, cache=cache_saida,
+                                        estagios=estagios)
+
+    emitir("vigiando", origem=origem, destino=destino, modo=vigiada.modo,
+           config=config.para_dict())
+    processadas = erros = 0
+    try:
+        for arquivo, saida, erro, medidas in resultados:
+            inicio = vigiada.detectado_em.pop(arquivo, None)
+            latencia = None if inicio is None else round(time.monotonic() - inicio, 2)
+            if erro is None:
+                processadas += 1
+                emitir("processada", arquivo=arquivo, saida=saida, latencia_s=latencia,
+                       cache=bool(medidas.get("cache")), bytes=medidas.get("bytes_gravados"),
+                       qualidade=medidas.get("qualidade"),
+                       tempos={etapa: round(medidas[etapa], 4)
+                               for etapa in relatorio.ETAPAS if etapa in medidas})
+            else:
+                erros += 1
+                emitir("erro", arquivo=arquivo, mensagem=erro, latencia_s=latencia,
+                       tipo=medidas.get("tipo_erro"), etapa=medidas.get("etapa_erro"))
+    finally:
+        parar.set()
+        resultados.close()
+        vigiada.fechar()
+
+    removidas = cache_saida.podar() if cache_saida else 0
+    emitir("fim", processadas=processadas, erros=erros,
+           cache={"removidas": removidas} if cache_saida else None)
+    return 0
+
+
+def resumo_resultado(resultado, cache_saida):
+    """Campos do evento "fim" de um lote (ou de uma versão)"""
+    return dict(processadas=resultado.processadas,
+                erros=[{"arquivo": a, "mensagem": m} for a, m in resultado.erros],
+                pdf=resultado.pdf_path, pdf_ok=resultado.pdf_ok,
+                reducao=resultado.reducao_por_formato, ganho_reducao=resultado.ganho_reducao(),
+                cache={"acertos": resultado.cache_acertos, "falhas": resultado.cache_falhas,
+                       "removidas": resultado.cache_removidas} if cache_saida else None,
+                estagios=resultado.estagios or None, relatorio=resultado.relatorio_path)
+
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        origem, destino, config, execucao, versoes = montar_job(args)
+        codificadores.validar(config)
+    except (OSError, ValueError, TypeError) as e:
+        parser.error(str(e))
+
+    if versoes:
+        if not origem or not all(versao.config.logo_file for versao in versoes):
+            parser.error("informe a pasta de origem e o logo de cada versão")
+        if args.vigiar:
+            parser.error("--vigiar não aceita jobs com várias saídas")
+    elif not origem or not destino or not config.logo_file:
+        parser.error("informe a pasta de origem, a pasta de destino e o logo")
+
+    medidor = None
+
+    def progresso(processadas, total, arquivo):
+        nonlocal medidor
+        if medidor is None:
+            medidor = engine.MedidorProgresso(total, intervalo=0)
+        medidor.total = total  # Cresce enquanto a origem é percorrida
+        medidor.registrar()
+        eta = medidor.eta
+        emitir("progresso", processadas=processadas, total=total, arquivo=arquivo,
+               taxa=round(medidor.taxa, 2), eta=None if eta is None else round(eta, 1))
+
+    def aviso(mensagem):
+        emitir("aviso", mensagem=mensagem)
+
+    try:
+        logos = {arquivo: engine.carregar_logo(arquivo)
+                 for arquivo in {versao.config.logo_file for versao in versoes} or {config.logo_file}}
+    except Exception as e:
+        emitir("erro", mensagem=f"Não foi possível carregar o logo: {e}")
+        return 2
+
+    cache_saida = None
+    if not args.sem_cache:
+        cache_saida = cache.CacheSaida(args.cache_pasta, args.cache_limite_mb)
+
+    if args.vigiar:
+        return vigiar(origem, destino, config, logos[config.logo_file], cache_saida, execucao, args)
+
+    if versoes:
+        emitir("inicio", origem=origem, config=config.para_dict(),
+               versoes=[{"nome": versao.nome, "destino": versao.destino,
+                         "config": versao.config.para_dict()} for versao in versoes], **execucao)
+        resultados = engine.processar_versoes(origem, config, versoes, progresso=progresso,
+                                              aviso=aviso, logos=logos, cache=cache_saida,
+                                              **execucao)
+        emitir("fim", versoes=[{"nome": versao.nome, "destino": versao.destino,
+                                **resumo_resultado(resultado, cache_saida)}
+                               for versao, resultado in zip(versoes, resultados)])
+    else:
+        emitir("inicio", origem=origem, destino=destino, config=config.para_dict(), **execucao)
+        resultados = [engine.processar_lote(origem, destino, config, progresso=progresso,
+                                            aviso=aviso, logo=logos[config.logo_file],
+                                            cache=cache_saida, **execucao)]
+        emitir("fim", **resumo_resultado(resultados[0], cache_saida))
+
+    return 1 if any(resultado.erros or resultado.pdf_ok is False for resultado in resultados) else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
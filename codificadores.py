@@ -0,0 +1,270 @@
+"""
+Perfis de codificação das imagens de saída
+
+O formato de saída pode ser o mesmo da origem ("original") ou ser
+convertido para JPEG, WebP, AVIF (quando o Pillow instalado suporta) ou PNG.
+Cada formato tem as próprias opções: JPEG com otimização de Huffman,
+progressivo e subamostragem de croma; WebP e AVIF com qualidade; PNG com
+níveis de compressão. Quando o formato muda, a extensão do arquivo de
+saída é trocada para a do novo formato.
+
+Com um limite de tamanho por arquivo, JPEG e WebP são codificados em
+memória com qualidades diferentes até achar a maior que cabe no limite; a
+qualidade escolhida fica guardada por faixa de conteúdo parecido, para que
+as imagens seguintes comecem a busca por ela.
+"""
+
+import io
+import math
+import os
+
+import cores
+from descoberta import FORMATO_POR_EXTENSAO
+
+# Formato de saída escolhido na configuração -> formato do Pillow (None: o da origem)
+FORMATOS_SAIDA = {
+    "original": None,
+    "jpeg": "JPEG",
+    "webp": "WEBP",
+    "avif": "AVIF",
+    "png": "PNG",
+}
+
+# Nome de cada formato de saída na interface gráfica
+NOMES = {
+    "original": "Mesmo da origem",
+    "jpeg": "JPEG",
+    "webp": "WebP",
+    "avif": "AVIF",
+    "png": "PNG",
+}
+
+# Extensão de cada formato de saída
+EXTENSOES = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "BMP": ".bmp",
+    "TIFF": ".tif",
+    "WEBP": ".webp",
+    "AVIF": ".avif",
+}
+
+FORMATO_POR_EXTENSAO_SAIDA = {**FORMATO_POR_EXTENSAO,
+                              **{extensao: formato for formato, extensao in EXTENSOES.items()}}
+
+SUBAMOSTRAGENS = ("4:4:4", "4:2:2", "4:2:0")
+
+# Nível de zlib de cada predefinição de compressão PNG
+COMPRESSOES_PNG = {
+    "rapida": 1,
+    "equilibrada": 6,
+    "maxima": 9,
+}
+
+# Formatos em que a qualidade pode ser ajustada para caber no limite de tamanho
+FORMATOS_COM_LIMITE = ("JPEG", "WEBP")
+
+# Com tamanho alvo, a busca para quando o arquivo fica até 5% abaixo do alvo
+TOLERANCIA_ALVO = 0.05
+
+# Formatos que gravam o perfil ICC junto da imagem
+FORMATOS_COM_PERFIL = ("JPEG", "PNG", "TIFF", "WEBP", "AVIF")
+
+# Módulo do Pillow que indica suporte a cada formato opcional
+_RECURSOS = {"WEBP": "webp", "AVIF": "avif"}
+
+
+def suportado(formato_saida):
+    """Verifica se o Pillow instalado consegue gravar o formato de saída"""
+    formato = FORMATOS_SAIDA.get(formato_saida)
+    if formato not in _RECURSOS:
+        return formato_saida in FORMATOS_SAIDA
+    from PIL import features
+    try:
+        return bool(features.check(_RECURSOS[formato]))
+    except ValueError:  # Versão do Pillow que nem conhece o formato
+        return False
+
+
+def formatos_disponiveis():
+    """Formatos de saída que podem ser escolhidos nesta instalação"""
+    return [formato_saida for formato_saida in FORMATOS_SAIDA if suportado(formato_saida)]
+
+
+def validar(config):
+    """Confere as opções de codificação da configuração (ValueError se inválidas)"""
+    if config.formato_saida not in FORMATOS_SAIDA:
+        raise ValueError(f"Formato de saída desconhecido: {config.formato_saida} "
+                         f"(use {', '.join(FORMATOS_SAIDA)})")
+    if not suportado(config.formato_saida):
+        raise ValueError(f"O Pillow instalado não grava {config.formato_saida.upper()}")
+    if not 1 <= config.qualidade <= 100:
+        raise ValueError("A qualidade precisa estar entre 1 e 100")
+    if config.subamostragem not in SUBAMOSTRAGENS:
+        raise ValueError(f"Subamostragem desconhecida: {config.subamostragem} "
+                         f"(use {', '.join(SUBAMOSTRAGENS)})")
+    if config.compressao_png not in COMPRESSOES_PNG:
+        raise ValueError(f"Compressão PNG desconhecida: {config.compressao_png} "
+                         f"(use {', '.join(COMPRESSOES_PNG)})")
+    if config.tamanho_maximo_kb < 0 or config.tamanho_alvo_kb < 0:
+        raise ValueError("O tamanho máximo e o tamanho alvo não podem ser negativos")
+    if config.tamanho_maximo_kb and config.tamanho_alvo_kb > config.tamanho_maximo_kb:
+        raise ValueError("O tamanho alvo não pode ser maior que o tamanho máximo")
+    if limite_bytes(config) and not 1 <= config.qualidade_minima <= 100:
+        # Só vale com limite; acima da qualidade ela é reduzida à própria qualidade
+        raise ValueError("A qualidade mínima precisa estar entre 1 e 100")
+    formato = FORMATOS_SAIDA[config.formato_saida]
+    if limite_bytes(config) and formato is not None and formato not in FORMATOS_COM_LIMITE:
+        raise ValueError("O limite de tamanho só vale para JPEG e WebP")
+    cores.validar(config)
+
+
+def formato_destino(formato_saida, formato_origem):
+    """Formato do Pillow em que a imagem será gravada"""
+    return FORMATOS_SAIDA[formato_saida] or formato_origem
+
+
+def nome_convertido(relativo, formato):
+    """Troca a extensão de imagem de ``relativo`` pela do formato de saída
+
+    Sem uma extensão de imagem conhecida, a extensão do formato é acrescentada.
+    """
+    base, extensao = os.path.splitext(relativo)
+    if extensao.lower() not in FORMATO_POR_EXTENSAO_SAIDA:
+        base = relativo
+    return base + EXTENSOES[formato]
+
+
+def formato_do_arquivo(caminho):
+    """Formato em que um arquivo de saída é gravado, pela extensão"""
+    return FORMATO_POR_EXTENSAO_SAIDA.get(os.path.splitext(caminho)[1].lower())
+
+
+def opcoes(formato, config):
+    """Parâmetros de Image.save para o formato, segundo a configuração
+
+    Com um perfil de cores de saída diferente do sRGB, o perfil é gravado
+    junto da imagem nos formatos que aceitam.
+    """
+    if formato == "JPEG":
+        parametros = {"quality": config.qualidade, "optimize": config.jpeg_otimizado,
+                      "progressive": config.jpeg_progressivo,
+                      "subsampling": config.subamostragem}
+    elif formato in ("WEBP", "AVIF"):
+        parametros = {"quality": config.qualidade}
+    elif formato == "PNG":
+        nivel = COMPRESSOES_PNG[config.compressao_png]
+        parametros = {"compress_level": nivel, "optimize": nivel == COMPRESSOES_PNG["maxima"]}
+    else:
+        parametros = {}
+    if config.gerenciar_cores and formato in FORMATOS_COM_PERFIL:
+        perfil = cores.dados_perfil_saida(config.perfil_cores)
+        if perfil:
+            parametros["icc_profile"] = perfil
+    return parametros
+
+
+def limite_bytes(config):
+    """Tamanho máximo de cada arquivo em bytes (o menor entre máximo e alvo), ou 0 sem limite"""
+    limites = [kb * 1024 for kb in (config.tamanho_maximo_kb, config.tamanho_alvo_kb) if kb]
+    return min(limites, default=0)
+
+
+def faixa_conteudo(imagem):
+    """Faixa de complexidade da imagem, para agrupar imagens de conteúdo parecido
+
+    Mede a intensidade média das bordas em uma cópia reduzida em tons de
+    cinza (imagens com mais detalhe ocupam mais bytes na mesma qualidade),
+    em faixas logarítmicas.
+    """
+    from PIL import ImageFilter, ImageStat
+    fator = max(1, min(imagem.size) // 64)
+    pequena = imagem.reduce(fator).convert('L').filter(ImageFilter.FIND_EDGES)
+    return int(2 * math.log2(1 + ImageStat.Stat(pequena).mean[0]))
+
+
+class MemoriaQualidade:
+    """Qualidade escolhida por faixa de conteúdo, compartilhada entre as imagens do lote
+
+    Nos modos com threads todas as imagens usam a mesma memória; no modo
+    "processos" cada processo aprende a sua.
+    """
+
+    def __init__(self):
+        self.qualidades = {}
+
+    def chave(self, imagem, formato, config):
+        return (formato, imagem.size, faixa_conteudo(imagem), limite_bytes(config),
+                config.qualidade)
+
+    def consultar(self, chave):
+        return self.qualidades.get(chave)
+
+    def guardar(self, chave, qualidade):
+        self.qualidades[chave] = qualidade
+
+
+def codificar(imagem, formato, config, memoria=None):
+    """Codifica a imagem em memória e retorna ``(dados, qualidade, tentativas)``
+
+    Sem limite de tamanho (ou em formatos sem qualidade ajustável) é uma
+    única codificação com as opções da configuração, e ``qualidade`` é None.
+    Com limite, a qualidade é buscada entre ``config.qualidade_minima`` (ou
+    a própria qualidade, se for menor) e ``config.qualidade``: com ``tamanho_maximo_kb`` a maior que cabe; com
+    ``tamanho_alvo_kb`` a busca para na primeira que fica até
+    TOLERANCIA_ALVO abaixo do alvo. A busca começa pela qualidade guardada
+    em ``memoria`` para a faixa de conteúdo da imagem, afastando-se dela em
+    passos crescentes até cercar a resposta, ou pela qualidade da
+    configuração, dividindo o intervalo ao meio. Se nem a
+    qualidade mínima couber, levanta ValueError.
+    """
+    parametros = opcoes(formato, config)
+    limite = limite_bytes(config)
+    if not limite or formato not in FORMATOS_COM_LIMITE:
+        buffer = io.BytesIO()
+        imagem.save(buffer, format=formato, **parametros)
+        return buffer.getvalue(), None, 1
+
+    def tentar(qualidade):
+        buffer = io.BytesIO()
+        imagem.save(buffer, format=formato, **{**parametros, "quality": qualidade})
+        return buffer.getvalue()
+
+    minima, maxima = min(config.qualidade_minima, config.qualidade), config.qualidade
+    suficiente = limite * (1 - TOLERANCIA_ALVO) if config.tamanho_alvo_kb else limite
+    chave = memoria.chave(imagem, formato, config) if memoria is not None else None
+    palpite = memoria.consultar(chave) if memoria is not None else None
+
+    coube = None  # (qualidade, dados) da maior qualidade que coube
+    nao_coube = maxima + 1  # menor qualidade que não coube
+    qualidade = maxima if palpite is None else min(max(palpite, minima), maxima)
+    passo = 1 if palpite is not None else 0
+    subir = None
+    tentativas = 0
+    while True:
+        dados = tentar(qualidade)
+        tentativas += 1
+        cabe = len(dados) <= limite
+        if cabe:
+            coube = (qualidade, dados)
+            if len(dados) >= suficiente:
+                break
+        else:
+            nao_coube = qualidade
+        baixa = coube[0] if coube else minima - 1
+        if nao_coube - baixa <= 1:
+            break
+        if passo and subir in (None, cabe):
+            # Perto do palpite: afasta-se dele em passos crescentes até cercar a resposta
+            subir = cabe
+            qualidade = min(qualidade + passo, nao_coube - 1) if cabe else max(qualidade - passo, baixa + 1)
+            passo *= 2
+        else:
+            passo = 0
+            qualidade = (baixa + nao_coube) // 2
+
+    if coube is None:
+        raise ValueError(f"Não coube em {limite / 1024:.0f} KB nem com qualidade {minima}")
+    if memoria is not None:
+        memoria.guardar(chave, coube[0])
+    return coube[1], coube[0], tentativas
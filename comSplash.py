@@ -10,20 +10,20 @@ This application allows users to:
 """
 
 import sys
-import time
+import multiprocessing
 import os
-import math
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QLabel, QLineEdit, QPushButton, 
                             QFileDialog, QGroupBox, QSpinBox, QComboBox, 
                             QMessageBox, QFormLayout, QCheckBox, QColorDialog, 
                             QRadioButton, QScrollArea, QSplashScreen)
-from PyQt5.QtGui import QColor, QPixmap, QPainter
-from PyQt5.QtCore import Qt, QTimer
-from PIL import Image, ImageOps, ImageDraw
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.lib.utils import ImageReader
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+import cache
+import codificadores
+import engine
+import painel
+import preferencias
+import worker
 from PyQt5.QtGui import QMovie
 from PyQt5.QtGui import QIcon
 
@@ -37,6 +37,9 @@ class SplashScreen(QSplashScreen):
         
         # Configuração do GIF animado
         self.movie = QMovie("tuba.gif")  # Substitua pelo caminho do seu GIF
+        # Cada quadro (e sua máscara) é decodificado uma única vez, mesmo com o GIF em loop
+        self.movie.setCacheMode(QMovie.CacheAll)
+        self.mascaras = {}
         self.movie.frameChanged.connect(self.on_frame_changed)
         
         # Configuração da janela
@@ -45,17 +48,55 @@ class SplashScreen(QSplashScreen):
         # Inicia a animação
         self.movie.start()
         
-    def on_frame_changed(self):
+    def on_frame_changed(self, numero):
         """Atualiza o frame do GIF"""
         pixmap = self.movie.currentPixmap()
+        mascara = self.mascaras.get(numero)
+        if mascara is None:
+            mascara = self.mascaras[numero] = pixmap.mask()
         self.setPixmap(pixmap)
-        self.setMask(pixmap.mask())
+        self.setMask(mascara)
         
     def show_message(self, message):
         """Display a loading message on the splash screen"""
         self.showMessage(message, Qt.AlignBottom | Qt.AlignCenter, Qt.black)
         QApplication.processEvents()
 
+
+class InicializacaoWorker(QThread):
+    """Prepara em segundo plano o que a janela usa, enquanto a tela de abertura é exibida
+
+    Carrega os codecs do Pillow, as preferências do último lote e o último
+    logo usado. ``resultado`` só é preenchido ao terminar.
+    """
+
+    etapa = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.resultado = None
+
+    def run(self):
+        resultado = {"preferencias": {}, "logo": None}
+        self.etapa.emit("Carregando codecs de imagem...")
+        try:
+            engine.preparar_codecs()
+        except Exception as e:
+            print(f"Erro ao carregar os codecs: {e}", file=sys.stderr)
+
+        self.etapa.emit("Carregando configurações...")
+        resultado["preferencias"] = preferencias.carregar()
+
+        logo_file = resultado["preferencias"].get("logo_file")
+        if logo_file and os.path.isfile(logo_file):
+            self.etapa.emit("Carregando logo...")
+            try:
+                resultado["logo"] = (logo_file, os.path.getmtime(logo_file),
+                                     engine.carregar_logo(logo_file))
+            except Exception as e:
+                print(f"Erro ao carregar o último logo: {e}", file=sys.stderr)
+        self.resultado = resultado
+
         #__________________________Fim da animação__________________________
         
    
@@ -67,8 +108,8 @@ class PhotoResizerApp(QMainWindow):
         # Configure main window properties
         self.setWindowIcon(QIcon('shark.png'))
         self.setWindowTitle("Redimensionador de Fotos - By Hélio Tomé")
-        self.setGeometry(100, 100, 650, 680)  # x, y, width, height
-        self.setFixedSize(650, 680)  # Fixed window size
+        self.setGeometry(100, 100, 965, 680)  # x, y, width, height
+        self.setFixedSize(965, 680)  # Fixed window size
         
         # Set application stylesheet
         self.setStyleSheet("""
@@ -94,6 +135,9 @@ class PhotoResizerApp(QMainWindow):
             }
         """)
         
+        # Logo já carregado, como (caminho, mtime, imagem), reaproveitado enquanto o arquivo não muda
+        self.logo_carregado = None
+        
         # Initialize UI components
         self.init_ui()
         # Set default values for controls
@@ -101,12 +145,18 @@ class PhotoResizerApp(QMainWindow):
     
     def init_ui(self):
         """Initialize all user interface components"""
-        # Create central widget with scroll area
+        # Create central widget with scroll area, and the placement preview beside it
         central_widget = QWidget()
         scroll = QScrollArea()
         scroll.setWidget(central_widget)
         scroll.setWidgetResizable(True)
-        self.setCentralWidget(scroll)
+        self.preview = painel.PainelPrevia(self.ler_configuracao, self.logo_da_previa)
+        window_widget = QWidget()
+        window_layout = QHBoxLayout(window_widget)
+        window_layout.setContentsMargins(0, 0, 10, 0)
+        window_layout.addWidget(scroll, 1)
+        window_layout.addWidget(self.preview)
+        self.setCentralWidget(window_widget)
         
         # Main vertical layout
         main_layout = QVBoxLayout(central_widget)
@@ -123,6 +173,7 @@ class PhotoResizerApp(QMainWindow):
         self.origin_folder_btn.clicked.connect(self.select_origin_folder)
         self.origin_folder_label = QLabel("Nenhuma pasta selecionada")
         self.origin_folder_label.setWordWrap(True)
+        self.recursive_checkbox = QCheckBox("Incluir subpastas")
         
         # Destination folder selection
         self.dest_folder_btn = QPushButton("Selecionar Pasta de Destino")
@@ -139,6 +190,7 @@ class PhotoResizerApp(QMainWindow):
         # Add widgets to input layout
         input_layout.addWidget(self.origin_folder_btn)
         input_layout.addWidget(self.origin_folder_label)
+        input_layout.addWidget(self.recursive_checkbox)
         input_layout.addWidget(self.dest_folder_btn)
         input_layout.addWidget(self.dest_folder_label)
         input_layout.addWidget(self.logo_file_btn)
@@ -233,6 +285,21 @@ class PhotoResizerApp(QMainWindow):
         self.border_width_input.setValue(5)
         border_layout.addRow("Espessura (px):", self.border_width_input)
         
+        dash_layout = QHBoxLayout()
+        self.dash_length_input = QSpinBox()
+        self.dash_length_input.setRange(1, 200)
+        self.dash_length_input.setValue(6)
+        self.dash_gap_input = QSpinBox()
+        self.dash_gap_input.setRange(0, 200)
+        self.dash_gap_input.setValue(14)
+        self.dash_full_checkbox = QCheckBox("Espessura total")
+        dash_layout.addWidget(QLabel("Traço:"))
+        dash_layout.addWidget(self.dash_length_input)
+        dash_layout.addWidget(QLabel("Intervalo:"))
+        dash_layout.addWidget(self.dash_gap_input)
+        dash_layout.addWidget(self.dash_full_checkbox)
+        border_layout.addRow("Pontilhado (px):", dash_layout)
+        
         self.border_color_btn = QPushButton("Cor da Borda")
         self.border_color_btn.clicked.connect(self.select_border_color)
         self.border_color_preview = QLabel()
@@ -248,6 +315,34 @@ class PhotoResizerApp(QMainWindow):
         border_group.setLayout(border_layout)
         output_layout.addWidget(border_group)
         
+        # Opções de codificação da saída
+        encoder_group = QGroupBox("Formato dos Arquivos")
+        encoder_layout = QFormLayout()
+        
+        self.output_format_combo = QComboBox()
+        for formato_saida in codificadores.formatos_disponiveis():
+            self.output_format_combo.addItem(codificadores.NOMES[formato_saida], formato_saida)
+        encoder_layout.addRow("Formato:", self.output_format_combo)
+        
+        quality_layout = QHBoxLayout()
+        self.quality_input = QSpinBox()
+        self.quality_input.setRange(1, 100)
+        self.quality_input.setValue(95)
+        self.progressive_checkbox = QCheckBox("JPEG progressivo")
+        quality_layout.addWidget(self.quality_input)
+        quality_layout.addWidget(self.progressive_checkbox)
+        encoder_layout.addRow("Qualidade:", quality_layout)
+        
+        self.size_limit_input = QSpinBox()
+        self.size_limit_input.setRange(0, 100000)
+        self.size_limit_input.setSingleStep(50)
+        self.size_limit_input.setSuffix(" KB")
+        self.size_limit_input.setSpecialValueText("Sem limite")
+        encoder_layout.addRow("Tamanho máximo:", self.size_limit_input)
+        
+        encoder_group.setLayout(encoder_layout)
+        output_layout.addWidget(encoder_group)
+        
         # PDF export settings
         pdf_group = QGroupBox("Configurações de PDF")
         pdf_layout = QFormLayout()
@@ -261,6 +356,10 @@ class PhotoResizerApp(QMainWindow):
         self.pdf_filename_input.setText("fotos.pdf")
         pdf_layout.addRow("Nome do PDF:", self.pdf_filename_input)
         
+        self.cache_checkbox = QCheckBox("Reaproveitar imagens já processadas (cache)")
+        self.cache_checkbox.setChecked(True)
+        pdf_layout.addRow(self.cache_checkbox)
+        
         pdf_group.setLayout(pdf_layout)
         output_layout.addWidget(pdf_group)
         
@@ -277,6 +376,17 @@ class PhotoResizerApp(QMainWindow):
             min-height: 35px;
         """)
         
+        # Botão cancelar (habilitado só durante o lote)
+        self.cancel_btn = QPushButton("CANCELAR")
+        self.cancel_btn.clicked.connect(self.cancel_processing)
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.setStyleSheet("padding: 8px; min-height: 35px;")
+        
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.process_btn, 3)
+        buttons_layout.addWidget(self.cancel_btn, 1)
+        self.worker = None
+        
         # Status label
         self.status_label = QLabel("Pronto para processar imagens")
         self.status_label.setAlignment(Qt.AlignCenter)
@@ -290,12 +400,25 @@ class PhotoResizerApp(QMainWindow):
         # Add all widgets to main layout
         main_layout.addWidget(input_group)
         main_layout.addWidget(output_group)
-        main_layout.addWidget(self.process_btn)
+        main_layout.addLayout(buttons_layout)
         main_layout.addWidget(self.status_label)
         main_layout.addWidget(credit_label)
         
         # Initially disable border controls
         self.toggle_border_controls(False)
+        
+        # Qualquer ajuste de posição redesenha a prévia quando os controles param de mudar
+        for spin in (self.width_input, self.height_input, self.left_margin_input,
+                     self.right_margin_input, self.top_margin_input, self.bottom_margin_input,
+                     self.vertical_adjust_input, self.border_width_input, self.dash_length_input,
+                     self.dash_gap_input):
+            spin.valueChanged.connect(self.preview.agendar)
+        for combo in (self.dpi_input, self.logo_pos_combo):
+            combo.currentIndexChanged.connect(self.preview.agendar)
+        for checkbox in (self.border_checkbox, self.dash_full_checkbox):
+            checkbox.stateChanged.connect(self.preview.agendar)
+        self.border_type_dashed.toggled.connect(self.preview.agendar)
+        self.recursive_checkbox.stateChanged.connect(self.listar_amostras)
 
     def set_default_values(self):
         """Set default values for all input controls"""
@@ -308,6 +431,84 @@ class PhotoResizerApp(QMainWindow):
         self.bottom_margin_input.setValue(20)  # Default bottom margin: 20px
         self.vertical_adjust_input.setValue(0)  # Default vertical adjustment: 0px
 
+    def aplicar_inicializacao(self, resultado):
+        """Restaura as pastas e configurações do último lote e guarda o logo pré-carregado"""
+        self.logo_carregado = resultado["logo"]
+        dados = resultado["preferencias"]
+        for atributo, label, caminho_ok in (("origin_folder", self.origin_folder_label, os.path.isdir),
+                                            ("dest_folder", self.dest_folder_label, os.path.isdir),
+                                            ("logo_file", self.logo_file_label, os.path.isfile)):
+            caminho = dados.get(atributo)
+            if caminho and caminho_ok(caminho):
+                setattr(self, atributo, caminho)
+                label.setText(caminho)
+                label.setStyleSheet("color: green;")
+        if "cache" in dados:
+            self.cache_checkbox.setChecked(bool(dados["cache"]))
+        if "config" in dados:
+            self.aplicar_configuracao(preferencias.ler_configuracao(dados, engine.Configuracao()))
+        self.listar_amostras()
+
+    def aplicar_configuracao(self, config):
+        """Preenche os controles a partir da configuração do motor (o inverso de ler_configuracao)"""
+        self.width_input.setValue(config.largura_cm)
+        self.height_input.setValue(config.altura_cm)
+        self.dpi_input.setCurrentIndex(1 if config.dpi == 300 else 0)
+        self.logo_pos_combo.setCurrentText(config.logo_pos)
+        self.left_margin_input.setValue(config.margem_esquerda)
+        self.right_margin_input.setValue(config.margem_direita)
+        self.top_margin_input.setValue(config.margem_superior)
+        self.bottom_margin_input.setValue(config.margem_inferior)
+        self.vertical_adjust_input.setValue(config.ajuste_vertical)
+        self.border_checkbox.setChecked(config.borda)
+        if config.borda:
+            self.border_width_input.setValue(config.borda_espessura)
+            self.border_color = config.borda_cor
+            self.border_color_preview.setStyleSheet(f"background-color: {self.border_color};")
+            self.border_type_dashed.setChecked(config.borda_pontilhada)
+            self.border_type_solid.setChecked(not config.borda_pontilhada)
+        self.dash_length_input.setValue(config.borda_traco)
+        self.dash_gap_input.setValue(config.borda_intervalo)
+        self.dash_full_checkbox.setChecked(config.borda_traco_cheio)
+        self.pdf_checkbox.setChecked(config.exportar_pdf)
+        self.pdf_filename_input.setText(config.pdf_nome)
+        indice = self.output_format_combo.findData(config.formato_saida)
+        if indice >= 0:
+            self.output_format_combo.setCurrentIndex(indice)
+        self.quality_input.setValue(config.qualidade)
+        self.progressive_checkbox.setChecked(config.jpeg_progressivo)
+        self.size_limit_input.setValue(config.tamanho_maximo_kb)
+        self.recursive_checkbox.setChecked(config.recursivo)
+
+    def salvar_preferencias(self, config):
+        """Guarda as pastas e configurações deste lote para a próxima abertura"""
+        try:
+            preferencias.salvar({
+                "origin_folder": self.origin_folder,
+                "dest_folder": self.dest_folder,
+                "logo_file": self.logo_file,
+                "cache": self.cache_checkbox.isChecked(),
+                "config": config.para_dict(),
+            })
+        except OSError as e:
+            print(f"Erro ao salvar as preferências: {e}")
+
+    def carregar_logo(self, caminho):
+        """Carrega o logo, reaproveitando a cópia em memória enquanto o arquivo não muda"""
+        mtime = os.path.getmtime(caminho)
+        if self.logo_carregado is None or self.logo_carregado[:2] != (caminho, mtime):
+            self.logo_carregado = (caminho, mtime, engine.carregar_logo(caminho))
+        return self.logo_carregado[2]
+
+    def logo_da_previa(self):
+        """Logo para a prévia, ou None antes de um ser escolhido"""
+        return self.carregar_logo(self.logo_file) if hasattr(self, 'logo_file') else None
+
+    def listar_amostras(self, *_):
+        """Mostra na prévia as fotos da pasta de origem"""
+        if hasattr(self, 'origin_folder'):
+            self.preview.listar(self.origin_folder)
+
     def toggle_border_controls(self, state):
         """Enable/disable border controls based on checkbox state"""
         enabled = state == Qt.Checked
@@ -316,6 +517,9 @@ class PhotoResizerApp(QMainWindow):
         self.border_color_preview.setEnabled(enabled)
         self.border_type_solid.setEnabled(enabled)
         self.border_type_dashed.setEnabled(enabled)
+        self.dash_length_input.setEnabled(enabled)
+        self.dash_gap_input.setEnabled(enabled)
+        self.dash_full_checkbox.setEnabled(enabled)
 
     def select_border_color(self):
         """Open color dialog to select border color"""
@@ -323,6 +527,7 @@ class PhotoResizerApp(QMainWindow):
         if color.isValid():
             self.border_color = color.name()
             self.border_color_preview.setStyleSheet(f"background-color: {self.border_color};")
+            self.preview.agendar()
 
     def select_origin_folder(self):
         """Open dialog to select source folder with images"""
@@ -331,6 +536,7 @@ class PhotoResizerApp(QMainWindow):
             self.origin_folder = folder
             self.origin_folder_label.setText(folder)
             self.origin_folder_label.setStyleSheet("color: green;")
+            self.listar_amostras()
 
     def select_dest_folder(self):
         """Open dialog to select destination folder for processed images"""
@@ -348,135 +554,50 @@ class PhotoResizerApp(QMainWindow):
             self.logo_file = file
             self.logo_file_label.setText(file)
             self.logo_file_label.setStyleSheet("color: green;")
+            self.preview.agendar()
+
+    def ler_configuracao(self):
+        """Monta a configuração do motor a partir do estado atual dos controles"""
+        add_border = self.border_checkbox.isChecked()
+        return engine.Configuracao(
+            largura_cm=self.width_input.value(),
+            altura_cm=self.height_input.value(),
+            dpi=300 if self.dpi_input.currentText().startswith("300") else 72,
+            logo_file=getattr(self, 'logo_file', None),
+            logo_pos=self.logo_pos_combo.currentText(),
+            margem_esquerda=self.left_margin_input.value(),
+            margem_direita=self.right_margin_input.value(),
+            margem_superior=self.top_margin_input.value(),
+            margem_inferior=self.bottom_margin_input.value(),
+            ajuste_vertical=self.vertical_adjust_input.value(),
+            borda=add_border,
+            borda_espessura=self.border_width_input.value() if add_border else 0,
+            borda_cor=self.border_color if add_border else "#FFFFFF",
+            borda_pontilhada=self.border_type_dashed.isChecked() if add_border else False,
+            borda_traco=self.dash_length_input.value(),
+            borda_intervalo=self.dash_gap_input.value(),
+            borda_traco_cheio=self.dash_full_checkbox.isChecked(),
+            exportar_pdf=self.pdf_checkbox.isChecked(),
+            pdf_nome=self.pdf_filename_input.text(),
+            formato_saida=self.output_format_combo.currentData(),
+            qualidade=self.quality_input.value(),
+            jpeg_progressivo=self.progressive_checkbox.isChecked(),
+            tamanho_maximo_kb=self.size_limit_input.value(),
+            recursivo=self.recursive_checkbox.isChecked(),
+        )
+
+    def atualizar_progresso(self, processadas, concluidas, total, taxa, eta):
+        """Mostra o progresso (limitado no tempo) com a vazão e o tempo restante"""
+        self.status_label.setText(
+            f"Processando... {processadas} imagens processadas ({concluidas}/{total}) - "
+            f"{taxa:.1f} img/s - restante {worker.formatar_eta(eta if eta >= 0 else None)}")
+
+    def mostrar_aviso(self, mensagem):
+        """Mostra um aviso do motor de processamento"""
+        QMessageBox.warning(self, "Aviso", mensagem)
 
-    def cm_to_pixels(self, cm, dpi):
-        """Convert centimeters to pixels based on DPI"""
-        return int((cm * dpi) / 2.54)
-    
-    def hex_to_rgb(self, hex_color):
-        """Convert hex color code to RGB tuple"""
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-    
-    def corrigir_orientacao(self, imagem):
-        """Correct image orientation based on EXIF data"""
-        try:
-            exif = imagem._getexif()
-            if exif:
-                orientacao = exif.get(274)
-                if orientacao == 3:
-                    imagem = imagem.rotate(180, expand=True)
-                elif orientacao == 6:
-                    imagem = imagem.rotate(270, expand=True)
-                elif orientacao == 8:
-                    imagem = imagem.rotate(90, expand=True)
-        except (AttributeError, KeyError, IndexError):
-            pass
-        return imagem
-    
-    def redimensionar_mantendo_proporcao(self, imagem, novo_tamanho):
-        """Resize image while maintaining aspect ratio"""
-        imagem.thumbnail(novo_tamanho, Image.LANCZOS)
-        nova_imagem = Image.new('RGB', novo_tamanho, 'white')
-        pos_x = (novo_tamanho[0] - imagem.width) // 2
-        pos_y = (novo_tamanho[1] - imagem.height) // 2
-        nova_imagem.paste(imagem, (pos_x, pos_y))
-        return nova_imagem
-    
-    def adicionar_borda_solida(self, imagem, espessura, cor):
-        """Add solid border to image"""
-        if espessura <= 0:
-            return imagem
-        cor_rgb = self.hex_to_rgb(cor)
-        return ImageOps.expand(imagem, border=espessura, fill=cor_rgb)
-    
-    def adicionar_borda_pontilhada(self, imagem, espessura, cor):
-        """Add dashed border to image"""
-        if espessura <= 0:
-            return imagem
-            
-        cor_rgb = self.hex_to_rgb(cor)
-        largura, altura = imagem.size
-        
-        temp_img = ImageOps.expand(imagem, border=espessura, fill=cor_rgb)
-        draw = ImageDraw.Draw(temp_img)
-        
-        coords = [
-            (0, 0, largura + 2*espessura - 1, espessura - 1),
-            (0, altura + espessura, largura + 2*espessura - 1, altura + 2*espessura - 1),
-            (0, 0, espessura - 1, altura + 2*espessura - 1),
-            (largura + espessura, 0, largura + 2*espessura - 1, altura + 2*espessura - 1)
-        ]
-        
-        for coord in coords:
-            for i in range(0, max(coord[2]-coord[0], coord[3]-coord[1]), 10):
-                if i % 20 < 10:
-                    if coord[2] - coord[0] > coord[3] - coord[1]:
-                        draw.line([coord[0]+i, coord[1], coord[0]+i+5, coord[1]], fill="white")
-                    else:
-                        draw.line([coord[0], coord[1]+i, coord[0], coord[1]+i+5], fill="white")
-        
-        return temp_img
-    
-    def adicionar_borda(self, imagem, espessura, cor, pontilhada=False):
-        """Add border to image based on settings"""
-        if pontilhada:
-            return self.adicionar_borda_pontilhada(imagem, espessura, cor)
-        else:
-            return self.adicionar_borda_solida(imagem, espessura, cor)
-    
-    def criar_pdf(self, imagens, pdf_path, dpi):
-        """Create PDF with 2 images per landscape A4 page"""
-        try:
-            a4_landscape = landscape(A4)
-            page_width, page_height = a4_landscape
-
-            width_cm = self.width_input.value()
-            height_cm = self.height_input.value()
-            img_width_pt = width_cm * 28.35  # Convert cm to points (1cm = 28.35pt)
-            img_height_pt = height_cm * 28.35
-
-            margin = 28.35  # 1cm margin in points
-            space_between = 28.35  # 1cm space between images
-
-            # Check if two images fit on the page
-            if (2 * img_width_pt + space_between + 2 * margin) > page_width:
-                QMessageBox.warning(self, "Aviso", 
-                    "As imagens são muito largas para caberem 2 por página. Será gerado 1 por página.")
-                img_per_page = 1
-            else:
-                img_per_page = 2
-
-            c = canvas.Canvas(pdf_path, pagesize=a4_landscape)
-
-            for i in range(0, len(imagens), img_per_page):
-                if i > 0:
-                    c.showPage()
-
-                for j in range(img_per_page):
-                    if i + j < len(imagens):
-                        img = ImageReader(imagens[i + j])
-                        
-                        # Calculate X position
-                        if img_per_page == 2:
-                            x = margin + j * (img_width_pt + space_between)
-                        else:
-                            x = (page_width - img_width_pt) / 2  # Center if only 1 image
-                        
-                        # Y position (from top of page)
-                        y = page_height - margin - img_height_pt
-                        
-                        # Draw image with configured size
-                        c.drawImage(img, x, y, width=img_width_pt, height=img_height_pt)
-
-            c.save()
-            return True
-        except Exception as e:
-            print(f"Erro ao criar PDF: {e}")
-            return False
-    
     def process_images(self):
-        """Process all images according to settings"""
+        """Inicia o processamento de todas as imagens em segundo plano"""
         try:
             # Validate required selections
             if not hasattr(self, 'origin_folder') or not hasattr(self, 'dest_folder') or not hasattr(self, 'logo_file'):
@@ -484,120 +605,104 @@ class PhotoResizerApp(QMainWindow):
                 return
                 
             # Get settings from UI
-            width_cm = self.width_input.value()
-            height_cm = self.height_input.value()
-            dpi = 300 if self.dpi_input.currentText().startswith("300") else 72
-            logo_pos = self.logo_pos_combo.currentText()
-            
-            # Border settings
-            add_border = self.border_checkbox.isChecked()
-            border_width = self.border_width_input.value() if add_border else 0
-            border_color = self.border_color if add_border else "#FFFFFF"
-            border_dashed = self.border_type_dashed.isChecked() if add_border else False
-            
-            # PDF settings
-            export_pdf = self.pdf_checkbox.isChecked()
-            pdf_filename = self.pdf_filename_input.text()
-            if not pdf_filename.lower().endswith('.pdf'):
-                pdf_filename += '.pdf'
-            
-            # Margin settings
-            left_margin = self.left_margin_input.value()
-            right_margin = self.right_margin_input.value()
-            top_margin = self.top_margin_input.value()
-            bottom_margin = self.bottom_margin_input.value()
-            vertical_adjust = self.vertical_adjust_input.value()
-            
-            # Convert measurements to pixels
-            width_px = self.cm_to_pixels(width_cm, dpi)
-            height_px = self.cm_to_pixels(height_cm, dpi)
-            tamanho_final = (width_px, height_px)
+            config = self.ler_configuracao()
             
             # Load logo image
             try:
-                logo = Image.open(self.logo_file).convert("RGBA")
+                logo = self.carregar_logo(config.logo_file)
             except Exception as e:
                 QMessageBox.critical(self, "Erro", f"Não foi possível carregar o logo: {str(e)}")
                 return
             
-            # Create destination folder if it doesn't exist
-            os.makedirs(self.dest_folder, exist_ok=True)
+            self.salvar_preferencias(config)
             
-            # Process each image
-            processed = 0
-            processed_images = []  # Store paths for PDF export
+            # O motor roda fora da thread da interface
+            self.worker = worker.ProcessamentoWorker(self.origin_folder, self.dest_folder, config, logo,
+                                                     trabalhadores=engine.TRABALHADORES_PADRAO,
+                                                     cache=cache.CacheSaida() if self.cache_checkbox.isChecked() else None,
+                                                     parent=self)
+            self.worker.progresso.connect(self.atualizar_progresso)
+            self.worker.aviso.connect(self.mostrar_aviso)
+            self.worker.concluido.connect(self.processamento_concluido)
+            self.worker.falhou.connect(self.processamento_falhou)
+            self.worker.finished.connect(self.worker.deleteLater)
             
-            for arquivo in os.listdir(self.origin_folder):
-                if arquivo.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                    entrada = os.path.join(self.origin_folder, arquivo)
-                    saida = os.path.join(self.dest_folder, arquivo)
-                    
-                    try:
-                        with Image.open(entrada) as img:
-                            # Fix orientation
-                            img = self.corrigir_orientacao(img)
-                            
-                            # Resize maintaining aspect ratio
-                            img = self.redimensionar_mantendo_proporcao(img, tamanho_final)
-                            
-                            # Calculate logo position
-                            if logo_pos == "Canto Inferior Direito":
-                                pos_x = img.width - logo.width - right_margin
-                                pos_y = img.height - logo.height - bottom_margin + vertical_adjust
-                            elif logo_pos == "Canto Inferior Esquerdo":
-                                pos_x = left_margin
-                                pos_y = img.height - logo.height - bottom_margin + vertical_adjust
-                            elif logo_pos == "Canto Superior Direito":
-                                pos_x = img.width - logo.width - right_margin
-                                pos_y = top_margin + vertical_adjust
-                            elif logo_pos == "Canto Superior Esquerdo":
-                                pos_x = left_margin
-                                pos_y = top_margin + vertical_adjust
-                            else:  # Center
-                                pos_x = (img.width - logo.width) // 2
-                                pos_y = (img.height - logo.height) // 2 + vertical_adjust
-                            
-                            # Ensure positions are not negative
-                            pos_x = max(0, pos_x)
-                            pos_y = max(0, pos_y)
-                            
-                            # Apply logo
-                            img.paste(logo, (int(pos_x), int(pos_y)), logo)
-                            
-                            # Add border if enabled
-                            if add_border:
-                                img = self.adicionar_borda(img, border_width, border_color, border_dashed)
-                            
-                            # Save processed image
-                            img.save(saida, quality=95)
-                            processed += 1
-                            processed_images.append(saida)
-                            self.status_label.setText(f"Processando... {processed} imagens processadas")
-                            QApplication.processEvents()
-                            
-                    except Exception as e:
-                        print(f"Erro ao processar {arquivo}: {e}")
-            
-            # Create PDF if enabled
-            if export_pdf and processed_images:
-                pdf_path = os.path.join(self.dest_folder, pdf_filename)
-                if self.criar_pdf(processed_images, pdf_path, dpi):
-                    pdf_msg = f"\nPDF criado: {pdf_filename}"
-                else:
-                    pdf_msg = "\nErro ao criar o PDF"
-            else:
-                pdf_msg = ""
-            
-            # Show completion message
-            QMessageBox.information(self, "Concluído", 
-                                  f"Processamento finalizado!\n{processed} imagens foram processadas e salvas em:\n{self.dest_folder}{pdf_msg}")
-            self.status_label.setText("Processamento concluído com sucesso!")
-            self.status_label.setStyleSheet("color: green; font-weight: bold;")
+            self.process_btn.setEnabled(False)
+            self.cancel_btn.setEnabled(True)
+            self.status_label.setText("Processando...")
+            self.status_label.setStyleSheet("font-weight: bold; padding: 5px;")
+            self.worker.start()
             
         except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Ocorreu um erro durante o processamento:\n{str(e)}")
-            self.status_label.setText("Erro durante o processamento")
-            self.status_label.setStyleSheet("color: red; font-weight: bold;")
+            self.processamento_falhou(str(e))
+
+    def cancel_processing(self):
+        """Interrompe o lote depois da imagem em processamento"""
+        if self.worker is not None:
+            self.worker.cancelar()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Cancelando após a imagem atual...")
+
+    def processamento_concluido(self, resultado):
+        """Informa o resultado do lote terminado (ou cancelado)"""
+        self.finalizar_processamento()
+        
+        for arquivo, erro in resultado.erros:
+            print(f"Erro ao processar {arquivo}: {erro}")
+        
+        if resultado.cancelado:
+            QMessageBox.information(self, "Cancelado", 
+                                  f"Processamento cancelado.\n{resultado.processadas} imagens foram processadas e salvas em:\n{self.dest_folder}")
+            self.status_label.setText("Processamento cancelado")
+            self.status_label.setStyleSheet("color: #c60; font-weight: bold;")
+            return
+        
+        if resultado.pdf_path:
+            if resultado.pdf_ok:
+                pdf_msg = f"\nPDF criado: {os.path.basename(resultado.pdf_path)}"
+            else:
+                pdf_msg = "\nErro ao criar o PDF"
+        else:
+            pdf_msg = ""
+        
+        if resultado.cache_acertos or resultado.cache_falhas:
+            cache_msg = (f"\nCache: {resultado.cache_acertos} reaproveitadas, "
+                         f"{resultado.cache_falhas} processadas")
+        else:
+            cache_msg = ""
+        
+        if resultado.estagios:
+            estagios_msg = f"\nUtilização dos estágios: {worker.formatar_estagios(resultado.estagios)}"
+        else:
+            estagios_msg = ""
+        
+        relatorio_msg = worker.formatar_relatorio(resultado)
+        
+        QMessageBox.information(self, "Concluído", 
+                              f"Processamento finalizado!\n{resultado.processadas} imagens foram processadas e salvas em:\n{self.dest_folder}{pdf_msg}{cache_msg}{estagios_msg}{relatorio_msg}")
+        self.status_label.setText("Processamento concluído com sucesso!")
+        self.status_label.setStyleSheet("color: green; font-weight: bold;")
+
+    def processamento_falhou(self, mensagem):
+        """Informa um erro inesperado no processamento"""
+        self.finalizar_processamento()
+        QMessageBox.critical(self, "Erro", f"Ocorreu um erro durante o processamento:\n{mensagem}")
+        self.status_label.setText("Erro durante o processamento")
+        self.status_label.setStyleSheet("color: red; font-weight: bold;")
+
+    def finalizar_processamento(self):
+        """Reativa os controles quando o processamento para"""
+        self.process_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.worker = None
+
+    def closeEvent(self, event):
+        """Cancela o lote em andamento antes de fechar a janela"""
+        if self.worker is not None:
+            self.worker.cancelar()
+            self.worker.wait()
+        self.preview.parar()
+        super().closeEvent(event)
 
 def main():
     """Main application entry point with splash screen"""
@@ -606,28 +711,31 @@ def main():
     # Show splash screen
     splash = SplashScreen()
     splash.show()
-    
-    # Simulate loading steps
     splash.show_message("Inicializando aplicação...")
-    time.sleep(0.5)
-    
-    splash.show_message("Carregando configurações...")
-    time.sleep(0.3)
     
-    splash.show_message("Preparando interface...")
-    time.sleep(0.8)
+    window = None
     
-    # Create main window
-    window = PhotoResizerApp()
+    def abrir_janela():
+        # Só abre quando a janela foi criada e a inicialização terminou, na ordem que for
+        if window is None or inicializacao.resultado is None or window.isVisible():
+            return
+        window.aplicar_inicializacao(inicializacao.resultado)
+        window.show()
+        splash.finish(window)
     
-    splash.show_message("Pronto para usar!")
-    time.sleep(0.5)
+    # Codecs, preferências e logo carregam em segundo plano enquanto a janela é montada
+    inicializacao = InicializacaoWorker()
+    inicializacao.etapa.connect(splash.show_message)
+    inicializacao.finished.connect(abrir_janela)
+    inicializacao.start()
     
-    # Show main window and close splash
-    window.show()
-    splash.finish(window)
+    # Os widgets precisam ser criados na thread da interface
+    splash.show_message("Preparando interface...")
+    window = PhotoResizerApp()
+    abrir_janela()
     
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Exigido pelo pool de processos no executável congelado
     main()
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+Gerenciamento de cores
+
+As fotos chegam em modos e perfis de cor variados: JPEG CMYK de gráficas,
+Adobe RGB com perfil ICC embutido, PNG de 16 bits, com paleta ou com alfa.
+O processamento tem duas partes:
+
+- Antes do redimensionamento a imagem é normalizada para L, RGB ou CMYK
+  (normalizar): alfa e transparência da paleta são aplicados sobre o fundo
+  branco da tela, 16 bits viram 8 e a paleta é expandida. São menos canais
+  para o LANCZOS, sem alfa pré-multiplicado, e nesses modos o Pillow aplica
+  a redução inteira do ``reducing_gap``, que ignora em RGBA, LA e P.
+- Depois do redimensionamento, já na imagem pequena, as cores são
+  convertidas do perfil ICC de origem para o perfil de saída (sRGB ou um
+  arquivo .icc/.icm) com o ImageCms (converter). Imagens sem perfil são
+  tratadas como sRGB; CMYK sem perfil usa a conversão simples do Pillow.
+
+Criar uma transformação do littlecms custa bem mais que aplicá-la numa foto
+reduzida, então cada uma é criada uma vez por perfil de origem, modo e
+intenção e fica em cache (TRANSFORMACOES) por todo o lote e pelos
+seguintes. O cache é do processo: no modo "processos" cada processo monta
+as suas, já que as transformações não podem ser enviadas entre processos.
+"""
+
+import hashlib
+import io
+import threading
+
+from PIL import Image
+
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow compilado sem o littlecms
+    ImageCms = None
+
+PERFIL_SRGB = "srgb"  # Perfil de saída padrão (o sRGB embutido no littlecms)
+
+# Intenção de renderização escolhida na configuração -> valor do ImageCms.Intent
+INTENCOES = {
+    "perceptual": 0,
+    "relativa": 1,
+    "saturacao": 2,
+    "absoluta": 3,
+}
+
+# Modos em que a imagem é redimensionada (os demais são convertidos por normalizar)
+MODOS_TRABALHO = ("L", "RGB", "CMYK")
+
+# Espaço de cor do perfil ICC exigido por cada modo de trabalho
+_ESPACOS = {"L": "GRAY", "RGB": "RGB", "CMYK": "CMYK"}
+
+_BRANCO = {"L": 255, "RGB": (255, 255, 255)}
+
+
+def modo_normalizado(imagem):
+    """Modo de trabalho em que normalizar deixará a imagem"""
+    modo = imagem.mode
+    if modo in MODOS_TRABALHO:
+        return modo
+    if modo in ("1", "LA", "La") or modo.startswith(("I", "F")):
+        return "L"
+    return "RGB"
+
+
+def normalizar(imagem):
+    """Converte a imagem para o modo de trabalho, antes do redimensionamento
+
+    Pixels transparentes ficam sobre branco, como ficariam na tela final.
+    Os demais dados de ``info`` (entre eles o perfil ICC) são mantidos.
+    """
+    modo = modo_normalizado(imagem)
+    if imagem.mode == modo:
+        return imagem
+    info = {chave: valor for chave, valor in imagem.info.items() if chave != "transparency"}
+    if imagem.mode.startswith("I;16") or imagem.mode == "I":
+        convertida = imagem.point(lambda valor: valor / 257).convert("L")
+    elif imagem.mode == "P":
+        convertida = imagem.convert("RGBA" if "transparency" in imagem.info else "RGB")
+    elif imagem.mode == "PA":
+        convertida = imagem.convert("RGBA")
+    elif imagem.mode in ("La", "RGBa"):
+        convertida = imagem.convert(imagem.mode[:-1] + "A")
+    else:
+        convertida = imagem
+    if convertida.mode in ("LA", "RGBA"):
+        fundo = Image.new(modo, convertida.size, _BRANCO[modo])
+        fundo.paste(convertida, mask=convertida.getchannel("A"))
+        convertida = fundo
+    elif convertida.mode != modo:
+        convertida = convertida.convert(modo)
+    convertida.info = info
+    return convertida
+
+
+def _abrir_perfil(dados):
+    """Perfil ICC a partir dos bytes, ou None se estiver corrompido"""
+    try:
+        return ImageCms.ImageCmsProfile(io.BytesIO(dados))
+    except (OSError, ImageCms.PyCMSError):
+        return None
+
+
+def _espaco(perfil):
+    return perfil.profile.xcolor_space.strip()
+
+
+def _eh_srgb(perfil):
+    descricao = ImageCms.getProfileDescription(perfil) or ""
+    return descricao.strip().lower().startswith("srgb")
+
+
+class CacheTransformacoes:
+    """Transformações do ImageCms por perfil de origem, modo e intenção
+
+    Pode ser usado ao mesmo tempo por várias threads: as transformações são
+    criadas sem o cache de pixel do littlecms, que não é seguro entre
+    threads, e o Pillow libera o GIL ao aplicá-las.
+    """
+
+    def __init__(self):
+        self._transformacoes = {}
+        self._saidas = {}
+        self._trava = threading.Lock()
+
+    def perfil_saida(self, perfil):
+        """Perfil de saída: PERFIL_SRGB ou o caminho de um arquivo ICC"""
+        with self._trava:
+            if perfil not in self._saidas:
+                if perfil == PERFIL_SRGB:
+                    self._saidas[perfil] = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB"))
+                else:
+                    self._saidas[perfil] = ImageCms.getOpenProfile(perfil)
+            return self._saidas[perfil]
+
+    def obter(self, dados_perfil, modo, perfil, intencao):
+        """Transformação de ``modo`` (com o perfil ICC ``dados_perfil``) para RGB em ``perfil``
+
+        Retorna ``(transformacao, descricao do perfil de origem)``;
+        ``transformacao`` é None quando basta a conversão simples do Pillow
+        (sem perfil de origem e saída em sRGB, perfil de origem já sRGB ou
+        de outro espaço de cor, CMYK sem perfil).
+        """
+        digest = hashlib.blake2b(dados_perfil, digest_size=16).digest() if dados_perfil else None
+        chave = (digest, modo, perfil, intencao)
+        with self._trava:
+            if chave in self._transformacoes:
+                return self._transformacoes[chave]
+        saida = self.perfil_saida(perfil)
+        entrada = _abrir_perfil(dados_perfil) if dados_perfil else None
+        descricao = None
+        if entrada is not None:
+            descricao = (ImageCms.getProfileDescription(entrada) or "").strip() or None
+            if _espaco(entrada) != _ESPACOS[modo]:
+                entrada = None  # Perfil que não corresponde aos pixels: é ignorado
+        if entrada is None and modo == "RGB" and perfil != PERFIL_SRGB:
+            entrada = self.perfil_saida(PERFIL_SRGB)
+        if entrada is None or (perfil == PERFIL_SRGB and _eh_srgb(entrada)):
+            transformacao = None
+        else:
+            transformacao = ImageCms.buildTransform(entrada, saida, modo, "RGB",
+                                                    renderingIntent=INTENCOES[intencao],
+                                                    flags=ImageCms.Flags.NOCACHE)
+        with self._trava:
+            self._transformacoes[chave] = (transformacao, descricao)
+        return transformacao, descricao
+
+
+TRANSFORMACOES = CacheTransformacoes()
+
+
+def converter(imagem, perfil=PERFIL_SRGB, intencao="perceptual", gerenciar=True,
+              cache=TRANSFORMACOES):
+    """Converte a imagem já normalizada e reduzida para RGB no perfil de saída
+
+    Retorna ``(imagem, descricao do perfil de origem ou None)``. Sem
+    ``gerenciar`` (ou sem o ImageCms) a conversão é a simples do Pillow.
+    """
+    if not gerenciar or ImageCms is None:
+        return (imagem if imagem.mode == "RGB" else imagem.convert("RGB")), None
+    dados_perfil = imagem.info.get("icc_profile")
+    if imagem.mode == "L" and not dados_perfil:
+        imagem = imagem.convert("RGB")  # Cinza sem perfil: o mesmo que sRGB
+    transformacao, descricao = cache.obter(dados_perfil, imagem.mode, perfil, intencao)
+    if transformacao is not None:
+        return transformacao.apply(imagem), descricao
+    return (imagem if imagem.mode == "RGB" else imagem.convert("RGB")), descricao
+
+
+def dados_perfil_saida(perfil, cache=TRANSFORMACOES):
+    """Bytes do perfil de saída, para gravar junto da imagem (None para sRGB)"""
+    if perfil == PERFIL_SRGB or ImageCms is None:
+        return None
+    return cache.perfil_saida(perfil).tobytes()
+
+
+def validar(config):
+    """Confere as opções de cores da configuração (ValueError se inválidas)"""
+    if config.intencao_cores not in INTENCOES:
+        raise ValueError(f"Intenção de renderização desconhecida: {config.intencao_cores} "
+                         f"(use {', '.join(INTENCOES)})")
+    if not config.gerenciar_cores or config.perfil_cores == PERFIL_SRGB:
+        return
+    if ImageCms is None:
+        raise ValueError("O Pillow instalado não tem o ImageCms para usar um perfil de saída")
+    try:
+        perfil = TRANSFORMACOES.perfil_saida(config.perfil_cores)
+    except (OSError, ImageCms.PyCMSError) as e:
+        raise ValueError(f"Não foi possível abrir o perfil de saída {config.perfil_cores}: {e}")
+    if _espaco(perfil) != "RGB":
+        raise ValueError(f"O perfil de saída precisa ser RGB: {config.perfil_cores}")
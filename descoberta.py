@@ -0,0 +1,169 @@
+"""
+Descoberta das imagens de origem
+
+Percorre a pasta de origem com os.scandir e gera as imagens à medida que
+são encontradas, para que o processamento comece antes de a pasta inteira
+ser listada. O formato é reconhecido pelos primeiros bytes do arquivo (e
+não pela extensão), então fotos sem extensão ou com a extensão errada
+também entram no lote. Opcionalmente inclui as subpastas e filtra os
+arquivos por padrões glob.
+"""
+
+import os
+from contextlib import nullcontext
+from fnmatch import fnmatch
+
+# Primeiros bytes de cada formato suportado
+ASSINATURAS = (
+    (b'\xff\xd8\xff', "JPEG"),
+    (b'\x89PNG\r\n\x1a\n', "PNG"),
+    (b'BM', "BMP"),
+    (b'II*\x00', "TIFF"),
+    (b'MM\x00*', "TIFF"),
+)
+
+# "BM" sozinho aparece no início de muitos arquivos que não são imagens: o
+# BMP também precisa ter um cabeçalho DIB de tamanho conhecido (do
+# BITMAPCOREHEADER ao BITMAPV5HEADER) logo depois do cabeçalho do arquivo
+_TAMANHOS_DIB_BMP = (12, 40, 52, 56, 64, 108, 124)
+_TAMANHO_CABECALHO_BMP = 18  # Cabeçalho do arquivo (14 bytes) e tamanho do DIB
+
+# Extensões aceitas de cada formato; a primeira é usada quando falta extensão
+EXTENSOES_POR_FORMATO = {
+    "JPEG": ('.jpg', '.jpeg'),
+    "PNG": ('.png',),
+    "BMP": ('.bmp',),
+    "TIFF": ('.tif', '.tiff'),
+}
+
+FORMATO_POR_EXTENSAO = {extensao: formato for formato, extensoes in EXTENSOES_POR_FORMATO.items()
+                        for extensao in extensoes}
+
+_TAMANHO_ASSINATURA = max(_TAMANHO_CABECALHO_BMP,
+                          *(len(assinatura) for assinatura, _ in ASSINATURAS))
+
+
+def _cabecalho_bmp(inicio):
+    if len(inicio) < _TAMANHO_CABECALHO_BMP:
+        return False
+    inicio_pixels = int.from_bytes(inicio[10:14], "little")
+    tamanho_dib = int.from_bytes(inicio[14:18], "little")
+    return tamanho_dib in _TAMANHOS_DIB_BMP and inicio_pixels >= 14 + tamanho_dib
+
+
+def identificar_formato(inicio):
+    """Formato pelos primeiros bytes já lidos do arquivo, ou None se não for suportado"""
+    for assinatura, formato in ASSINATURAS:
+        if inicio[:len(assinatura)] == assinatura:
+            if formato == "BMP" and not _cabecalho_bmp(inicio):
+                return None
+            return formato
+    return None
+
+
+def detectar_formato(caminho):
+    """Formato da imagem pelos primeiros bytes, ou None se não for suportado"""
+    try:
+        with open(caminho, 'rb') as f:
+            inicio = f.read(_TAMANHO_ASSINATURA)
+    except OSError:
+        return None
+    return identificar_formato(inicio)
+
+
+def nome_saida(relativo, formato):
+    """Nome do arquivo de saída: mantém a extensão quando ela corresponde ao formato
+
+    Arquivos sem extensão (ou com uma extensão de outro tipo de arquivo)
+    recebem a extensão do formato detectado, para que a saída seja gravada
+    no formato certo.
+    """
+    extensoes = EXTENSOES_POR_FORMATO[formato]
+    if os.path.splitext(relativo)[1].lower() in extensoes:
+        return relativo
+    return relativo + extensoes[0]
+
+
+def _corresponde(relativo, padroes):
+    return any(fnmatch(relativo, padrao) for padrao in padroes)
+
+
+def aceitar_arquivo(relativo, incluir=(), excluir=()):
+    """Verifica um caminho relativo contra os padrões ``incluir`` e ``excluir``"""
+    if incluir and not _corresponde(relativo, incluir):
+        return False
+    return not (excluir and _corresponde(relativo, excluir))
+
+
+def aceitar_pasta(relativo, caminho, excluir=(), ignorar=()):
+    """Verifica se uma subpasta deve ser percorrida
+
+    ``ignorar`` são caminhos já normalizados com normalizar_pasta.
+    """
+    return not _corresponde(relativo, excluir) and normalizar_pasta(caminho) not in ignorar
+
+
+def normalizar_pasta(caminho):
+    return os.path.normcase(os.path.abspath(caminho))
+
+
+def percorrer(origem, recursivo=False, incluir=(), excluir=(), ignorar=(), ordenar=True):
+    """Gera ``(relativo, entrada)`` de cada arquivo da origem, sem abrir os arquivos
+
+    ``relativo`` usa "/" como separador, também nas subpastas, e ``entrada``
+    é o os.DirEntry do arquivo. Os arquivos de uma pasta vêm antes das
+    subpastas dela. Com ``ordenar`` cada pasta é percorrida em ordem
+    alfabética, para que a ordem do lote (e do PDF) e os nomes de saída que
+    colidem sejam os mesmos a cada execução; para isso a pasta inteira é
+    listada antes do primeiro arquivo. Sem ``ordenar`` os arquivos saem na
+    ordem do os.scandir assim que são listados, sem guardar a pasta em
+    memória, o que importa em pastas com centenas de milhares de arquivos.
+    ``incluir`` e ``excluir`` são padrões glob comparados com o caminho
+    relativo (ex.: ``*.jpg``, ``rascunhos/*``); uma subpasta que corresponda
+    a ``excluir`` não é percorrida. ``ignorar`` lista pastas que nunca são
+    percorridas (ex.: a pasta de destino dentro da origem).
+    """
+    ignorar = {normalizar_pasta(pasta) for pasta in ignorar}
+    pendentes = [("", origem)]
+    while pendentes:
+        prefixo, pasta = pendentes.pop()
+        try:
+            listagem = os.scandir(pasta)
+            if ordenar:
+                with listagem:
+                    listagem = nullcontext(sorted(listagem, key=lambda entrada: entrada.name))
+        except OSError:
+            if not prefixo:
+                raise  # A própria pasta de origem precisa existir
+            continue
+
+        subpastas = []
+        with listagem as entradas:
+            for entrada in entradas:
+                relativo = prefixo + entrada.name
+                try:
+                    if entrada.is_dir():
+                        if recursivo and aceitar_pasta(relativo, entrada.path, excluir, ignorar):
+                            subpastas.append((relativo + "/", entrada.path))
+                        continue
+                    if not entrada.is_file():
+                        continue
+                except OSError:
+                    continue
+                if aceitar_arquivo(relativo, incluir, excluir):
+                    yield relativo, entrada
+
+        # Pilha: a primeira subpasta (em ordem alfabética, com ``ordenar``) sai primeiro
+        pendentes.extend(reversed(subpastas))
+
+
+def descobrir_imagens(origem, recursivo=False, incluir=(), excluir=(), ignorar=(), ordenar=True):
+    """Gera ``(relativo, formato)`` de cada imagem da pasta de origem
+
+    Os arquivos são percorridos como em ``percorrer``; os que não têm a
+    assinatura de um formato suportado são ignorados.
+    """
+    for relativo, entrada in percorrer(origem, recursivo, incluir, excluir, ignorar, ordenar):
+        formato = detectar_formato(entrada.path)
+        if formato is not None:
+            yield relativo, formato
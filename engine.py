@@ -0,0 +1,1510 @@
+"""
+Motor de processamento do Redimensionador de Fotos
+
+Contém todo o processamento de imagens sem dependência do Qt, para que o
+mesmo código seja usado pela interface gráfica e pela linha de comando.
+"""
+
+import importlib
+import io
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache, partial
+from itertools import islice
+
+from PIL import Image, ImageOps
+import codificadores
+import cores
+import faixas
+from cache import assinatura_configuracao
+from descoberta import EXTENSOES_POR_FORMATO, descobrir_imagens, identificar_formato, nome_saida
+from pipeline import Concluido, Estagio, Pipeline
+from relatorio import RelatorioLote, gravar_relatorio
+
+POSICOES_LOGO = [
+    "Canto Inferior Direito",
+    "Canto Inferior Esquerdo",
+    "Canto Superior Direito",
+    "Canto Superior Esquerdo",
+    "Centro",
+]
+
+MODOS_EXECUCAO = ("processos", "threads", "estagios")
+
+TRABALHADORES_PADRAO = os.cpu_count() or 1
+
+# Estágios do modo "estagios", na ordem em que cada imagem passa por eles
+ESTAGIOS = ("leitura", "decodificacao", "transformacao", "codificacao", "gravacao")
+
+# Qualidade x velocidade do redimensionamento: quanto menor o reducing_gap,
+# maior a parte feita pela redução inteira (rápida) antes do LANCZOS
+REDUCING_GAPS = {
+    "maxima": None,
+    "alta": 3.0,
+    "equilibrada": 2.0,
+    "rapida": 1.0,
+}
+
+INTERVALO_PROGRESSO = 0.1  # segundos entre atualizações de progresso na tela
+
+# Transposição exata (sem interpolação) que endireita cada orientação EXIF
+TRANSPOSICOES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Orientações em que a largura e a altura da foto ficam trocadas
+ORIENTACOES_GIRADAS = (5, 6, 7, 8)
+
+
+@dataclass
+class Configuracao:
+    """Parâmetros de um lote de processamento"""
+    largura_cm: int = 10
+    altura_cm: int = 15
+    dpi: int = 300
+    logo_file: str = None
+    logo_pos: str = "Canto Inferior Direito"
+    margem_esquerda: int = 20
+    margem_direita: int = 20
+    margem_superior: int = 20
+    margem_inferior: int = 20
+    ajuste_vertical: int = 0
+    borda: bool = False
+    borda_espessura: int = 5
+    borda_cor: str = "#FF0000"
+    borda_pontilhada: bool = False
+    borda_traco: int = 6
+    borda_intervalo: int = 14
+    borda_traco_cheio: bool = False
+    exportar_pdf: bool = True
+    pdf_nome: str = "fotos.pdf"
+    formato_saida: str = "original"
+    qualidade: int = 95
+    jpeg_otimizado: bool = True
+    jpeg_progressivo: bool = False
+    subamostragem: str = "4:2:0"
+    compressao_png: str = "equilibrada"
+    tamanho_maximo_kb: int = 0
+    tamanho_alvo_kb: int = 0
+    qualidade_minima: int = 40
+    exportar_relatorio: bool = True
+    relatorio_nome: str = "relatorio.json"
+    decodificacao_reduzida: bool = True
+    reducao: str = "equilibrada"
+    memoria_maxima_mb: int = 512
+    limite_megapixels: int = 1000
+    gerenciar_cores: bool = True
+    perfil_cores: str = cores.PERFIL_SRGB
+    intencao_cores: str = "perceptual"
+    medir_reducao: bool = False
+    recursivo: bool = False
+    incluir: list = field(default_factory=list)
+    excluir: list = field(default_factory=list)
+
+    @property
+    def tamanho_final(self):
+        return (cm_to_pixels(self.largura_cm, self.dpi),
+                cm_to_pixels(self.altura_cm, self.dpi))
+
+    @property
+    def pdf_arquivo(self):
+        nome = self.pdf_nome or "fotos.pdf"
+        if not nome.lower().endswith('.pdf'):
+            nome += '.pdf'
+        return nome
+
+    @property
+    def relatorio_arquivo(self):
+        nome = self.relatorio_nome or "relatorio.json"
+        if not nome.lower().endswith('.json'):
+            nome += '.json'
+        return nome
+
+    def para_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Cria a configuração a partir de um dicionário (ex.: arquivo de job)"""
+        campos = cls.__dataclass_fields__
+        desconhecidos = set(dados) - set(campos)
+        if desconhecidos:
+            raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(desconhecidos))}")
+        return cls(**dados)
+
+
+@dataclass
+class ResultadoLote:
+    """Resumo de um lote processado"""
+    processadas: int = 0
+    arquivos_saida: list = field(default_factory=list)
+    erros: list = field(default_factory=list)
+    pdf_path: str = None
+    pdf_ok: bool = None
+    cancelado: bool = False
+    reducao_por_formato: dict = field(default_factory=dict)
+    cache_acertos: int = 0
+    cache_falhas: int = 0
+    cache_removidas: int = 0
+    estagios: dict = field(default_factory=dict)
+    relatorio: dict = None
+    relatorio_path: str = None
+
+    def registrar(self, medidas):
+        """Acumula as medidas de uma imagem processada (ou vinda do cache)"""
+        if medidas.get("cache"):
+            self.cache_acertos += 1
+            return
+        if medidas.get("cache") is False:
+            self.cache_falhas += 1
+        self.registrar_reducao(medidas)
+
+    def registrar_reducao(self, medidas):
+        """Acumula o tempo de redimensionamento por formato de origem"""
+        formato = self.reducao_por_formato.setdefault(
+            medidas["formato"], {"imagens": 0, "tempo_s": 0.0, "tempo_exato_s": None})
+        formato["imagens"] += 1
+        formato["tempo_s"] += medidas["redimensionar_s"]
+        if "redimensionar_exato_s" in medidas:
+            formato["tempo_exato_s"] = (formato["tempo_exato_s"] or 0.0) + medidas["redimensionar_exato_s"]
+
+    def ganho_reducao(self):
+        """Aceleração medida da pré-redução por formato (exato / rápido)"""
+        return {formato: round(dados["tempo_exato_s"] / dados["tempo_s"], 2)
+                for formato, dados in self.reducao_por_formato.items()
+                if dados["tempo_exato_s"] and dados["tempo_s"]}
+
+
+class MedidorProgresso:
+    """Mede a vazão (imagens/s) e o tempo restante de um lote
+
+    ``registrar`` conta uma imagem concluída e só retorna verdadeiro quando
+    já passou ``intervalo`` segundos desde a última atualização (ou no fim do
+    lote), para que imagens pequenas não fiquem esperando a tela redesenhar.
+    """
+
+    def __init__(self, total, intervalo=INTERVALO_PROGRESSO):
+        self.total = total
+        self.intervalo = intervalo
+        self.concluidas = 0
+        self.inicio = time.monotonic()
+        self._ultima_atualizacao = None
+
+    def registrar(self):
+        self.concluidas += 1
+        agora = time.monotonic()
+        if (self.concluidas >= self.total or self._ultima_atualizacao is None
+                or agora - self._ultima_atualizacao >= self.intervalo):
+            self._ultima_atualizacao = agora
+            return True
+        return False
+
+    @property
+    def taxa(self):
+        decorrido = time.monotonic() - self.inicio
+        return self.concluidas / decorrido if decorrido > 0 else 0.0
+
+    @property
+    def eta(self):
+        taxa = self.taxa
+        if not taxa:
+            return None
+        return (self.total - self.concluidas) / taxa
+
+
+def cm_to_pixels(cm, dpi):
+    """Converte centímetros para pixels"""
+    return int((cm * dpi) / 2.54)
+
+
+def hex_to_rgb(hex_color):
+    """Converte cor hexadecimal para tupla RGB"""
+    hex_color = hex_color.lstrip('#')
+    return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+
+def ler_orientacao(imagem):
+    """Lê a orientação EXIF (tag 274) sem decodificar os pixels"""
+    try:
+        return imagem.getexif().get(274)
+    except (AttributeError, KeyError, IndexError, ValueError, SyntaxError):
+        return None
+
+
+def orientar(imagem, orientacao):
+    """Aplica a transposição que endireita a ``orientacao`` EXIF (1 a 8)"""
+    transposicao = TRANSPOSICOES.get(orientacao)
+    return imagem if transposicao is None else imagem.transpose(transposicao)
+
+
+def caixa_orientada(caixa, orientacao):
+    """Caixa ``caixa`` da foto já endireitada, vista na imagem ainda sem orientar"""
+    return caixa[::-1] if orientacao in ORIENTACOES_GIRADAS else caixa
+
+
+def _tamanho_reduzido(tamanho, caixa):
+    """Tamanho que ``thumbnail(caixa)`` daria a uma imagem de ``tamanho``
+
+    Mesmo arredondamento do Pillow, para que uma versão reduzida a partir de
+    outra tenha exatamente o tamanho que teria vindo da imagem original.
+    """
+    largura, altura = tamanho
+    x, y = caixa
+    if x >= largura and y >= altura:
+        return tamanho
+    proporcao = largura / altura
+    if x / y >= proporcao:
+        x = max(min(math.floor(y * proporcao), math.ceil(y * proporcao),
+                    key=lambda n: abs(proporcao - n / y)), 1)
+    else:
+        y = max(min(math.floor(x / proporcao), math.ceil(x / proporcao),
+                    key=lambda n: 0 if n == 0 else abs(proporcao - x / n)), 1)
+    return x, y
+
+
+def tamanho_orientado(tamanho, caixa, orientacao):
+    """Tamanho da redução, ainda sem orientar, de uma imagem de ``tamanho``
+
+    É o tamanho que ``thumbnail(caixa)`` daria à imagem já endireitada, com
+    largura e altura trocadas nas orientações giradas (o arredondamento do
+    Pillow não é simétrico entre as duas medidas).
+    """
+    if orientacao in ORIENTACOES_GIRADAS:
+        return _tamanho_reduzido(tamanho[::-1], caixa)[::-1]
+    return _tamanho_reduzido(tamanho, caixa)
+
+
+def corrigir_orientacao(imagem):
+    """Corrige a rotação automática baseada nos metadados EXIF"""
+    return orientar(imagem, ler_orientacao(imagem))
+
+
+def reduzir_na_decodificacao(imagem, novo_tamanho):
+    """Usa a escala DCT do decodificador JPEG (modo draft) antes do LANCZOS
+
+    O JPEG é decodificado na menor escala (1/2, 1/4 ou 1/8) que ainda fica
+    maior ou igual ao tamanho que a imagem terá depois do ``thumbnail``, de
+    modo que o redimensionamento final trabalhe sobre uma imagem menor.
+    Precisa ser chamada antes de qualquer acesso aos pixels.
+    """
+    if imagem.format != 'JPEG':
+        return imagem
+
+    largura, altura = imagem.size
+    caixa = caixa_orientada(novo_tamanho, ler_orientacao(imagem))
+
+    escala = min(caixa[0] / largura, caixa[1] / altura)
+    if escala >= 1:
+        return imagem
+
+    imagem.draft(imagem.mode, (math.ceil(largura * escala), math.ceil(altura * escala)))
+    return imagem
+
+
+def redimensionar_mantendo_proporcao(imagem, novo_tamanho, reducing_gap=2.0):
+    """Redimensiona a imagem mantendo proporção
+
+    Com ``reducing_gap`` a imagem é primeiro reduzida por um fator inteiro
+    (média de blocos, ``Image.reduce``) até ficar ``reducing_gap`` vezes
+    maior que o destino, e só então passa pelo LANCZOS. ``None`` faz o
+    LANCZOS sobre a imagem inteira (mais lento, qualidade máxima). A imagem
+    é normalizada antes e convertida para sRGB depois (ver cores.py).
+    """
+    imagem = cores.normalizar(imagem)
+    imagem.thumbnail(novo_tamanho, Image.LANCZOS, reducing_gap=reducing_gap)
+    imagem, _ = cores.converter(imagem)
+    nova_imagem = Image.new('RGB', novo_tamanho, 'white')
+    pos_x = (novo_tamanho[0] - imagem.width) // 2
+    pos_y = (novo_tamanho[1] - imagem.height) // 2
+    nova_imagem.paste(imagem, (pos_x, pos_y))
+    return nova_imagem
+
+
+def calcular_posicao_logo(tamanho, logo_tamanho, config):
+    """Calcula a posição do logo baseado na seleção e nas margens"""
+    largura, altura = tamanho
+    logo_largura, logo_altura = logo_tamanho
+
+    if config.logo_pos == "Canto Inferior Direito":
+        pos_x = largura - logo_largura - config.margem_direita
+        pos_y = altura - logo_altura - config.margem_inferior + config.ajuste_vertical
+    elif config.logo_pos == "Canto Inferior Esquerdo":
+        pos_x = config.margem_esquerda
+        pos_y = altura - logo_altura - config.margem_inferior + config.ajuste_vertical
+    elif config.logo_pos == "Canto Superior Direito":
+        pos_x = largura - logo_largura - config.margem_direita
+        pos_y = config.margem_superior + config.ajuste_vertical
+    elif config.logo_pos == "Canto Superior Esquerdo":
+        pos_x = config.margem_esquerda
+        pos_y = config.margem_superior + config.ajuste_vertical
+    else:  # Centro
+        pos_x = (largura - logo_largura) // 2
+        pos_y = (altura - logo_altura) // 2 + config.ajuste_vertical
+
+    # Garante que as posições não sejam negativas
+    return int(max(0, pos_x)), int(max(0, pos_y))
+
+
+def aplicar_logo(imagem, logo, config):
+    """Aplica o logo na posição configurada"""
+    posicao = calcular_posicao_logo(imagem.size, logo.size, config)
+    imagem.paste(logo, posicao, logo)
+    return imagem
+
+
+def adicionar_borda_solida(imagem, espessura, cor):
+    """Adiciona uma borda sólida à imagem"""
+    if espessura <= 0:
+        return imagem
+    cor_rgb = hex_to_rgb(cor)
+    return ImageOps.expand(imagem, border=espessura, fill=cor_rgb)
+
+
+def _padrao_tracos(comprimento, traco, intervalo):
+    """Bytes de uma linha tracejada: 255 nos traços, 0 nos intervalos
+
+    Os traços começam em múltiplos de ``traco + intervalo`` e só até o
+    penúltimo pixel, como no desenho original com draw.line.
+    """
+    periodo = traco + intervalo
+    linha = bytearray((b'\xff' * traco + b'\x00' * intervalo) * (comprimento // periodo + 1))
+    del linha[comprimento:]
+    if comprimento > 1 and (comprimento - 1) % periodo == 0:
+        linha[-1] = 0
+    return bytes(linha)
+
+
+@lru_cache(maxsize=32)
+def mascara_pontilhada(tamanho, espessura, traco=6, intervalo=14, traco_cheio=False):
+    """Máscaras (modo L) dos traços brancos da borda pontilhada
+
+    ``tamanho`` é o tamanho da imagem já com a borda. Com ``traco_cheio`` os
+    traços ocupam toda a espessura da borda; caso contrário são linhas de
+    1 pixel na primeira linha/coluna de cada lado. Retorna uma lista de
+    ``(caixa, mascara)``, uma para cada faixa da borda, montada uma vez por
+    combinação de parâmetros e reaproveitada (as máscaras não devem ser
+    alteradas).
+    """
+    largura, altura = tamanho
+    horizontal = Image.frombytes('L', (largura, 1), _padrao_tracos(largura, traco, intervalo))
+    vertical = Image.frombytes('L', (1, altura), _padrao_tracos(altura, traco, intervalo))
+    if traco_cheio:
+        horizontal = horizontal.resize((largura, espessura), Image.NEAREST)
+        vertical = vertical.resize((espessura, altura), Image.NEAREST)
+
+    mascara = Image.new('L', tamanho, 0)
+    # Colar cada lado usando ele próprio como máscara soma os traços nos cantos
+    for lado, posicao in ((horizontal, (0, 0)),
+                          (horizontal, (0, altura - espessura)),
+                          (vertical, (0, 0)),
+                          (vertical, (largura - espessura, 0))):
+        mascara.paste(lado, posicao, lado)
+
+    faixas = [
+        (0, 0, largura, espessura),  # Topo
+        (0, altura - espessura, largura, altura),  # Base
+        (0, espessura, espessura, altura - espessura),  # Esquerda
+        (largura - espessura, espessura, largura, altura - espessura),  # Direita
+    ]
+    return [(caixa, mascara.crop(caixa)) for caixa in faixas
+            if caixa[2] > caixa[0] and caixa[3] > caixa[1]]
+
+
+def adicionar_borda_pontilhada(imagem, espessura, cor, traco=6, intervalo=14, traco_cheio=False):
+    """Adiciona uma borda pontilhada à imagem
+
+    A borda é preenchida com ``cor`` e recebe traços brancos de ``traco``
+    pixels separados por ``intervalo`` pixels, aplicados de uma só vez a
+    partir de mascara_pontilhada.
+    """
+    if espessura <= 0:
+        return imagem
+    if traco < 1 or intervalo < 0:
+        raise ValueError("O traço deve ter ao menos 1 pixel e o intervalo não pode ser negativo")
+
+    cor_rgb = hex_to_rgb(cor)
+    temp_img = ImageOps.expand(imagem, border=espessura, fill=cor_rgb)
+    for caixa, mascara in mascara_pontilhada(temp_img.size, espessura, traco, intervalo, traco_cheio):
+        temp_img.paste("white", caixa, mascara)
+    return temp_img
+
+
+def adicionar_borda(imagem, espessura, cor, pontilhada=False, traco=6, intervalo=14,
+                    traco_cheio=False):
+    """Adiciona borda à imagem conforme as configurações"""
+    if pontilhada:
+        return adicionar_borda_pontilhada(imagem, espessura, cor, traco, intervalo, traco_cheio)
+    else:
+        return adicionar_borda_solida(imagem, espessura, cor)
+
+
+def criar_pdf(imagens, pdf_path, largura_cm, altura_cm, aviso=None, perfil_icc=None):
+    """Cria PDF com 2 imagens por página A4 paisagem
+
+    ``imagens`` são caminhos das imagens geradas ou os bytes já codificados;
+    JPEGs são incorporados diretamente, sem decodificar nem recomprimir.
+    ``aviso`` recebe as mensagens destinadas ao usuário (ex.: QMessageBox na
+    interface gráfica, stderr na linha de comando). ``perfil_icc`` são os
+    bytes do perfil de saída das imagens, se não forem sRGB.
+    """
+    try:
+        from pdf import EscritorPdf
+        with EscritorPdf(pdf_path, largura_cm, altura_cm, aviso, perfil_icc) as escritor:
+            for imagem in imagens:
+                escritor.adicionar(imagem)
+        return True
+    except Exception as e:
+        print(f"Erro ao criar PDF: {e}", file=sys.stderr)
+        return False
+
+
+# Módulo do plugin do Pillow de cada formato lido ou gravado pelo programa
+PLUGINS_PILLOW = {
+    "JPEG": "JpegImagePlugin",
+    "PNG": "PngImagePlugin",
+    "BMP": "BmpImagePlugin",
+    "TIFF": "TiffImagePlugin",
+    "WEBP": "WebPImagePlugin",
+    "AVIF": "AvifImagePlugin",
+}
+
+
+def carregar_plugins(formatos):
+    """Importa só os plugins do Pillow dos ``formatos``
+
+    O Image.open e o save chamam Image.init(), que importa as dezenas de
+    plugins do Pillow, quando o formato pedido ainda não foi registrado.
+    """
+    for formato in formatos:
+        try:
+            importlib.import_module(f"PIL.{PLUGINS_PILLOW[formato]}")
+        except ImportError:  # Versão do Pillow sem o formato (ex.: AVIF)
+            pass
+
+
+def _formatos_lote(config):
+    """Formatos lidos e gravados por um lote com a ``config``"""
+    saida = codificadores.FORMATOS_SAIDA.get(config.formato_saida)
+    return (*EXTENSOES_POR_FORMATO, saida) if saida else tuple(EXTENSOES_POR_FORMATO)
+
+
+def preparar_codecs():
+    """Carrega os plugins e codecs do Pillow dos formatos aceitos no lote
+
+    Importa só os plugins dos formatos de entrada e de saída e faz uma
+    codificação e uma decodificação mínimas de cada formato de entrada,
+    para que a primeira imagem do primeiro lote não pague a importação. A
+    tela de abertura chama esta função em segundo plano.
+    """
+    carregar_plugins((*EXTENSOES_POR_FORMATO, *filter(None, codificadores.FORMATOS_SAIDA.values())))
+    amostra = Image.new('RGB', (16, 16))
+    for formato in EXTENSOES_POR_FORMATO:
+        buffer = io.BytesIO()
+        amostra.save(buffer, format=formato)
+        buffer.seek(0)
+        with Image.open(buffer, formats=(formato,)) as img:
+            img.load()
+
+
+def carregar_logo(logo_file):
+    """Carrega o logo em RGBA"""
+    with faixas.sem_limite_do_pillow(), Image.open(logo_file) as logo:
+        faixas.conferir_pixels(logo, Configuracao.limite_megapixels)
+        return logo.convert("RGBA")
+
+
+def listar_imagens(origem, recursivo=False, incluir=(), excluir=()):
+    """Lista as imagens suportadas da pasta de origem, em ordem
+
+    O formato é reconhecido pelo conteúdo do arquivo (ver descoberta).
+    """
+    return [relativo for relativo, _ in descobrir_imagens(origem, recursivo, incluir, excluir)]
+
+
+def montar_tarefa(origem, destino, relativo, formato, pastas=None, formato_saida="original",
+                  saidas=None):
+    """Tarefa ``(arquivo, entrada, saida)`` de uma imagem encontrada na origem
+
+    Cria a subpasta de destino correspondente; ``pastas`` guarda as que já
+    foram criadas, para não repetir a chamada a cada imagem. Quando
+    ``formato_saida`` converte a imagem, a extensão é trocada pela do novo
+    formato; ``saidas`` (dicionário nome -> origem) guarda os nomes já
+    usados, para que duas origens (ex.: foto.jpg e foto.png convertidas para
+    JPEG) não gravem o mesmo arquivo.
+    """
+    formato_gravado = codificadores.formato_destino(formato_saida, formato)
+    if formato_gravado == formato:
+        nome = nome_saida(relativo, formato)
+    else:
+        nome = codificadores.nome_convertido(relativo, formato_gravado)
+    if saidas is not None and saidas.setdefault(os.path.normcase(nome), relativo) != relativo:
+        nome = relativo + codificadores.EXTENSOES[formato_gravado]
+        saidas[os.path.normcase(nome)] = relativo
+
+    saida = os.path.join(destino, *nome.split("/"))
+    pasta = os.path.dirname(saida)
+    if pastas is None or pasta not in pastas:
+        os.makedirs(pasta, exist_ok=True)
+        if pastas is not None:
+            pastas.add(pasta)
+    return relativo, os.path.join(origem, *relativo.split("/")), saida
+
+
+class _DescobertaTarefas:
+    """Percorre a origem em uma thread própria, à frente do processamento
+
+    As tarefas ficam disponíveis assim que cada imagem é encontrada, então o
+    lote começa antes de a pasta inteira ser percorrida. ``encontradas``
+    cresce até o total do lote; as subpastas de destino são criadas conforme
+    aparecem.
+    """
+
+    def __init__(self, origem, destino, config):
+        self.encontradas = 0
+        self._fila = queue.Queue()
+        self._parar = threading.Event()
+        self._erro = None
+        self._thread = threading.Thread(target=self._percorrer, args=(origem, destino, config),
+                                        name="descoberta", daemon=True)
+        self._thread.start()
+
+    def _percorrer(self, origem, destino, config):
+        pastas = set()
+        saidas = {}
+        try:
+            # Cada pasta é listada em ordem alfabética: além das páginas do PDF,
+            # é o que decide qual de dois nomes de saída que colidem recebe o
+            # sufixo, e isso não pode variar de uma execução para outra
+            for relativo, formato in descobrir_imagens(origem, config.recursivo, config.incluir,
+                                                       config.excluir, ignorar=(destino,)):
+                if self._parar.is_set():
+                    break
+                self._fila.put(montar_tarefa(origem, destino, relativo, formato, pastas,
+                                             config.formato_saida, saidas))
+                self.encontradas += 1
+        except BaseException as e:
+            self._erro = e
+        finally:
+            self._fila.put(None)
+
+    def __iter__(self):
+        while True:
+            tarefa = self._fila.get()
+            if tarefa is None:
+                if self._erro is not None:
+                    raise self._erro
+                return
+            yield tarefa
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+
+
+class ModeloSobreposicao:
+    """Logo e borda de um lote, compostos uma única vez
+
+    Todas as imagens do lote são centralizadas na mesma tela
+    ``tamanho_final``, então a posição do logo e a geometria da borda não
+    mudam de uma imagem para outra. O modelo guarda só as regiões que cobrem
+    a imagem (o retângulo do logo e as quatro faixas da borda); cada imagem é
+    finalizada colando essas peças sobre a tela, sem recalcular posições nem
+    redesenhar a borda.
+    """
+
+    def __init__(self, logo, config):
+        largura, altura = config.tamanho_final
+        espessura = config.borda_espessura if config.borda else 0
+        self.tamanho_conteudo = (largura, altura)
+        self.deslocamento = max(0, espessura)
+
+        # Mesmo resultado de aplicar_logo + adicionar_borda sobre uma imagem transparente
+        camada = Image.new('RGBA', (largura, altura), (0, 0, 0, 0))
+        pos_x, pos_y = calcular_posicao_logo((largura, altura), logo.size, config)
+        camada.paste(logo, (pos_x, pos_y))
+        if config.borda:
+            camada = adicionar_borda(camada, config.borda_espessura, config.borda_cor,
+                                     config.borda_pontilhada, config.borda_traco,
+                                     config.borda_intervalo, config.borda_traco_cheio)
+        self.tamanho = camada.size
+
+        d = self.deslocamento
+        total_largura, total_altura = self.tamanho
+        regioes = [
+            (d + pos_x, d + pos_y, d + min(pos_x + logo.width, largura),
+             d + min(pos_y + logo.height, altura)),  # Logo
+        ]
+        if d:
+            regioes += [
+                (0, 0, total_largura, d),  # Topo
+                (0, d + altura, total_largura, total_altura),  # Base
+                (0, d, d, d + altura),  # Esquerda
+                (d + largura, d, total_largura, d + altura),  # Direita
+            ]
+
+        # Logo e borda ficam separados para que o tempo de cada um seja medido
+        self.pecas_logo = []
+        self.pecas_borda = []
+        for indice, caixa in enumerate(regioes):
+            if caixa[2] <= caixa[0] or caixa[3] <= caixa[1]:
+                continue
+            recorte = camada.crop(caixa)
+            alfa_min, alfa_max = recorte.getchannel('A').getextrema()
+            if alfa_max == 0:
+                continue
+            pecas = self.pecas_logo if indice == 0 else self.pecas_borda
+            if alfa_min == 255:
+                pecas.append((caixa[:2], recorte.convert('RGB'), None))
+            else:
+                pecas.append((caixa[:2], recorte, recorte))
+
+    # Campos da Configuracao que alteram o modelo (além do próprio logo)
+    CAMPOS = ("largura_cm", "altura_cm", "dpi", "logo_pos", "margem_esquerda", "margem_direita",
+              "margem_superior", "margem_inferior", "ajuste_vertical", "borda", "borda_espessura",
+              "borda_cor", "borda_pontilhada", "borda_traco", "borda_intervalo", "borda_traco_cheio")
+
+    @classmethod
+    def chave(cls, config):
+        """Identifica as configurações do modelo, para reaproveitá-lo entre lotes com o mesmo logo"""
+        return tuple(getattr(config, campo) for campo in cls.CAMPOS)
+
+    def aplicar(self, imagem, medidas=None):
+        """Centraliza a imagem já reduzida na tela final e aplica logo e borda
+
+        Com ``medidas`` guarda o tempo de cada parte (tela, logo e borda).
+        """
+        inicio = time.perf_counter()
+        largura, altura = self.tamanho_conteudo
+        final = Image.new('RGB', self.tamanho, 'white')
+        final.paste(imagem, (self.deslocamento + (largura - imagem.width) // 2,
+                             self.deslocamento + (altura - imagem.height) // 2))
+        inicio_logo = time.perf_counter()
+        for posicao, peca, mascara in self.pecas_logo:
+            final.paste(peca, posicao, mascara)
+        inicio_borda = time.perf_counter()
+        for posicao, peca, mascara in self.pecas_borda:
+            final.paste(peca, posicao, mascara)
+        if medidas is not None:
+            medidas["compor_s"] = inicio_logo - inicio
+            medidas["logo_s"] = inicio_borda - inicio_logo
+            medidas["borda_s"] = time.perf_counter() - inicio_borda
+        return final
+
+
+def decodificar_imagem(img, config, medidas=None, tamanho=None):
+    """Decodifica a imagem aberta, com pré-redução
+
+    A pré-redução mira ``tamanho`` (por padrão ``config.tamanho_final``).
+    Imagens acima de ``config.limite_megapixels`` são recusadas; as que
+    passariam de ``config.memoria_maxima_mb`` decodificadas por inteiro são
+    lidas em faixas e já saem reduzidas ao tamanho final (ver faixas.py).
+    Retorna a imagem carregada e normalizada para L, RGB ou CMYK (ver
+    cores.py), ainda sem orientar, e as medidas da imagem
+    (formato, tamanho de origem, orientação EXIF e tempo de decodificação),
+    acrescentadas a ``medidas`` quando informado. A orientação é aplicada
+    por reduzir_imagem, depois do redimensionamento.
+    """
+    if medidas is None:
+        medidas = {}
+    medidas["formato"] = img.format
+    faixas.conferir_pixels(img, config.limite_megapixels)
+    teto = config.memoria_maxima_mb * 2**20
+    grande = faixas.excede(img, teto)
+    if grande and img.format == "PNG" and "exif" not in img.info:
+        # O PNG só acharia um eXIf gravado depois dos pixels decodificando tudo
+        medidas["orientacao"] = None
+    else:
+        medidas["orientacao"] = ler_orientacao(img)
+    medidas["largura_origem"], medidas["altura_origem"] = img.size
+    caixa = tamanho or config.tamanho_final
+    inicio = time.perf_counter()
+    if config.decodificacao_reduzida or grande:
+        img = reduzir_na_decodificacao(img, caixa)
+    if grande and faixas.excede(img, teto) and faixas.como_gravada(img):
+        img = faixas.decodificar(img, tamanho_orientado(img.size, caixa, medidas["orientacao"]),
+                                 REDUCING_GAPS[config.reducao], teto)
+        medidas["em_faixas"] = True
+        medidas["decodificar_s"] = time.perf_counter() - inicio
+    else:
+        img.load()
+        medidas["decodificar_s"] = time.perf_counter() - inicio
+        if img.format == "TIFF":
+            medidas["orientacao"] = None  # O plugin TIFF já endireita a imagem ao carregar
+        inicio = time.perf_counter()
+        img = cores.normalizar(img)
+        medidas["normalizar_s"] = time.perf_counter() - inicio
+    return img, medidas
+
+
+def converter_cores(img, config, medidas):
+    """Converte a imagem já reduzida para RGB no perfil de saída da configuração"""
+    inicio = time.perf_counter()
+    img, perfil_origem = cores.converter(img, config.perfil_cores, config.intencao_cores,
+                                         config.gerenciar_cores)
+    medidas["cores_s"] = time.perf_counter() - inicio
+    if perfil_origem:
+        medidas["perfil_origem"] = perfil_origem
+    return img
+
+
+def reduzir_imagem(img, config, medidas):
+    """Reduz a imagem decodificada ao tamanho final, converte as cores e a endireita
+
+    A redução é feita na imagem ainda sem orientar, com a caixa trocada nas
+    orientações giradas; a conversão para o perfil de saída e a
+    transposição exata da orientação EXIF (``medidas["orientacao"]``) já
+    trabalham sobre a imagem pequena.
+    """
+    orientacao = medidas.get("orientacao")
+    alvo = tamanho_orientado(img.size, config.tamanho_final, orientacao)
+    if config.medir_reducao:
+        # Refaz o redimensionamento sem pré-redução só para medir o ganho
+        inicio = time.perf_counter()
+        img.resize(alvo, Image.LANCZOS)
+        medidas["redimensionar_exato_s"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    if img.size != alvo:
+        img = img.resize(alvo, Image.LANCZOS, reducing_gap=REDUCING_GAPS[config.reducao])
+    medidas["redimensionar_s"] = time.perf_counter() - inicio
+
+    img = converter_cores(img, config, medidas)
+
+    inicio = time.perf_counter()
+    img = orientar(img, orientacao)
+    medidas["orientar_s"] = time.perf_counter() - inicio
+    return img
+
+
+def compor_imagem(img, modelo, config, medidas):
+    """Redimensiona, converte e endireita a imagem decodificada e aplica logo e borda do modelo"""
+    return modelo.aplicar(reduzir_imagem(img, config, medidas), medidas)
+
+
+@dataclass
+class _ContextoLote:
+    """O que cada trabalhador precisa para processar qualquer imagem do lote"""
+    modelo: ModeloSobreposicao
+    config: Configuracao
+    cache: object = None  # cache.CacheSaida
+    assinatura: str = None
+    qualidades: object = None  # codificadores.MemoriaQualidade, com limite de tamanho
+
+    def novo_item(self, tarefa):
+        return _ItemLote(*tarefa)
+
+    @property
+    def etapas(self):
+        return _ETAPAS
+
+
+# Estado de cada processo do pool, preenchido uma única vez por _iniciar_trabalhador
+_estado_trabalhador = None
+
+
+def _iniciar_trabalhador(contexto):
+    global _estado_trabalhador
+    _estado_trabalhador = contexto
+    carregar_plugins(_formatos_lote(contexto.config))
+
+
+def _processar_tarefa(tarefa, contexto=None):
+    """Executa uma tarefa do lote sem deixar exceções escaparem do pool
+
+    Passa pelas mesmas etapas do modo "estagios", uma depois da outra.
+    """
+    if contexto is None:
+        contexto = _estado_trabalhador
+    item = contexto.novo_item(tarefa)
+    for nome in ESTAGIOS:
+        item = _estagio(nome, contexto.etapas[nome], contexto)(item)
+        if isinstance(item, Concluido):
+            return item.valor
+    return item
+
+
+def _executar_tarefas(tarefas, contexto, trabalhadores, modo):
+    """Gera os resultados das tarefas na mesma ordem em que foram listadas
+
+    No máximo ``2 * trabalhadores`` tarefas ficam enviadas ao pool ao mesmo
+    tempo; quando o consumidor interrompe a iteração (cancelamento), as
+    tarefas ainda não iniciadas são descartadas e só as que estão em
+    andamento terminam.
+    """
+    if trabalhadores <= 1:
+        yield from map(partial(_processar_tarefa, contexto=contexto), tarefas)
+        return
+
+    if modo == "threads":
+        # O Pillow libera o GIL na decodificação, no redimensionamento e na codificação
+        executor = ThreadPoolExecutor(max_workers=trabalhadores)
+        funcao = partial(_processar_tarefa, contexto=contexto)
+    elif modo == "processos":
+        # Importado só aqui: carrega o multiprocessing, que os outros modos não usam
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=trabalhadores, initializer=_iniciar_trabalhador,
+                                       initargs=(contexto,))
+        funcao = _processar_tarefa
+    else:
+        raise ValueError(f"Modo de execução desconhecido: {modo}")
+
+    with executor:
+        restantes = iter(tarefas)
+        pendentes = deque(executor.submit(funcao, tarefa)
+                          for tarefa in islice(restantes, 2 * trabalhadores))
+        try:
+            while pendentes:
+                futuro = pendentes.popleft()
+                for tarefa in islice(restantes, 1):
+                    pendentes.append(executor.submit(funcao, tarefa))
+                yield futuro.result()
+        finally:
+            for futuro in pendentes:
+                futuro.cancel()
+
+
+class _ItemLote:
+    """Uma imagem em trânsito pelos estágios do pipeline"""
+
+    __slots__ = ("arquivo", "entrada", "saida", "dados", "imagem", "medidas", "chave")
+
+    def __init__(self, arquivo, entrada, saida):
+        self.arquivo = arquivo
+        self.entrada = entrada
+        self.saida = saida
+        self.dados = None
+        self.imagem = None
+        self.medidas = {}
+        self.chave = None
+
+    def falhou(self, etapa, erro):
+        """Resultado do item que falhou em ``etapa``"""
+        self.medidas.update(etapa_erro=etapa, tipo_erro=type(erro).__name__)
+        return self.arquivo, self.saida, str(erro), self.medidas
+
+
+def _estagio(nome, funcao, contexto):
+    """Adapta uma etapa do processamento a um estágio do pipeline
+
+    Erros da imagem encerram o item com a mensagem; as medidas do erro
+    (etapa, tipo da exceção e os tempos até a falha) vão para o relatório.
+    """
+    def executar(item):
+        try:
+            return funcao(item, contexto)
+        except Exception as e:
+            return Concluido(item.falhou(nome, e))
+    return executar
+
+
+def _ler(item, contexto):
+    inicio = time.perf_counter()
+    item.dados = faixas.ler_arquivo(item.entrada, contexto.config.memoria_maxima_mb * 2**20)
+    item.medidas["ler_s"] = time.perf_counter() - inicio
+    item.medidas["bytes_lidos"] = len(item.dados)
+    if contexto.cache is not None:
+        item.chave = contexto.cache.chave(item.entrada, contexto.assinatura, item.saida,
+                                          dados=item.dados)
+        if contexto.cache.recuperar(item.chave, item.saida):
+            item.medidas["cache"] = True
+            return Concluido((item.arquivo, item.saida, None, item.medidas))
+    return item
+
+
+def _decodificar(item, contexto):
+    # Os dados já estão em memória (ou mapeados): não há arquivo a fechar
+    inicio = time.perf_counter()
+    # Com o formato identificado, o Pillow tenta só esse plugin e, se o arquivo
+    # estiver corrompido, não carrega todos os outros procurando um que o abra
+    formato = identificar_formato(item.dados)
+    # O limite contra imagens-bomba é o de Configuracao.limite_megapixels,
+    # conferido em decodificar_imagem; o do Pillow só fica desligado aqui
+    with faixas.sem_limite_do_pillow():
+        try:
+            img = Image.open(faixas.fonte(item.dados), formats=(formato,) if formato else None)
+        except Image.UnidentifiedImageError:
+            raise Image.UnidentifiedImageError(
+                f"cannot identify image file {item.entrada!r}") from None
+        item.medidas["abrir_s"] = time.perf_counter() - inicio
+        item.imagem, _ = decodificar_imagem(img, contexto.config, item.medidas)
+    item.dados = None
+    return item
+
+
+def _transformar(item, contexto):
+    item.imagem = compor_imagem(item.imagem, contexto.modelo, contexto.config, item.medidas)
+    return item
+
+
+def _codificar(item, contexto):
+    inicio = time.perf_counter()
+    # Pela extensão já escolhida na tarefa, sem Image.registered_extensions(),
+    # que carregaria todos os plugins do Pillow
+    formato = codificadores.formato_do_arquivo(item.saida)
+    item.dados, qualidade, tentativas = codificadores.codificar(item.imagem, formato,
+                                                                 contexto.config, contexto.qualidades)
+    item.imagem = None
+    item.medidas["codificar_s"] = time.perf_counter() - inicio
+    if qualidade is not None:
+        item.medidas["qualidade"] = qualidade
+        item.medidas["tentativas_codificacao"] = tentativas
+    return item
+
+
+def gravar_saida(caminho, dados):
+    """Grava ``dados`` em ``caminho`` por um arquivo temporário na mesma pasta
+
+    A saída de uma execução anterior pode ser um hardlink para uma entrada
+    do cache (CacheSaida.recuperar); o os.replace troca só o nome, sem
+    escrever através do link, com ou sem cache nesta execução.
+    """
+    temporario = f"{caminho}.{os.urandom(16).hex()}.tmp"
+    try:
+        with open(temporario, 'wb') as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+    except OSError:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def _gravar(item, contexto):
+    inicio = time.perf_counter()
+    gravar_saida(item.saida, item.dados)
+    item.medidas["gravar_s"] = time.perf_counter() - inicio
+    item.medidas["bytes_gravados"] = len(item.dados)
+    item.dados = None
+    if contexto.cache is not None:
+        contexto.cache.guardar(item.chave, item.saida)
+        item.medidas["cache"] = False
+    return item.arquivo, item.saida, None, item.medidas
+
+
+_ETAPAS = {
+    "leitura": _ler,
+    "decodificacao": _decodificar,
+    "transformacao": _transformar,
+    "codificacao": _codificar,
+    "gravacao": _gravar,
+}
+
+
+def trabalhadores_estagios(trabalhadores=TRABALHADORES_PADRAO, **ajustes):
+    """Threads por estágio do modo "estagios"
+
+    As etapas de CPU recebem ``trabalhadores`` threads (o Pillow libera o GIL
+    na decodificação, no redimensionamento e na codificação); a leitura tem
+    folga para esconder a latência de discos de rede. ``ajustes`` substitui o
+    número de um estágio (ex.: ``leitura=8``).
+    """
+    desconhecidos = set(ajustes) - set(ESTAGIOS)
+    if desconhecidos:
+        raise ValueError(f"Estágios desconhecidos: {', '.join(sorted(desconhecidos))}")
+    contagem = {
+        "leitura": 4,
+        "decodificacao": trabalhadores,
+        "transformacao": trabalhadores,
+        "codificacao": max(1, trabalhadores // 2),
+        "gravacao": 2,
+    }
+    contagem.update(ajustes)
+    for nome, quantidade in contagem.items():
+        if quantidade < 1:
+            raise ValueError(f"O estágio {nome} precisa de pelo menos 1 trabalhador")
+    return contagem
+
+
+def _criar_contexto(config, logo, modelo, cache):
+    carregar_plugins(_formatos_lote(config))
+    contexto = _ContextoLote(modelo or ModeloSobreposicao(logo, config), config, cache)
+    if cache is not None:
+        contexto.assinatura = assinatura_configuracao(config, logo)
+    if codificadores.limite_bytes(config):
+        contexto.qualidades = codificadores.MemoriaQualidade()
+    return contexto
+
+
+def _criar_pipeline(contexto, estagios):
+    return Pipeline([Estagio(nome, _estagio(nome, contexto.etapas[nome], contexto), estagios[nome])
+                     for nome in ESTAGIOS])
+
+
+def processar_fluxo(tarefas, config, logo=None, trabalhadores=TRABALHADORES_PADRAO,
+                    cache=None, estagios=None, modelo=None):
+    """Processa as tarefas ``(arquivo, entrada, saida)`` à medida que chegam
+
+    Gera ``(arquivo, saida, erro, medidas)`` na ordem de chegada, pelo mesmo
+    pipeline em estágios do modo "estagios". O logo, o modelo de
+    sobreposição e as threads dos estágios são criados uma única vez e
+    reaproveitados por todo o fluxo, que pode não ter fim: ``tarefas`` pode
+    bloquear esperando o próximo arquivo (ex.: pasta vigiada).
+    """
+    codificadores.validar(config)
+    if logo is None:
+        logo = carregar_logo(config.logo_file)
+    contexto = _criar_contexto(config, logo, modelo, cache)
+    pipeline = _criar_pipeline(contexto, estagios or trabalhadores_estagios(trabalhadores))
+    yield from pipeline.executar(contexto.novo_item(tarefa) for tarefa in tarefas)
+
+
+class _DestinoLote:
+    """Resultado, relatório e PDF de uma pasta de destino do lote
+
+    O PDF é gravado à medida que as imagens ficam prontas, em paralelo com o
+    processamento das seguintes, na ordem dos arquivos.
+    """
+
+    def __init__(self, origem, destino, config, aviso=None, modo=None, trabalhadores=None):
+        os.makedirs(destino, exist_ok=True)
+        self.destino = destino
+        self.config = config
+        self.resultado = ResultadoLote()
+        self.relatorio = RelatorioLote(origem, destino, config, modo, trabalhadores)
+        self.escritor = None
+        if config.exportar_pdf:
+            self.resultado.pdf_path = os.path.join(destino, config.pdf_arquivo)
+            try:
+                from pdf import EscritorPdf  # Só os lotes com PDF carregam o gravador
+                perfil = (cores.dados_perfil_saida(config.perfil_cores)
+                          if config.gerenciar_cores else None)
+                self.escritor = EscritorPdf(self.resultado.pdf_path, config.largura_cm,
+                                            config.altura_cm, aviso, perfil)
+            except Exception as e:
+                print(f"Erro ao criar PDF: {e}", file=sys.stderr)
+                self.resultado.pdf_ok = False
+
+    def registrar(self, arquivo, saida, erro, medidas):
+        """Acumula o resultado de uma imagem e a acrescenta ao PDF"""
+        resultado = self.resultado
+        self.relatorio.registrar(arquivo, saida, erro, medidas)
+        if erro is not None:
+            resultado.erros.append((arquivo, erro))
+            return
+        resultado.processadas += 1
+        resultado.arquivos_saida.append(saida)
+        resultado.registrar(medidas)
+        if self.escritor is not None:
+            try:
+                inicio = time.perf_counter()
+                self.escritor.adicionar(saida)
+                self.relatorio.medir_pdf("adicionar_s", time.perf_counter() - inicio)
+            except Exception as e:
+                print(f"Erro ao criar PDF: {e}", file=sys.stderr)
+                self.abortar()
+                resultado.pdf_ok = False
+
+    def abortar(self):
+        if self.escritor is not None:
+            self.escritor.abortar()
+            self.escritor = None
+
+    def concluir(self, cancelado=False, estagios=None):
+        """Fecha o PDF (ou o descarta, se o lote foi cancelado) e gera o relatório"""
+        resultado = self.resultado
+        resultado.cancelado = cancelado
+        resultado.estagios = estagios or {}
+        if self.escritor is not None and (cancelado or not resultado.arquivos_saida):
+            self.abortar()
+            resultado.pdf_path = None
+        elif self.escritor is not None:
+            try:
+                inicio = time.perf_counter()
+                self.escritor.fechar()
+                self.relatorio.medir_pdf("fechar_s", time.perf_counter() - inicio,
+                                         self.escritor.paginas)
+                resultado.pdf_ok = True
+            except Exception as e:
+                print(f"Erro ao criar PDF: {e}", file=sys.stderr)
+                self.abortar()
+                resultado.pdf_ok = False
+            self.escritor = None
+
+        self.relatorio.concluir()
+        resultado.relatorio = self.relatorio.gerar(resultado)
+        if self.config.exportar_relatorio:
+            caminho = os.path.join(self.destino, self.config.relatorio_arquivo)
+            try:
+                gravar_relatorio(resultado.relatorio, caminho)
+                resultado.relatorio_path = caminho
+            except OSError as e:
+                print(f"Erro ao gravar o relatório: {e}", file=sys.stderr)
+        return resultado
+
+
+def processar_lote(origem, destino, config, progresso=None, aviso=None, logo=None,
+                   trabalhadores=1, modo="processos", cancelar=None, cache=None, estagios=None,
+                   modelo=None, imagem_concluida=None):
+    """Processa todas as imagens da pasta de origem
+
+    ``progresso`` é chamado como ``progresso(processadas, total, arquivo)``
+    depois de cada imagem; ``total`` cresce enquanto a origem ainda está
+    sendo percorrida (com ``config.recursivo``, também as subpastas, que são
+    recriadas no destino). ``logo`` permite reaproveitar um logo já carregado.
+    Com ``trabalhadores`` > 1 as imagens são processadas em paralelo
+    (``modo`` "processos" ou "threads"); os nomes de saída e a ordem do PDF
+    continuam os mesmos da execução sequencial. No modo "estagios" cada
+    imagem passa por leitura, decodificação, transformação, codificação e
+    gravação, cada etapa com as próprias threads (``estagios``, ver
+    trabalhadores_estagios) e filas limitadas entre elas; a utilização de
+    cada estágio fica em ``resultado.estagios``. ``cancelar`` é consultado
+    depois de cada imagem; quando retorna verdadeiro o lote para sem gerar o
+    PDF e o resultado é marcado como cancelado. Com ``cache``
+    (cache.CacheSaida) as imagens já processadas com o mesmo conteúdo e as
+    mesmas configurações são reaproveitadas de execuções anteriores.
+    ``modelo`` reaproveita um ModeloSobreposicao já montado para o mesmo
+    logo e as mesmas configurações. ``imagem_concluida`` é chamado como
+    ``imagem_concluida(arquivo, saida, erro)`` a cada imagem, na ordem do
+    lote. ``config.formato_saida`` e as opções de codificação (ver
+    codificadores.py) definem o formato e a extensão das saídas; com
+    ``config.tamanho_maximo_kb`` ou ``config.tamanho_alvo_kb`` a qualidade
+    de cada JPEG/WebP é buscada para caber no limite. O relatório da
+    execução (tempos por etapa, bytes, tentativas de codificação, erros; ver
+    relatorio.py) fica em ``resultado.relatorio`` e, com
+    ``config.exportar_relatorio``, também é gravado no destino.
+    """
+    codificadores.validar(config)
+    if logo is None:
+        logo = carregar_logo(config.logo_file)
+
+    saida_lote = _DestinoLote(origem, destino, config, aviso, modo, trabalhadores)
+    resultado = saida_lote.resultado
+    tarefas = _DescobertaTarefas(origem, destino, config)
+    contexto = _criar_contexto(config, logo, modelo, cache)
+
+    pipeline = None
+    if modo == "estagios":
+        pipeline = _criar_pipeline(contexto, estagios or trabalhadores_estagios(trabalhadores))
+        resultados = pipeline.executar(contexto.novo_item(tarefa) for tarefa in tarefas)
+    else:
+        resultados = _executar_tarefas(tarefas, contexto, trabalhadores, modo)
+
+    try:
+        for arquivo, saida, erro, medidas in resultados:
+            saida_lote.registrar(arquivo, saida, erro, medidas)
+            if imagem_concluida:
+                imagem_concluida(arquivo, saida, erro)
+            if progresso:
+                progresso(resultado.processadas, tarefas.encontradas, arquivo)
+            if cancelar and cancelar():
+                resultado.cancelado = True
+                break
+    except BaseException:
+        saida_lote.abortar()
+        raise
+    finally:
+        resultados.close()
+        tarefas.parar()
+
+    if cache is not None:
+        resultado.cache_removidas = cache.podar()
+    saida_lote.concluir(resultado.cancelado, pipeline.utilizacao() if pipeline is not None else {})
+    return resultado
+
+
+# ----------------------------------------------------------------------------
+# Várias versões de cada imagem a partir de uma única decodificação
+# ----------------------------------------------------------------------------
+
+@dataclass
+class VersaoLote:
+    """Uma das saídas de um lote com várias versões de cada imagem
+
+    Cada versão tem a própria pasta de destino e a própria configuração
+    (tamanho, DPI, logo, borda, codificação, PDF e relatório).
+    """
+    destino: str
+    config: Configuracao
+    nome: str = None
+
+
+@dataclass
+class _ContextoVersoes:
+    """O que cada trabalhador precisa para gerar todas as versões de uma imagem
+
+    ``versoes`` tem um _ContextoLote por versão; ``ordem`` percorre as
+    versões da maior para a menor, para que cada uma seja reduzida a partir
+    da anterior.
+    """
+    config: Configuracao
+    versoes: list
+    ordem: tuple = ()
+
+    def novo_item(self, tarefa):
+        return _ItemVersoes(*tarefa)
+
+    @property
+    def etapas(self):
+        return _ETAPAS_VERSOES
+
+
+class _ItemVersoes:
+    """Uma imagem em trânsito pelo pipeline, com uma saída por versão
+
+    ``medidas`` guarda as etapas feitas uma única vez (leitura, decodificação
+    e orientação); ``medidas_versoes`` as de cada versão. ``resultados``
+    recebe ``(saida, erro, medidas)`` de cada versão concluída.
+    """
+
+    __slots__ = ("arquivo", "entrada", "saidas", "dados", "imagem", "medidas", "chaves",
+                 "imagens", "codificados", "medidas_versoes", "resultados")
+
+    def __init__(self, arquivo, entrada, saidas):
+        self.arquivo = arquivo
+        self.entrada = entrada
+        self.saidas = saidas
+        self.dados = None
+        self.imagem = None
+        self.medidas = {}
+        self.chaves = [None] * len(saidas)
+        self.imagens = [None] * len(saidas)
+        self.codificados = [None] * len(saidas)
+        self.medidas_versoes = [{} for _ in saidas]
+        self.resultados = [None] * len(saidas)
+
+    def pendentes(self):
+        return [indice for indice, resultado in enumerate(self.resultados) if resultado is None]
+
+    def concluir(self, indice, erro=None):
+        self.resultados[indice] = (self.saidas[indice], erro,
+                                   {**self.medidas, **self.medidas_versoes[indice]})
+
+    def resultado(self):
+        return self.arquivo, self.resultados
+
+    def falhou(self, etapa, erro):
+        """Encerra com erro as versões que ainda não foram concluídas"""
+        for indice in self.pendentes():
+            self.medidas_versoes[indice].update(etapa_erro=etapa, tipo_erro=type(erro).__name__)
+            self.concluir(indice, str(erro))
+        return self.resultado()
+
+
+def _ler_versoes(item, contexto):
+    inicio = time.perf_counter()
+    item.dados = faixas.ler_arquivo(item.entrada, contexto.config.memoria_maxima_mb * 2**20)
+    item.medidas["ler_s"] = time.perf_counter() - inicio
+    item.medidas["bytes_lidos"] = len(item.dados)
+    for indice, versao in enumerate(contexto.versoes):
+        if versao.cache is None:
+            continue
+        saida = item.saidas[indice]
+        item.chaves[indice] = versao.cache.chave(item.entrada, versao.assinatura, saida,
+                                                 dados=item.dados)
+        if versao.cache.recuperar(item.chaves[indice], saida):
+            item.medidas_versoes[indice]["cache"] = True
+            item.concluir(indice)
+    if not item.pendentes():
+        return Concluido(item.resultado())
+    return item
+
+
+def _decodificar_versoes(item, contexto):
+    inicio = time.perf_counter()
+    formato = identificar_formato(item.dados)
+    # Uma caixa que contém a de todas as versões pendentes: a pré-redução
+    # nunca fica menor que a maior delas
+    caixas = [contexto.versoes[indice].config.tamanho_final for indice in item.pendentes()]
+    caixa = (max(largura for largura, _ in caixas), max(altura for _, altura in caixas))
+    with faixas.sem_limite_do_pillow():
+        try:
+            img = Image.open(faixas.fonte(item.dados), formats=(formato,) if formato else None)
+        except Image.UnidentifiedImageError:
+            raise Image.UnidentifiedImageError(
+                f"cannot identify image file {item.entrada!r}") from None
+        item.medidas["abrir_s"] = time.perf_counter() - inicio
+        item.imagem, _ = decodificar_imagem(img, contexto.config, item.medidas, caixa)
+    item.dados = None
+    return item
+
+
+def _transformar_versoes(item, contexto):
+    # As versões são reduzidas ainda sem orientar nem converter as cores; cada
+    # uma é convertida e endireitada já pequena
+    original = item.imagem
+    orientacao = item.medidas.get("orientacao")
+    anterior = None
+    for indice in contexto.ordem:
+        if item.resultados[indice] is not None:
+            continue
+        versao = contexto.versoes[indice]
+        medidas = item.medidas_versoes[indice]
+        alvo = tamanho_orientado(original.size, versao.config.tamanho_final, orientacao)
+        reducing_gap = REDUCING_GAPS[versao.config.reducao]
+        inicio = time.perf_counter()
+        if anterior is not None and anterior.width >= alvo[0] and anterior.height >= alvo[1]:
+            # A versão anterior (maior) já serve de ponto de partida
+            origem = anterior
+        else:
+            origem = original
+        reduzida = origem if origem.size == alvo else origem.resize(
+            alvo, Image.LANCZOS, reducing_gap=reducing_gap)
+        medidas["redimensionar_s"] = time.perf_counter() - inicio
+        convertida = converter_cores(reduzida, versao.config, medidas)
+        inicio = time.perf_counter()
+        endireitada = orientar(convertida, orientacao)
+        medidas["orientar_s"] = time.perf_counter() - inicio
+        item.imagens[indice] = versao.modelo.aplicar(endireitada, medidas)
+        anterior = reduzida
+    item.imagem = None
+    return item
+
+
+def _codificar_versoes(item, contexto):
+    for indice in item.pendentes():
+        versao = contexto.versoes[indice]
+        medidas = item.medidas_versoes[indice]
+        inicio = time.perf_counter()
+        formato = codificadores.formato_do_arquivo(item.saidas[indice])
+        try:
+            item.codificados[indice], qualidade, tentativas = codificadores.codificar(
+                item.imagens[indice], formato, versao.config, versao.qualidades)
+        except Exception as e:
+            # Só esta versão falha (ex.: não coube no limite de tamanho)
+            medidas.update(etapa_erro="codificacao", tipo_erro=type(e).__name__)
+            item.concluir(indice, str(e))
+            continue
+        finally:
+            item.imagens[indice] = None
+        medidas["codificar_s"] = time.perf_counter() - inicio
+        if qualidade is not None:
+            medidas["qualidade"] = qualidade
+            medidas["tentativas_codificacao"] = tentativas
+    if not item.pendentes():
+        return Concluido(item.resultado())
+    return item
+
+
+def _gravar_versoes(item, contexto):
+    for indice in item.pendentes():
+        versao = contexto.versoes[indice]
+        medidas = item.medidas_versoes[indice]
+        dados = item.codificados[indice]
+        inicio = time.perf_counter()
+        gravar_saida(item.saidas[indice], dados)
+        medidas["gravar_s"] = time.perf_counter() - inicio
+        medidas["bytes_gravados"] = len(dados)
+        item.codificados[indice] = None
+        if versao.cache is not None:
+            versao.cache.guardar(item.chaves[indice], item.saidas[indice])
+            medidas["cache"] = False
+        item.concluir(indice)
+    return item.resultado()
+
+
+_ETAPAS_VERSOES = {
+    "leitura": _ler_versoes,
+    "decodificacao": _decodificar_versoes,
+    "transformacao": _transformar_versoes,
+    "codificacao": _codificar_versoes,
+    "gravacao": _gravar_versoes,
+}
+
+
+class _DescobertaVersoes(_DescobertaTarefas):
+    """Descoberta da origem com uma saída por versão em cada tarefa"""
+
+    def __init__(self, origem, versoes, config):
+        self._versoes = versoes
+        super().__init__(origem, None, config)
+
+    def _percorrer(self, origem, destino, config):
+        pastas = set()
+        saidas = [{} for _ in self._versoes]
+        ignorar = tuple(versao.destino for versao in self._versoes)
+        try:
+            for relativo, formato in descobrir_imagens(origem, config.recursivo, config.incluir,
+                                                       config.excluir, ignorar=ignorar):
+                if self._parar.is_set():
+                    break
+                caminhos = [montar_tarefa(origem, versao.destino, relativo, formato, pastas,
+                                          versao.config.formato_saida, saidas[indice])[2]
+                            for indice, versao in enumerate(self._versoes)]
+                self._fila.put((relativo, os.path.join(origem, *relativo.split("/")), caminhos))
+                self.encontradas += 1
+        except BaseException as e:
+            self._erro = e
+        finally:
+            self._fila.put(None)
+
+
+def processar_versoes(origem, config, versoes, progresso=None, aviso=None, logos=None,
+                      trabalhadores=1, modo="processos", cancelar=None, cache=None, estagios=None):
+    """Gera várias versões de cada imagem da origem com uma única decodificação
+
+    ``config`` define o que vale para a origem (subpastas, filtros e
+    decodificação); cada VersaoLote de ``versoes`` tem o próprio destino e a
+    própria configuração. Cada imagem é lida, decodificada e orientada uma
+    única vez; as versões são reduzidas da maior para a menor, cada uma a
+    partir da anterior quando ela ainda é grande o bastante, e recebem o
+    próprio logo, borda e codificação. ``logos`` (caminho -> logo carregado)
+    evita recarregar logos já abertos. Os demais parâmetros são os de
+    processar_lote; ``progresso`` conta as imagens da origem com todas as
+    versões geradas. Retorna um ResultadoLote por versão, na ordem de
+    ``versoes``, cada um com o próprio PDF e relatório (os tempos de
+    leitura e decodificação de cada imagem aparecem em todos); as entradas
+    removidas do cache ficam no resultado da primeira versão.
+    """
+    if not versoes:
+        raise ValueError("Informe ao menos uma versão")
+    logos = dict(logos or {})
+    contextos = []
+    for versao in versoes:
+        codificadores.validar(versao.config)
+        if versao.config.logo_file not in logos:
+            logos[versao.config.logo_file] = carregar_logo(versao.config.logo_file)
+        contextos.append(_criar_contexto(versao.config, logos[versao.config.logo_file], None, cache))
+    area = [versao.config.tamanho_final[0] * versao.config.tamanho_final[1] for versao in versoes]
+    contexto = _ContextoVersoes(config, contextos,
+                                tuple(sorted(range(len(versoes)), key=lambda i: -area[i])))
+
+    destinos = [_DestinoLote(origem, versao.destino, versao.config, aviso, modo, trabalhadores)
+                for versao in versoes]
+    tarefas = _DescobertaVersoes(origem, versoes, config)
+
+    pipeline = None
+    if modo == "estagios":
+        pipeline = _criar_pipeline(contexto, estagios or trabalhadores_estagios(trabalhadores))
+        resultados = pipeline.executar(contexto.novo_item(tarefa) for tarefa in tarefas)
+    else:
+        resultados = _executar_tarefas(tarefas, contexto, trabalhadores, modo)
+
+    processadas = 0
+    cancelado = False
+    try:
+        for arquivo, resultados_versoes in resultados:
+            for destino, (saida, erro, medidas) in zip(destinos, resultados_versoes):
+                destino.registrar(arquivo, saida, erro, medidas)
+            if all(erro is None for _, erro, _ in resultados_versoes):
+                processadas += 1
+            if progresso:
+                progresso(processadas, tarefas.encontradas, arquivo)
+            if cancelar and cancelar():
+                cancelado = True
+                break
+    except BaseException:
+        for destino in destinos:
+            destino.abortar()
+        raise
+    finally:
+        resultados.close()
+        tarefas.parar()
+
+    estagios_usados = pipeline.utilizacao() if pipeline is not None else {}
+    resultados_lote = [destino.concluir(cancelado, estagios_usados) for destino in destinos]
+    if cache is not None:
+        resultados_lote[0].cache_removidas = cache.podar()
+    return resultados_lote
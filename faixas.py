@@ -0,0 +1,411 @@
+"""
+Decodificação em faixas de imagens muito grandes
+
+Panoramas e pôsteres digitalizados ocupariam vários GB se fossem
+decodificados por inteiro antes do redimensionamento. Quando a imagem
+decodificada passaria do teto de memória por imagem
+(``Configuracao.memoria_maxima_mb``), ela é lida em faixas horizontais e
+cada faixa é reduzida assim que chega; só a imagem já reduzida fica
+inteira em memória. Podem ser lidos em faixas o PNG não
+entrelaçado de 8 bits por canal, o BMP sem compressão e o TIFF sem
+compressão (em tiras ou em blocos). O JPEG não precisa de faixas: a
+decodificação com escala DCT (draft) já divide a memória por até 64. Nos
+outros casos a imagem que passa do teto falha com MemoryError, em vez de
+derrubar o lote inteiro.
+
+O resultado é idêntico ao do caminho normal. Cada faixa é normalizada
+para L, RGB ou CMYK como a imagem inteira seria (ver cores.py) e passa pela
+mesma redução inteira que o Image.resize faz antes do LANCZOS quando há
+``reducing_gap``; com a redução "maxima", que não tem redução inteira, cada
+faixa é redimensionada só na horizontal e a imagem empilhada na vertical no
+fim, as mesmas duas passadas que o Image.resize faz.
+
+Também confere o limite de megapixels contra imagens-bomba, que substitui o
+do Pillow (Image.MAX_IMAGE_PIXELS) para que imagens grandes, mas dentro do
+limite configurado, possam ser abertas. O do Pillow só é desligado enquanto
+essas imagens são abertas e decodificadas (sem_limite_do_pillow).
+"""
+
+import io
+import math
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+from PIL import Image
+
+import cores
+
+# Cópias de uma faixa que podem existir ao mesmo tempo (dados filtrados,
+# PNG montado, faixa decodificada, convertida e empilhada com a sobra)
+COPIAS_POR_FAIXA = 6
+
+BLOCO_LEITURA = 1 << 20  # bytes comprimidos lidos de cada vez dos chunks IDAT
+
+_MODOS_SUPORTADOS = ("1", "L", "LA", "P", "RGB", "RGBA", "CMYK")
+
+# Formatos PNG (rawmode do Pillow) que podem ser lidos em faixas: 8 bits por canal
+_RAWMODES_PNG = ("L", "LA", "RGB", "RGBA", "P")
+_ASSINATURA_PNG = b'\x89PNG\r\n\x1a\n'
+
+
+_trava_limite = threading.Lock()
+_sem_limite = 0  # Blocos sem_limite_do_pillow em andamento (em qualquer thread)
+_limite_pillow = None  # Valor do Image.MAX_IMAGE_PIXELS a restaurar
+
+
+@contextmanager
+def sem_limite_do_pillow():
+    """Desliga o Image.MAX_IMAGE_PIXELS dentro do bloco e o restaura no fim
+
+    Só para abrir e decodificar imagens que passam por conferir_pixels. O
+    limite é global no Pillow: com vários blocos ao mesmo tempo (threads),
+    ele volta quando o último termina.
+    """
+    global _sem_limite, _limite_pillow
+    with _trava_limite:
+        if not _sem_limite:
+            _limite_pillow = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = None
+        _sem_limite += 1
+    try:
+        yield
+    finally:
+        with _trava_limite:
+            _sem_limite -= 1
+            if not _sem_limite:
+                Image.MAX_IMAGE_PIXELS = _limite_pillow
+
+
+def conferir_pixels(imagem, limite_megapixels):
+    """Recusa imagens acima do limite de megapixels (imagens-bomba), sem decodificá-las"""
+    pixels = imagem.width * imagem.height
+    if limite_megapixels and pixels > limite_megapixels * 1_000_000:
+        raise Image.DecompressionBombError(
+            f"Imagem com {pixels / 1_000_000:.0f} megapixels, acima do limite de "
+            f"{limite_megapixels} megapixels")
+
+
+def ler_arquivo(caminho, teto):
+    """Conteúdo do arquivo de origem
+
+    Arquivos maiores que um quarto do ``teto`` de memória (em bytes) são
+    mapeados com mmap em vez de lidos: as páginas vêm do cache do sistema
+    à medida que as faixas são decodificadas.
+    """
+    with open(caminho, 'rb') as f:
+        if teto and os.fstat(f.fileno()).st_size > teto // 4:
+            import mmap
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return f.read()
+
+
+def fonte(dados):
+    """Arquivo para o Image.open: os bytes lidos ou o próprio mmap"""
+    return io.BytesIO(dados) if isinstance(dados, (bytes, bytearray)) else dados
+
+
+def _bytes_por_pixel(modo):
+    # Tamanho de cada pixel na memória do Pillow (RGB também ocupa 4 bytes)
+    if modo in ("1", "L", "P"):
+        return 1
+    if modo.startswith("I;16"):
+        return 2
+    return 4
+
+
+def memoria_decodificada(imagem):
+    """Memória estimada, em bytes, para decodificar a imagem aberta por inteiro
+
+    No JPEG progressivo o decodificador também guarda os coeficientes DCT
+    de todos os canais no tamanho original, mesmo com a escala do draft.
+    """
+    memoria = imagem.width * imagem.height * _bytes_por_pixel(imagem.mode)
+    if imagem.format == "JPEG" and imagem.info.get("progressive"):
+        # Depois do draft, decoderconfig guarda a escala (2, 4 ou 8) da decodificação
+        escala = imagem.decoderconfig[0] if imagem.decoderconfig else 1
+        memoria += imagem.width * imagem.height * escala * escala * len(imagem.getbands()) * 2
+    return memoria
+
+
+def excede(imagem, teto):
+    """Se decodificar a imagem por inteiro passaria do ``teto`` (em bytes; 0: sem teto)"""
+    return bool(teto) and memoria_decodificada(imagem) > teto
+
+
+def como_gravada(imagem, tamanho=None):
+    """Prepara a imagem aberta para a leitura em faixas, como está gravada no arquivo
+
+    O plugin TIFF informa o tamanho já endireitado pela orientação EXIF e
+    endireitaria a imagem ao carregá-la; aqui ela fica com o tamanho e a
+    orientação gravados, como as dos outros formatos (a orientação é
+    aplicada depois, na imagem reduzida). Com ``tamanho``, a imagem passa a
+    ter só as primeiras linhas desse tamanho (uma faixa).
+    É o único ponto que mexe no estado interno do Pillow: retorna False,
+    sem alterar a imagem, se o Pillow instalado não tiver os atributos
+    esperados, e aí a imagem deve ser decodificada do jeito normal.
+    """
+    tiff = imagem.format == "TIFF"
+    if not hasattr(imagem, "_size") or (tiff and not (hasattr(imagem, "_tile_size")
+                                                      and hasattr(imagem, "tag_v2"))):
+        return False
+    if tiff:
+        imagem.getexif().pop(274, None)
+        imagem.tag_v2.pop(274, None)
+        imagem._size = tamanho or imagem._tile_size
+        imagem._tile_size = imagem._size  # O TIFF reserva a memória por este tamanho
+    elif tamanho:
+        imagem._size = tamanho
+    return True
+
+
+def decodificar(imagem, alvo, reducing_gap, teto):
+    """Decodifica a imagem aberta em faixas, já reduzida ao tamanho ``alvo``
+
+    Cada faixa é normalizada (cores.normalizar) antes de reduzida: dá o
+    mesmo resultado de ``cores.normalizar(imagem).resize(alvo,
+    Image.LANCZOS, reducing_gap=reducing_gap)`` sobre a imagem inteira, sem
+    nunca ter a imagem inteira em memória. A imagem não pode ter sido
+    carregada, e ``como_gravada`` já deve ter sido aplicada a ela.
+    Levanta MemoryError se o formato não pode ser lido em faixas ou se nem
+    assim ela cabe no ``teto`` de memória (em bytes).
+    """
+    largura, altura = imagem.size
+    if reducing_gap is not None:
+        fator = (int(largura / alvo[0] / reducing_gap) or 1,
+                 int(altura / alvo[1] / reducing_gap) or 1)
+        intermediaria = (math.ceil(largura / fator[0]), math.ceil(altura / fator[1]))
+    else:
+        fator = None
+        intermediaria = (alvo[0], altura)
+    bytes_linha = largura * 4
+    disponivel = teto - intermediaria[0] * intermediaria[1] * 4
+    minimo = fator[1] if fator else 1
+    if disponivel < COPIAS_POR_FAIXA * bytes_linha * minimo:
+        raise MemoryError(f"A imagem reduzida não cabe no limite de {teto // 2**20} MB")
+    linhas = max(minimo, disponivel // (COPIAS_POR_FAIXA * bytes_linha))
+
+    if imagem.mode not in _MODOS_SUPORTADOS:
+        faixas = None
+    elif imagem.format == "PNG":
+        faixas = _faixas_png(imagem, linhas)
+    elif imagem.format in ("BMP", "TIFF"):
+        faixas = _faixas_tiles(imagem, linhas)
+    else:
+        faixas = None
+    if faixas is None:
+        raise MemoryError(
+            f"Decodificar a imagem precisaria de {memoria_decodificada(imagem) // 2**20} MB, "
+            f"acima do limite de {teto // 2**20} MB, e esta imagem {imagem.format} "
+            f"({imagem.mode}) não pode ser lida em faixas")
+    reduzida = _reduzir(faixas, imagem.size, alvo, fator, intermediaria)
+    if "icc_profile" in imagem.info:
+        reduzida.info["icc_profile"] = imagem.info["icc_profile"]
+    return reduzida
+
+
+def _reduzir(faixas, tamanho, alvo, fator, intermediaria):
+    """Reduz as faixas (de cima para baixo) até ``alvo``
+
+    Com ``fator``, cada faixa passa pela redução inteira e a imagem
+    reduzida pelo LANCZOS no fim, como no Image.resize com reducing_gap; as
+    linhas que não completam um bloco do fator ficam para a faixa seguinte,
+    para que cada bloco seja o mesmo da redução da imagem inteira. Sem
+    ``fator``, cada faixa é redimensionada na horizontal e a imagem na
+    vertical no fim: as mesmas duas passadas do Image.resize.
+    """
+    largura, altura = tamanho
+    reduzida = None
+    y = 0
+    sobra = None
+    for faixa in faixas:
+        faixa = cores.normalizar(faixa)
+        if fator is None:
+            parte = faixa.resize((alvo[0], faixa.height), Image.LANCZOS,
+                                 box=(0, 0, largura, faixa.height))
+        else:
+            if sobra is not None:
+                juntas = Image.new(faixa.mode, (largura, sobra.height + faixa.height))
+                juntas.paste(sobra, (0, 0))
+                juntas.paste(faixa, (0, sobra.height))
+                faixa = juntas
+            completas = faixa.height - faixa.height % fator[1]
+            sobra = faixa.crop((0, completas, largura, faixa.height)) if completas < faixa.height else None
+            if not completas:
+                continue
+            parte = faixa.reduce(fator, box=(0, 0, largura, completas))
+        if reduzida is None:
+            reduzida = Image.new(parte.mode, intermediaria)
+        reduzida.paste(parte, (0, y))
+        y += parte.height
+    if sobra is not None:
+        reduzida.paste(sobra.reduce(fator), (0, y))
+
+    if fator is None:
+        caixa = (0, 0, alvo[0], altura)
+    else:
+        caixa = (0, 0, largura / fator[0], altura / fator[1])
+    return reduzida.resize(alvo, Image.LANCZOS, box=caixa)
+
+
+def _corte_raw(tile, modo):
+    """``(rawmode, stride, sentido)`` de um tile "raw" que pode ser cortado em linhas, ou None"""
+    if tile.codec_name != "raw":
+        return None
+    args = (tile.args,) if isinstance(tile.args, str) else tuple(tile.args)
+    rawmode, stride, sentido = (args + (0, 1))[:3]
+    if not stride:
+        # Sem stride no tile, o decodificador usa a linha empacotada do rawmode
+        largura = tile.extents[2] - tile.extents[0]
+        try:
+            stride = len(Image.new(modo, (largura, 1)).tobytes("raw", rawmode))
+        except ValueError:
+            return None
+    return rawmode, stride, sentido
+
+
+def _tile_das_linhas(tile, corte, inicio, fim, topo):
+    """Parte do tile entre as linhas ``inicio`` e ``fim``, em uma faixa que começa em ``topo``"""
+    x0, y0, x1, y1 = tile.extents
+    rawmode, stride, sentido = corte
+    # Nos arquivos gravados de baixo para cima (sentido -1) a última linha vem primeiro
+    pulo = (inicio - y0) if sentido > 0 else (y1 - fim)
+    return tile._replace(extents=(x0, inicio - topo, x1, fim - topo),
+                         offset=tile.offset + pulo * stride, args=corte)
+
+
+def _faixas_tiles(imagem, linhas):
+    """Faixas de imagens cujos tiles o Pillow lê separadamente (BMP e TIFF sem compressão)
+
+    Cada faixa é aberta de novo com só os tiles (ou partes de tiles "raw")
+    das suas linhas; tiles comprimidos não são cortados, e a faixa se
+    estende até o fim deles.
+    """
+    if any(tile.codec_name not in ("raw", "packbits") for tile in imagem.tile):
+        return None  # Ex.: BMP com RLE ou TIFF comprimido, que o libtiff lê de uma vez
+    tiles = [(tile, _corte_raw(tile, imagem.mode)) for tile in imagem.tile]
+    largura, altura = imagem.size
+    arquivo = imagem.fp
+
+    def gerar():
+        topo = 0
+        while topo < altura:
+            fim = min(altura, topo + linhas)
+            estendida = True
+            while estendida:
+                estendida = False
+                for tile, corte in tiles:
+                    if corte is None and tile.extents[1] < fim < tile.extents[3]:
+                        fim = tile.extents[3]
+                        estendida = True
+            partes = [_tile_das_linhas(tile, corte, max(topo, tile.extents[1]),
+                                       min(fim, tile.extents[3]), topo)
+                      if corte is not None else
+                      tile._replace(extents=(tile.extents[0], tile.extents[1] - topo,
+                                             tile.extents[2], tile.extents[3] - topo))
+                      for tile, corte in tiles
+                      if tile.extents[1] < fim and tile.extents[3] > topo]
+            arquivo.seek(0)
+            faixa = Image.open(arquivo, formats=(imagem.format,))
+            if not como_gravada(faixa, (largura, fim - topo)):
+                raise MemoryError("O Pillow instalado não permite ler esta imagem em faixas")
+            faixa.tile = partes
+            faixa.load()
+            yield faixa
+            topo = fim
+
+    return gerar()
+
+
+def _chunk(tipo, dados):
+    return struct.pack(">I", len(dados)) + tipo + dados + struct.pack(">I", zlib.crc32(tipo + dados))
+
+
+class _LinhasPng:
+    """Linhas filtradas de um PNG, descomprimidas sob demanda dos chunks IDAT"""
+
+    def __init__(self, arquivo, proximo_chunk):
+        self.arquivo = arquivo
+        self.proximo_chunk = proximo_chunk
+        self.posicao = 0
+        self.restante = 0
+        self.zlib = zlib.decompressobj()
+
+    def _comprimido(self):
+        while not self.restante:
+            self.arquivo.seek(self.proximo_chunk)
+            cabecalho = self.arquivo.read(8)
+            if len(cabecalho) < 8 or cabecalho[4:] != b"IDAT":
+                return b""
+            self.restante = struct.unpack(">I", cabecalho[:4])[0]
+            self.posicao = self.proximo_chunk + 8
+            self.proximo_chunk = self.posicao + self.restante + 4
+        self.arquivo.seek(self.posicao)
+        parte = self.arquivo.read(min(self.restante, BLOCO_LEITURA))
+        self.posicao += len(parte)
+        self.restante = self.restante - len(parte) if parte else 0
+        return parte
+
+    def ler(self, tamanho):
+        partes = []
+        while tamanho:
+            entrada = self.zlib.unconsumed_tail or self._comprimido()
+            if not entrada:
+                raise OSError("image file is truncated")
+            parte = self.zlib.decompress(entrada, tamanho)
+            partes.append(parte)
+            tamanho -= len(parte)
+        return b"".join(partes)
+
+
+def _faixas_png(imagem, linhas):
+    """Faixas de um PNG não entrelaçado de 8 bits por canal
+
+    Os dados filtrados de cada faixa viram um PNG pequeno (mesmos chunks
+    de paleta e transparência, sem compressão), decodificado pelo próprio
+    Pillow. Como o filtro de uma linha depende da linha anterior já
+    decodificada, cada faixa começa repetindo, sem filtro, a última linha
+    da faixa anterior.
+    """
+    tile = imagem.tile[0] if len(imagem.tile) == 1 else None
+    if (tile is None or tile.codec_name != "zip" or imagem.info.get("interlace")
+            or tile.extents != (0, 0) + imagem.size or tile.args not in _RAWMODES_PNG):
+        return None
+    rawmode = tile.args
+    largura, altura = imagem.size
+    bytes_linha = 1 + largura * len(rawmode)
+    arquivo = imagem.fp
+    arquivo.seek(0)
+    cabecalho = arquivo.read(33)  # Assinatura e IHDR
+    if cabecalho[:8] != _ASSINATURA_PNG or cabecalho[12:16] != b"IHDR":
+        return None
+    ihdr = cabecalho[16:29]
+    inicio_idat = tile.offset - 8
+    extras = arquivo.read(inicio_idat - 33)  # PLTE, tRNS e outros chunks antes dos dados
+
+    def gerar():
+        dados = _LinhasPng(arquivo, inicio_idat)
+        anterior = b""
+        topo = 0
+        while topo < altura:
+            quantidade = min(linhas, altura - topo)
+            filtradas = anterior + dados.ler(quantidade * bytes_linha)
+            total = quantidade + (1 if anterior else 0)
+            png = b"".join((_ASSINATURA_PNG,
+                            _chunk(b"IHDR", ihdr[:4] + struct.pack(">I", total) + ihdr[8:]),
+                            extras, _chunk(b"IDAT", zlib.compress(filtradas, 0)),
+                            _chunk(b"IEND", b"")))
+            del filtradas
+            faixa = Image.open(io.BytesIO(png), formats=("PNG",))
+            faixa.load()
+            del png
+            ultima = faixa.crop((0, faixa.height - 1, largura, faixa.height))
+            anterior = b"\x00" + ultima.tobytes("raw", rawmode)
+            if total > quantidade:
+                faixa = faixa.crop((0, 1, largura, faixa.height))
+            yield faixa
+            topo += quantidade
+
+    return gerar()
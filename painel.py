@@ -0,0 +1,148 @@
+"""
+Painel de prévia da interface gráfica
+
+Mostra uma foto da pasta de origem com o logo e a borda das configurações
+atuais. Cada mudança nos controles só reinicia um temporizador; quando eles
+param de mudar por ATRASO_MS, logo e borda são recompostos sobre a imagem
+base já em cache (ver previa.py). As fotos são listadas e decodificadas em
+segundo plano pelo PreviaWorker, que também adianta a próxima e a anterior.
+"""
+
+import os
+
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QGroupBox, QHBoxLayout, QLabel, QPushButton, QVBoxLayout
+
+import previa
+import worker
+
+TAMANHO = (270, 405)  # Tamanho da imagem no painel, em pixels (proporção de 10x15 cm)
+ATRASO_MS = 150  # Espera sem mudanças nos controles antes de recompor
+
+
+class PainelPrevia(QGroupBox):
+    """Prévia do posicionamento do logo e da borda sobre as fotos da origem
+
+    ``ler_configuracao`` retorna a engine.Configuracao atual dos controles e
+    ``carregar_logo`` o logo escolhido (ou None, se ainda não houver).
+    """
+
+    def __init__(self, ler_configuracao, carregar_logo, parent=None):
+        super().__init__("Prévia", parent)
+        self.ler_configuracao = ler_configuracao
+        self.carregar_logo = carregar_logo
+        self.origem = None
+        self.amostras = []
+        self.atual = 0
+
+        layout = QVBoxLayout()
+        self.imagem_label = QLabel("Selecione a pasta com fotos")
+        self.imagem_label.setFixedSize(*TAMANHO)
+        self.imagem_label.setAlignment(Qt.AlignCenter)
+        self.imagem_label.setWordWrap(True)
+        self.imagem_label.setStyleSheet("background-color: #ddd;")
+        layout.addWidget(self.imagem_label)
+
+        self.nome_label = QLabel("")
+        self.nome_label.setAlignment(Qt.AlignCenter)
+        self.nome_label.setWordWrap(True)
+        layout.addWidget(self.nome_label)
+
+        navegacao = QHBoxLayout()
+        self.anterior_btn = QPushButton("◀ Anterior")
+        self.anterior_btn.clicked.connect(lambda: self.mudar_amostra(-1))
+        self.proxima_btn = QPushButton("Próxima ▶")
+        self.proxima_btn.clicked.connect(lambda: self.mudar_amostra(1))
+        navegacao.addWidget(self.anterior_btn)
+        navegacao.addWidget(self.proxima_btn)
+        layout.addLayout(navegacao)
+        layout.addStretch()
+        self.setLayout(layout)
+        self._habilitar_navegacao()
+
+        self.temporizador = QTimer(self)
+        self.temporizador.setSingleShot(True)
+        self.temporizador.setInterval(ATRASO_MS)
+        self.temporizador.timeout.connect(self.atualizar)
+
+        self.cache = previa.CachePrevia()
+        self.carregador = worker.PreviaWorker(self.cache, self)
+        self.carregador.amostras.connect(self._amostras_listadas)
+        self.carregador.pronta.connect(self._amostra_pronta)
+        self.carregador.falhou.connect(self._amostra_falhou)
+        self.carregador.start()
+
+    def agendar(self, *_):
+        """Recompõe a prévia quando os controles pararem de mudar"""
+        self.temporizador.start()
+
+    def listar(self, origem):
+        """Procura as fotos de ``origem`` (em segundo plano) e mostra a primeira"""
+        self.origem = origem
+        self.carregador.listar(origem, self.ler_configuracao())
+
+    def parar(self):
+        self.temporizador.stop()
+        self.carregador.parar()
+
+    def mudar_amostra(self, passo):
+        """Mostra a próxima (1) ou a anterior (-1) foto"""
+        if self.amostras:
+            self.atual = (self.atual + passo) % len(self.amostras)
+            self.atualizar()
+
+    def _habilitar_navegacao(self):
+        self.anterior_btn.setEnabled(len(self.amostras) > 1)
+        self.proxima_btn.setEnabled(len(self.amostras) > 1)
+
+    def _mensagem(self, texto):
+        self.imagem_label.setPixmap(QPixmap())
+        self.imagem_label.setText(texto)
+
+    def _amostras_listadas(self, origem, caminhos):
+        if origem != self.origem:
+            return  # Resposta de uma pasta que já foi trocada
+        self.amostras = caminhos
+        self.atual = 0
+        self._habilitar_navegacao()
+        self.atualizar()
+
+    def _amostra_pronta(self, caminho):
+        if self.amostras and caminho == self.amostras[self.atual]:
+            self.atualizar()
+
+    def _amostra_falhou(self, caminho, mensagem):
+        if caminho == self.origem or (self.amostras and caminho == self.amostras[self.atual]):
+            self._mensagem(f"Não foi possível abrir:\n{mensagem}")
+
+    def atualizar(self):
+        """Recompõe logo e borda sobre a imagem base da foto atual"""
+        self.temporizador.stop()
+        if not self.amostras:
+            self.nome_label.setText("")
+            self._mensagem("Nenhuma foto na pasta de origem" if self.origem
+                           else "Selecione a pasta com fotos")
+            return
+
+        config = self.ler_configuracao()
+        caminhos = previa.vizinhas(self.amostras, self.atual)
+        self.nome_label.setText(f"{self.atual + 1}/{len(self.amostras)} - "
+                                f"{os.path.basename(caminhos[0])}")
+        # A foto atual (se ainda não estiver em cache) e as vizinhas são decodificadas em segundo plano
+        bases = [self.cache.consultar(caminho, config) for caminho in caminhos]
+        faltando = [caminho for caminho, base in zip(caminhos, bases) if base is None]
+        if faltando:
+            self.carregador.carregar(faltando, config)
+        if bases[0] is None:
+            self._mensagem("Carregando...")
+            return
+
+        try:
+            logo = self.carregar_logo()
+        except Exception:
+            logo = None
+        tela = previa.reduzir_para_tela(self.cache.compor(bases[0], logo, config), TAMANHO)
+        dados = tela.tobytes()  # O QImage não copia os dados: precisam existir até o fromImage
+        imagem = QImage(dados, tela.width, tela.height, 3 * tela.width, QImage.Format_RGB888)
+        self.imagem_label.setPixmap(QPixmap.fromImage(imagem))
@@ -0,0 +1,231 @@
+"""
+Gravação do PDF em fluxo
+
+O EscritorPdf grava cada página assim que as imagens dela ficam prontas,
+sem manter as páginas anteriores em memória: só os deslocamentos dos
+objetos já gravados são guardados para a tabela xref final. JPEGs entram
+no PDF como streams DCTDecode com os próprios bytes do arquivo, sem
+decodificar nem recomprimir; os demais formatos são gravados sem perdas
+(FlateDecode). Com um perfil de saída diferente do sRGB, ele é gravado
+uma única vez como espaço de cor /ICCBased e usado pelas imagens RGB.
+
+Layout: A4 paisagem, 2 imagens por página (1 se não couberem), margens e
+espaçamento de 1 cm.
+"""
+
+import hashlib
+import io
+import os
+import struct
+import zlib
+
+from PIL import Image
+
+PONTOS_POR_CM = 28.35
+
+A4_PAISAGEM = (841.8897637795277, 595.2755905511812)
+
+_MARCADORES_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def ler_info_jpeg(dados):
+    """Retorna (largura, altura, componentes) lidos do cabeçalho do JPEG, ou None"""
+    if dados[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 4 <= len(dados):
+        if dados[pos] != 0xFF:
+            return None
+        marcador = dados[pos + 1]
+        if marcador == 0xFF:  # Bytes de preenchimento
+            pos += 1
+            continue
+        if marcador in (0xD8, 0x01) or 0xD0 <= marcador <= 0xD7:
+            pos += 2
+            continue
+        tamanho = struct.unpack('>H', dados[pos + 2:pos + 4])[0]
+        if marcador in _MARCADORES_SOF:
+            if pos + 10 > len(dados):
+                return None
+            altura, largura = struct.unpack('>HH', dados[pos + 5:pos + 9])
+            return largura, altura, dados[pos + 9]
+        pos += 2 + tamanho
+    return None
+
+
+class EscritorPdf:
+    """Grava o PDF página a página, com uso de memória constante
+
+    Uso::
+
+        with EscritorPdf(caminho, 10, 15) as pdf:
+            for imagem in imagens:
+                pdf.adicionar(imagem)  # caminho ou bytes já codificados
+
+    O arquivo é gravado em um temporário e só substitui ``caminho`` em
+    ``fechar``; se o bloco terminar com exceção (ou com ``abortar``), o
+    temporário é apagado. ``perfil_icc`` são os bytes do perfil RGB em que
+    as imagens foram gravadas (None para sRGB, que fica como /DeviceRGB).
+    """
+
+    def __init__(self, caminho, largura_cm, altura_cm, aviso=None, perfil_icc=None):
+        self.caminho = caminho
+        self.paginas = 0
+        self.imagens = 0
+
+        self.page_width, self.page_height = A4_PAISAGEM
+        self.img_width_pt = largura_cm * PONTOS_POR_CM
+        self.img_height_pt = altura_cm * PONTOS_POR_CM
+        self.margin = PONTOS_POR_CM  # 1cm de margem
+        self.space_between = PONTOS_POR_CM  # 1cm entre as imagens
+
+        if (2 * self.img_width_pt + self.space_between + 2 * self.margin) > self.page_width:
+            if aviso:
+                aviso("As imagens são muito largas para caberem 2 por página. Será gerado 1 por página.")
+            self.img_per_page = 1
+        else:
+            self.img_per_page = 2
+
+        self._temporario = f"{caminho}.tmp"
+        self._arquivo = open(self._temporario, 'wb')
+        self._offsets = {}
+        self._proximo_objeto = 3  # 1 = catálogo, 2 = árvore de páginas (gravados no fim)
+        self._paginas_ids = []
+        self._pagina_atual = []
+        self._imagens_gravadas = {}  # hash dos bytes -> objeto (imagens repetidas)
+        self._perfil_icc = perfil_icc
+        self._espaco_rgb = None  # Gravado junto da primeira imagem RGB
+        self._arquivo.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traceback):
+        if tipo is None:
+            self.fechar()
+        else:
+            self.abortar()
+        return False
+
+    def _novo_objeto(self):
+        numero = self._proximo_objeto
+        self._proximo_objeto += 1
+        return numero
+
+    def _gravar_objeto(self, numero, entradas, stream=None):
+        """Grava ``<< entradas >>`` (e o stream, se houver) como objeto ``numero``"""
+        self._offsets[numero] = self._arquivo.tell()
+        self._arquivo.write(f"{numero} 0 obj\n".encode('ascii'))
+        if stream is None:
+            self._arquivo.write(f"<< {entradas} >>".encode('ascii'))
+        else:
+            self._arquivo.write(f"<< {entradas} /Length {len(stream)} >>\nstream\n".encode('ascii'))
+            self._arquivo.write(stream)
+            self._arquivo.write(b"\nendstream")
+        self._arquivo.write(b"\nendobj\n")
+
+    def _espaco_cor_rgb(self):
+        """/DeviceRGB, ou a referência ao perfil ICC (gravado na primeira chamada)"""
+        if self._espaco_rgb is None:
+            if self._perfil_icc:
+                numero = self._novo_objeto()
+                self._gravar_objeto(numero, "/N 3 /Alternate /DeviceRGB /Filter /FlateDecode",
+                                    zlib.compress(self._perfil_icc, 6))
+                self._espaco_rgb = f"[/ICCBased {numero} 0 R]"
+            else:
+                self._espaco_rgb = '/DeviceRGB'
+        return self._espaco_rgb
+
+    def _gravar_imagem(self, imagem):
+        """Grava o XObject da imagem e retorna o número do objeto"""
+        if isinstance(imagem, (bytes, bytearray)):
+            dados = bytes(imagem)
+        else:
+            with open(imagem, 'rb') as f:
+                dados = f.read()
+
+        chave = hashlib.md5(dados).digest()
+        if chave in self._imagens_gravadas:
+            return self._imagens_gravadas[chave]
+
+        info = ler_info_jpeg(dados)
+        if info is not None:
+            largura, altura, componentes = info
+            espaco = {1: '/DeviceGray', 3: 'RGB'}.get(componentes, '/DeviceCMYK')
+            # JPEGs CMYK (Adobe) são gravados invertidos
+            decode = ' /Decode [1 0 1 0 1 0 1 0]' if espaco == '/DeviceCMYK' else ''
+            filtro, stream = '/DCTDecode', dados
+        else:
+            with Image.open(io.BytesIO(dados)) as img:
+                img = img.convert('L' if img.mode in ('1', 'L') else 'RGB')
+                largura, altura = img.size
+                espaco = '/DeviceGray' if img.mode == 'L' else 'RGB'
+                decode = ''
+                filtro, stream = '/FlateDecode', zlib.compress(img.tobytes(), 6)
+
+        if espaco == 'RGB':
+            espaco = self._espaco_cor_rgb()
+        numero = self._novo_objeto()
+        self._gravar_objeto(numero, (
+            f"/Type /XObject /Subtype /Image /Width {largura} /Height {altura} "
+            f"/ColorSpace {espaco} /BitsPerComponent 8 /Filter {filtro}{decode}"), stream)
+        self._imagens_gravadas[chave] = numero
+        return numero
+
+    def adicionar(self, imagem):
+        """Acrescenta uma imagem (caminho ou bytes) na próxima posição livre"""
+        self._pagina_atual.append(self._gravar_imagem(imagem))
+        self.imagens += 1
+        if len(self._pagina_atual) == self.img_per_page:
+            self._gravar_pagina()
+
+    def _gravar_pagina(self):
+        comandos = []
+        recursos = []
+        y = self.page_height - self.margin - self.img_height_pt
+        for j, objeto in enumerate(self._pagina_atual):
+            if self.img_per_page == 2:
+                x = self.margin + j * (self.img_width_pt + self.space_between)
+            else:
+                x = (self.page_width - self.img_width_pt) / 2
+            comandos.append(f"q {self.img_width_pt:.4f} 0 0 {self.img_height_pt:.4f} "
+                            f"{x:.4f} {y:.4f} cm /Im{j} Do Q")
+            recursos.append(f"/Im{j} {objeto} 0 R")
+        self._pagina_atual = []
+
+        conteudo = zlib.compress("\n".join(comandos).encode('ascii'))
+        conteudo_id = self._novo_objeto()
+        self._gravar_objeto(conteudo_id, "/Filter /FlateDecode", conteudo)
+
+        pagina_id = self._novo_objeto()
+        self._gravar_objeto(pagina_id, (
+            f"/Type /Page /Parent 2 0 R "
+            f"/MediaBox [0 0 {self.page_width:.4f} {self.page_height:.4f}] "
+            f"/Resources << /XObject << {' '.join(recursos)} >> >> "
+            f"/Contents {conteudo_id} 0 R"))
+        self._paginas_ids.append(pagina_id)
+        self.paginas += 1
+
+    def fechar(self):
+        """Grava a última página, a árvore de páginas e a tabela xref"""
+        if self._pagina_atual:
+            self._gravar_pagina()
+
+        kids = " ".join(f"{numero} 0 R" for numero in self._paginas_ids)
+        self._gravar_objeto(2, f"/Type /Pages /Kids [{kids}] /Count {len(self._paginas_ids)}")
+        self._gravar_objeto(1, "/Type /Catalog /Pages 2 0 R")
+
+        inicio_xref = self._arquivo.tell()
+        total = self._proximo_objeto
+        linhas = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        linhas += [f"{self._offsets[numero]:010d} 00000 n \n" for numero in range(1, total)]
+        linhas.append(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        self._arquivo.write("".join(linhas).encode('ascii'))
+        self._arquivo.close()
+        os.replace(self._temporario, self.caminho)
+
+    def abortar(self):
+        """Descarta o PDF parcial"""
+        self._arquivo.close()
+        if os.path.exists(self._temporario):
+            os.remove(self._temporario)
@@ -0,0 +1,185 @@
+"""
+Pipeline em estágios ligados por filas limitadas
+
+Cada item passa pelos estágios em sequência (ex.: leitura, decodificação,
+transformação, codificação, gravação); cada estágio tem as próprias threads,
+então a leitura do disco (ou da rede) continua enquanto outras imagens são
+redimensionadas e codificadas. As filas entre os estágios são limitadas e o
+número total de itens em andamento também: quando um estágio atrasa, os
+anteriores param de receber itens (contrapressão) e a memória não cresce.
+
+Os resultados saem na mesma ordem em que os itens entraram. O tempo ocupado
+de cada estágio é medido para o relatório de utilização.
+"""
+
+import queue
+import threading
+import time
+
+_FIM = object()
+
+# Intervalo das esperas, para que as threads percebam o pedido de parada
+_ESPERA = 0.1
+
+
+class Concluido:
+    """Resultado final de um item, que pula os estágios seguintes
+
+    Um estágio retorna ``Concluido(valor)`` quando o item não precisa mais
+    ser processado (ex.: acerto no cache, erro); ``valor`` é o resultado
+    entregue ao consumidor.
+    """
+
+    __slots__ = ("valor",)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+
+class Estagio:
+    """Um estágio do pipeline: ``funcao(item)`` executada por ``trabalhadores`` threads"""
+
+    def __init__(self, nome, funcao, trabalhadores=1):
+        if trabalhadores < 1:
+            raise ValueError(f"O estágio {nome} precisa de pelo menos 1 trabalhador")
+        self.nome = nome
+        self.funcao = funcao
+        self.trabalhadores = trabalhadores
+        self.itens = 0
+        self.ocupado_s = 0.0
+        self._trava = threading.Lock()
+        self._ativos = trabalhadores
+
+    def _medir(self, duracao):
+        with self._trava:
+            self.itens += 1
+            self.ocupado_s += duracao
+
+    def _encerrar_trabalhador(self):
+        """Retorna True para o último trabalhador do estágio a terminar"""
+        with self._trava:
+            self._ativos -= 1
+            return self._ativos == 0
+
+
+class Pipeline:
+    """Executa itens por uma sequência de estágios, com no máximo ``em_andamento`` itens ao mesmo tempo"""
+
+    def __init__(self, estagios, em_andamento=None):
+        if not estagios:
+            raise ValueError("O pipeline precisa de pelo menos um estágio")
+        self.estagios = list(estagios)
+        self.em_andamento = em_andamento or 2 * sum(e.trabalhadores for e in self.estagios)
+        self.duracao_s = 0.0
+        self._parar = threading.Event()
+
+    def _colocar(self, fila, valor):
+        while not self._parar.is_set():
+            try:
+                fila.put(valor, timeout=_ESPERA)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _retirar(self, fila):
+        while not self._parar.is_set():
+            try:
+                return fila.get(timeout=_ESPERA)
+            except queue.Empty:
+                continue
+        return _FIM
+
+    def _alimentar(self, itens, entrada, vagas):
+        try:
+            for indice, item in enumerate(itens):
+                while not vagas.acquire(timeout=_ESPERA):
+                    if self._parar.is_set():
+                        return
+                if not self._colocar(entrada, (indice, item)):
+                    return
+        except BaseException as e:
+            self._colocar(self._resultados, (None, e))
+        finally:
+            for _ in range(self.estagios[0].trabalhadores):
+                self._colocar(entrada, _FIM)
+
+    def _trabalhar(self, estagio, entrada, saida, proximos):
+        while True:
+            pacote = self._retirar(entrada)
+            if pacote is _FIM:
+                break
+            indice, item = pacote
+            inicio = time.perf_counter()
+            try:
+                item = estagio.funcao(item)
+            except BaseException as e:
+                # Erro inesperado: o consumidor relança a exceção e encerra o pipeline
+                self._colocar(self._resultados, (None, e))
+                continue
+            estagio._medir(time.perf_counter() - inicio)
+            if isinstance(item, Concluido):
+                self._colocar(self._resultados, (indice, item))
+            else:
+                self._colocar(saida, (indice, item))
+        if estagio._encerrar_trabalhador():
+            for _ in range(proximos):
+                self._colocar(saida, _FIM)
+
+    def executar(self, itens):
+        """Gera os resultados dos itens, na ordem de entrada
+
+        Se o consumidor interromper a iteração, os itens ainda não iniciados
+        são descartados e só os que estão em algum estágio terminam.
+        """
+        vagas = threading.Semaphore(self.em_andamento)
+        self._resultados = queue.Queue()
+        filas = [queue.Queue(maxsize=2 * e.trabalhadores) for e in self.estagios]
+        filas.append(self._resultados)
+
+        threads = [threading.Thread(target=self._alimentar, args=(itens, filas[0], vagas),
+                                    name="pipeline-entrada", daemon=True)]
+        for i, estagio in enumerate(self.estagios):
+            proximos = self.estagios[i + 1].trabalhadores if i + 1 < len(self.estagios) else 1
+            for n in range(estagio.trabalhadores):
+                threads.append(threading.Thread(
+                    target=self._trabalhar, args=(estagio, filas[i], filas[i + 1], proximos),
+                    name=f"pipeline-{estagio.nome}-{n}", daemon=True))
+
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            prontos = {}
+            proximo = 0
+            while True:
+                pacote = self._retirar(self._resultados)
+                if pacote is _FIM:
+                    break
+                indice, item = pacote
+                if indice is None:
+                    raise item
+                prontos[indice] = item.valor if isinstance(item, Concluido) else item
+                while proximo in prontos:
+                    valor = prontos.pop(proximo)
+                    proximo += 1
+                    vagas.release()
+                    yield valor
+        finally:
+            self._parar.set()
+            for thread in threads:
+                thread.join()
+            self.duracao_s = time.perf_counter() - inicio
+
+    def utilizacao(self):
+        """Itens, tempo ocupado e fração do tempo em que as threads de cada estágio trabalharam"""
+        relatorio = {}
+        for estagio in self.estagios:
+            capacidade = estagio.trabalhadores * self.duracao_s
+            relatorio[estagio.nome] = {
+                "trabalhadores": estagio.trabalhadores,
+                "itens": estagio.itens,
+                "ocupado_s": round(estagio.ocupado_s, 3),
+                "utilizacao": round(estagio.ocupado_s / capacidade, 3) if capacidade else 0.0,
+            }
+        return relatorio
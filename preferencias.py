@@ -0,0 +1,57 @@
+"""
+Preferências da interface gráfica
+
+Guarda as pastas, o logo e as configurações do último lote iniciado, para
+que a próxima abertura do programa já venha preenchida e o logo já esteja
+carregado quando a janela aparecer.
+"""
+
+import json
+import os
+import sys
+
+
+def arquivo_padrao():
+    """Arquivo de preferências do usuário (APPDATA no Windows, XDG_CONFIG_HOME nos demais)"""
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(base, "PhotoResizer", "preferencias.json")
+
+
+def carregar(caminho=None):
+    """Preferências salvas, ou um dicionário vazio se não houver (ou estiverem corrompidas)"""
+    try:
+        with open(caminho or arquivo_padrao(), encoding="utf-8") as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return dados if isinstance(dados, dict) else {}
+
+
+def salvar(dados, caminho=None):
+    """Grava as preferências (por um arquivo temporário, para nunca ficarem pela metade)"""
+    caminho = caminho or arquivo_padrao()
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def ler_configuracao(dados, padrao):
+    """Configuração salva em ``dados``, sobre a ``padrao`` (engine.Configuracao)
+
+    Campos que não existem mais (preferências de uma versão anterior) são
+    ignorados; se os valores não forem válidos, retorna ``padrao``.
+    """
+    salvos = dados.get("config")
+    if not isinstance(salvos, dict):
+        return padrao
+    campos = padrao.para_dict()
+    campos.update((chave, valor) for chave, valor in salvos.items() if chave in campos)
+    try:
+        return type(padrao).de_dict(campos)
+    except (TypeError, ValueError):
+        return padrao
@@ -0,0 +1,103 @@
+"""
+Prévia do posicionamento do logo e da borda
+
+Mostra na interface gráfica como ficará uma foto da origem sem processar o
+lote. A imagem base (decodificada, reduzida ao tamanho final, convertida para o
+perfil de cores de saída e orientada, exatamente como no lote) fica em um cache LRU pequeno; quando uma margem,
+a posição do logo ou a borda mudam, só a composição de logo e borda é
+refeita sobre ela. Não depende do Qt.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from itertools import islice
+
+from PIL import Image
+
+import engine
+import faixas
+from descoberta import descobrir_imagens
+
+AMOSTRAS = 30  # Primeiras imagens da origem que podem ser vistas na prévia
+CAPACIDADE = 5  # Imagens base em cache: a atual, as vizinhas e alguma folga
+
+# Campos da Configuracao que mudam a imagem base (os demais só mudam a composição)
+CAMPOS_BASE = ("largura_cm", "altura_cm", "dpi", "decodificacao_reduzida", "reducao",
+               "gerenciar_cores", "perfil_cores", "intencao_cores")
+
+# Antes de escolher o logo a prévia mostra só a foto e a borda
+_LOGO_VAZIO = Image.new('RGBA', (1, 1), (0, 0, 0, 0))
+
+
+def listar_amostras(origem, config, quantidade=AMOSTRAS):
+    """Caminhos das primeiras imagens da origem, na ordem do lote"""
+    return [os.path.join(origem, *relativo.split("/"))
+            for relativo, _ in islice(descobrir_imagens(origem, config.recursivo, config.incluir,
+                                                        config.excluir), quantidade)]
+
+
+def vizinhas(amostras, indice):
+    """A amostra ``indice`` seguida da próxima e da anterior (para carregar antes)"""
+    return [amostras[i] for i in (indice, indice + 1, indice - 1) if 0 <= i < len(amostras)]
+
+
+def reduzir_para_tela(imagem, tamanho):
+    """Cópia da imagem composta no tamanho do painel da prévia"""
+    tela = imagem.copy()
+    tela.thumbnail(tamanho, Image.BILINEAR, reducing_gap=2.0)
+    return tela
+
+
+class CachePrevia:
+    """Imagens base das amostras, em LRU, e o último modelo de logo e borda
+
+    Pode ser usado ao mesmo tempo pela thread que carrega as amostras e pela
+    thread da interface.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE):
+        self.capacidade = capacidade
+        self._bases = OrderedDict()
+        self._trava = threading.Lock()
+        self._modelo = None
+
+    @staticmethod
+    def chave(caminho, config):
+        try:
+            mtime = os.path.getmtime(caminho)
+        except OSError:
+            mtime = None
+        return (caminho, mtime) + tuple(getattr(config, campo) for campo in CAMPOS_BASE)
+
+    def consultar(self, caminho, config):
+        """Imagem base já carregada, ou None"""
+        chave = self.chave(caminho, config)
+        with self._trava:
+            base = self._bases.get(chave)
+            if base is not None:
+                self._bases.move_to_end(chave)
+            return base
+
+    def carregar(self, caminho, config):
+        """Imagem base da amostra: decodificada, reduzida, convertida e orientada como no lote"""
+        base = self.consultar(caminho, config)
+        if base is not None:
+            return base
+        with faixas.sem_limite_do_pillow(), Image.open(caminho) as img:
+            base, medidas = engine.decodificar_imagem(img, config)
+            base = engine.reduzir_imagem(base, config, medidas)
+        with self._trava:
+            self._bases[self.chave(caminho, config)] = base
+            while len(self._bases) > self.capacidade:
+                self._bases.popitem(last=False)
+        return base
+
+    def compor(self, base, logo, config):
+        """Aplica logo (None: sem logo) e borda sobre a imagem base, reaproveitando o modelo"""
+        if logo is None:
+            logo = _LOGO_VAZIO
+        chave = engine.ModeloSobreposicao.chave(config)
+        if self._modelo is None or self._modelo[0] is not logo or self._modelo[1] != chave:
+            self._modelo = (logo, chave, engine.ModeloSobreposicao(logo, config))
+        return self._modelo[2].aplicar(base)
@@ -0,0 +1,216 @@
+"""
+Relatório de execução do lote
+
+Cada etapa do processamento de uma imagem é cronometrada (leitura,
+abertura, decodificação, normalização, redimensionamento, cores,
+orientação, tela, logo, borda, codificação e gravação), assim como a
+montagem do PDF. O RelatorioLote reúne essas medidas em um JSON por
+execução, com os tempos de cada imagem, percentis por etapa, as imagens
+mais lentas, os bytes lidos e gravados, as tentativas de codificação para
+caber no limite de tamanho e o detalhe de cada erro, para descobrir se um
+lote lento veio de entradas enormes, de um disco lento ou da montagem do
+PDF.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+VERSAO_RELATORIO = 1
+
+# Etapas cronometradas de cada imagem, na ordem em que acontecem
+ETAPAS = {
+    "ler_s": "leitura",
+    "abrir_s": "abertura",
+    "decodificar_s": "decodificação",
+    "normalizar_s": "normalização",
+    "redimensionar_s": "redimensionamento",
+    "cores_s": "cores",
+    "orientar_s": "orientação",
+    "compor_s": "tela",
+    "logo_s": "logo",
+    "borda_s": "borda",
+    "codificar_s": "codificação",
+    "gravar_s": "gravação",
+}
+
+PERCENTIS = (50, 90, 99)
+MAIS_LENTAS = 10
+
+# Medidas copiadas de cada imagem para o relatório, além dos tempos
+_CAMPOS_IMAGEM = ("formato", "largura_origem", "altura_origem", "orientacao", "perfil_origem",
+                  "bytes_lidos", "bytes_gravados", "qualidade", "tentativas_codificacao", "em_faixas", "cache")
+
+
+def percentil(valores, p):
+    """Percentil ``p`` (0-100) de valores já ordenados, pelo posto mais próximo"""
+    if not valores:
+        return None
+    posto = max(1, -(-len(valores) * p // 100))
+    return valores[min(posto, len(valores)) - 1]
+
+
+def _arredondar(segundos):
+    return None if segundos is None else round(segundos, 4)
+
+
+class RelatorioLote:
+    """Acumula as medidas de um lote e gera o relatório da execução"""
+
+    def __init__(self, origem, destino, config, modo=None, trabalhadores=None):
+        self.origem = origem
+        self.destino = destino
+        self.config = config
+        self.modo = modo
+        self.trabalhadores = trabalhadores
+        self.inicio = datetime.now().astimezone()
+        self._inicio = time.perf_counter()
+        self.duracao_s = None
+        self.imagens = []
+        self.erros = []
+        self.pdf = {"adicionar_s": 0.0, "fechar_s": 0.0, "paginas": 0}
+
+    def registrar(self, arquivo, saida, erro, medidas):
+        """Guarda o resultado de uma imagem, com sucesso ou erro"""
+        medidas = medidas or {}
+        tempos = {etapa: _arredondar(medidas[etapa]) for etapa in ETAPAS if etapa in medidas}
+        imagem = {"arquivo": arquivo, "saida": None if erro else saida}
+        imagem.update((campo, medidas[campo]) for campo in _CAMPOS_IMAGEM if campo in medidas)
+        imagem["tempos"] = tempos
+        imagem["total_s"] = _arredondar(sum(tempos.values()))
+        if erro is not None:
+            detalhe = {"arquivo": arquivo, "mensagem": erro, "tipo": medidas.get("tipo_erro"),
+                       "etapa": medidas.get("etapa_erro")}
+            imagem["erro"] = detalhe
+            self.erros.append(detalhe)
+        self.imagens.append(imagem)
+
+    def medir_pdf(self, etapa, segundos, paginas=None):
+        """Acumula o tempo de ``etapa`` ("adicionar_s" ou "fechar_s") do PDF
+
+        ``paginas`` é o total de páginas do PDF, informado ao fechá-lo.
+        """
+        self.pdf[etapa] += segundos
+        if paginas is not None:
+            self.pdf["paginas"] = paginas
+
+    def concluir(self):
+        self.duracao_s = time.perf_counter() - self._inicio
+
+    def _etapas(self):
+        etapas = {}
+        for etapa in ETAPAS:
+            valores = sorted(imagem["tempos"][etapa] for imagem in self.imagens
+                             if etapa in imagem["tempos"])
+            if not valores:
+                continue
+            total = sum(valores)
+            etapas[etapa] = {
+                "imagens": len(valores),
+                "total_s": _arredondar(total),
+                "media_s": _arredondar(total / len(valores)),
+                **{f"p{p}_s": percentil(valores, p) for p in PERCENTIS},
+                "max_s": valores[-1],
+            }
+        return etapas
+
+    def gerar(self, resultado=None):
+        """Monta o relatório; ``resultado`` (engine.ResultadoLote) completa PDF, cache e estágios"""
+        if self.duracao_s is None:
+            self.concluir()
+        processadas = [imagem for imagem in self.imagens if "erro" not in imagem]
+        lentas = sorted((imagem for imagem in self.imagens if not imagem.get("cache")),
+                        key=lambda imagem: imagem["total_s"], reverse=True)[:MAIS_LENTAS]
+
+        pdf = None
+        if resultado is not None and resultado.pdf_path:
+            pdf = {"arquivo": resultado.pdf_path, "ok": resultado.pdf_ok,
+                   "paginas": self.pdf["paginas"],
+                   "adicionar_s": _arredondar(self.pdf["adicionar_s"]),
+                   "fechar_s": _arredondar(self.pdf["fechar_s"]),
+                   "total_s": _arredondar(self.pdf["adicionar_s"] + self.pdf["fechar_s"])}
+            if resultado.pdf_ok and os.path.exists(resultado.pdf_path):
+                pdf["bytes"] = os.path.getsize(resultado.pdf_path)
+
+        return {
+            "versao": VERSAO_RELATORIO,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "duracao_s": _arredondar(self.duracao_s),
+            "origem": self.origem,
+            "destino": self.destino,
+            "modo": self.modo,
+            "trabalhadores": self.trabalhadores,
+            "config": self.config.para_dict(),
+            "totais": {
+                "imagens": len(self.imagens),
+                "processadas": len(processadas),
+                "erros": len(self.erros),
+                "cache_acertos": sum(1 for imagem in self.imagens if imagem.get("cache")),
+                "cancelado": bool(resultado and resultado.cancelado),
+                "bytes_lidos": sum(imagem.get("bytes_lidos", 0) for imagem in self.imagens),
+                "bytes_gravados": sum(imagem.get("bytes_gravados", 0) for imagem in self.imagens),
+                "tentativas_codificacao": sum(imagem.get("tentativas_codificacao", 0)
+                                              for imagem in self.imagens),
+            },
+            "etapas": self._etapas(),
+            "pdf": pdf,
+            "estagios": resultado.estagios if resultado is not None else {},
+            "mais_lentas": [{"arquivo": imagem["arquivo"], "total_s": imagem["total_s"],
+                             "etapa": max(imagem["tempos"], key=imagem["tempos"].get, default=None),
+                             "largura_origem": imagem.get("largura_origem"),
+                             "altura_origem": imagem.get("altura_origem"),
+                             "bytes_lidos": imagem.get("bytes_lidos")}
+                            for imagem in lentas],
+            "erros": self.erros,
+            "imagens": self.imagens,
+        }
+
+
+def gravar_relatorio(relatorio, caminho):
+    """Grava o relatório em JSON (por um arquivo temporário, para nunca ficar pela metade)"""
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def _formatar_bytes(quantidade):
+    for unidade in ("B", "KB", "MB"):
+        if quantidade < 1024:
+            return f"{quantidade:.0f} {unidade}" if unidade == "B" else f"{quantidade:.1f} {unidade}"
+        quantidade /= 1024
+    return f"{quantidade:.1f} GB"
+
+
+def resumo(relatorio, etapas=4):
+    """Resumo do relatório em poucas linhas, para a interface gráfica
+
+    Mostra as ``etapas`` que mais consumiram tempo, a imagem mais lenta, os
+    bytes lidos e gravados, o tempo do PDF e quantos erros houve.
+    """
+    linhas = []
+    tempos = relatorio["etapas"]
+    total = sum(dados["total_s"] for dados in tempos.values())
+    if total:
+        maiores = sorted(tempos, key=lambda etapa: tempos[etapa]["total_s"], reverse=True)[:etapas]
+        linhas.append("Tempo por etapa: " + ", ".join(
+            f"{ETAPAS[etapa]} {tempos[etapa]['total_s']:.2f} s ({tempos[etapa]['total_s'] / total:.0%}, "
+            f"p90 {tempos[etapa]['p90_s'] * 1000:.0f} ms)" for etapa in maiores))
+    if relatorio["mais_lentas"]:
+        lenta = relatorio["mais_lentas"][0]
+        linhas.append(f"Mais lenta: {lenta['arquivo']} ({lenta['total_s']:.2f} s, "
+                      f"{ETAPAS.get(lenta['etapa'], lenta['etapa'])})")
+    totais = relatorio["totais"]
+    linhas.append(f"Lido: {_formatar_bytes(totais['bytes_lidos'])}, "
+                  f"gravado: {_formatar_bytes(totais['bytes_gravados'])}")
+    ajustadas = [imagem for imagem in relatorio["imagens"] if "tentativas_codificacao" in imagem]
+    if ajustadas:
+        linhas.append(f"Limite de tamanho: {len(ajustadas)} imagens, "
+                      f"{totais['tentativas_codificacao'] / len(ajustadas):.1f} codificações por imagem")
+    if relatorio["pdf"]:
+        linhas.append(f"PDF: {relatorio['pdf']['total_s']:.2f} s "
+                      f"({relatorio['pdf']['paginas']} páginas)")
+    if totais["erros"]:
+        linhas.append(f"Erros: {totais['erros']}")
+    return "\n".join(linhas)
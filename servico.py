@@ -0,0 +1,567 @@
+"""
+Serviço HTTP local do Redimensionador de Fotos
+
+Recebe jobs de outras ferramentas sem passar pela interface gráfica. Os
+jobs entram em uma fila e são executados um por vez, sempre pelo mesmo
+número de trabalhadores; logos e modelos de sobreposição (logo + borda)
+ficam em cache entre os jobs. O servidor escuta só em 127.0.0.1, só aceita
+pedidos endereçados a 127.0.0.1/localhost (contra DNS rebinding) e só cria
+jobs a partir de JSON (application/json) sem Origin de outro site, para que
+páginas abertas no navegador não consigam enviar jobs.
+
+Endpoints:
+    POST /jobs                        cria um job e retorna o id
+    GET  /jobs                        lista os jobs
+    GET  /jobs/<id>                   estado do job
+    GET  /jobs/<id>/eventos           resultado de cada imagem, uma linha JSON
+                                      por evento, até o fim do job
+    POST /jobs/<id>/cancelar          cancela o job (na fila ou em andamento)
+    GET  /jobs/<id>/arquivos/<nome>   baixa uma imagem gerada, o PDF ou o relatório
+
+O job é um JSON com as mesmas chaves do arquivo de job da linha de comando,
+com os arquivos no próprio pedido (conteúdo em base64):
+
+    {"arquivos": {"a.jpg": "<base64>"}, "logo": "<base64>", "borda": true}
+
+ou, se o serviço foi iniciado com ``--raiz``, com pastas e arquivos dentro
+dela (caminhos relativos são relativos à raiz):
+
+    {"origem": "fotos", "destino": "saida", "logo_file": "logo.png", "dpi": 72}
+
+Sem "destino", a saída fica na pasta de trabalho do serviço e pode ser
+baixada por /jobs/<id>/arquivos/<nome>. Os nomes do PDF e do relatório
+ficam sempre dentro do destino. Só os últimos JOBS_MANTIDOS jobs
+terminados são mantidos; os mais antigos são esquecidos junto com a pasta
+de trabalho (arquivos enviados e saídas que ficaram nela).
+
+Exemplo:
+    python servico.py --porta 8765
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import cache
+
+# O motor (e com ele o Pillow) só é importado no primeiro job, para que o
+# serviço abra depressa; ver benchmark.ORCAMENTO_IMPORTACAO_MS
+
+HOST = "127.0.0.1"
+PORTA_PADRAO = 8765
+TAMANHO_MAXIMO_PEDIDO = 512 * 1024 * 1024
+MODELOS_EM_CACHE = 16
+JOBS_MANTIDOS = 100  # Jobs terminados guardados para consulta, com a pasta de trabalho
+
+# Hosts aceitos no cabeçalho Host e na Origin dos pedidos
+HOSTS_LOCAIS = ("127.0.0.1", "localhost")
+
+TERMINADOS = ("concluido", "cancelado", "falhou")
+
+
+class ErroJob(ValueError):
+    """Job inválido (resposta 400)"""
+
+
+class Job:
+    """Um lote enviado ao serviço e os eventos gerados por ele"""
+
+    def __init__(self, origem, destino, config, logo, chave_logo, execucao, id_job=None,
+                 pasta=None):
+        self.id = id_job or uuid.uuid4().hex[:12]
+        self.pasta = pasta  # Pasta de trabalho do job no serviço
+        self.origem = origem
+        self.destino = destino
+        self.config = config
+        self.logo = logo
+        self.chave_logo = chave_logo
+        self.execucao = execucao
+        self.estado = "na_fila"
+        self.criado_em = time.time()
+        self.processadas = 0
+        self.total = 0
+        self.eventos = []
+        self.resultado = None
+        self.mensagem = None
+        self.cancelamento = threading.Event()
+
+    def resumo(self):
+        dados = {
+            "id": self.id,
+            "estado": self.estado,
+            "origem": self.origem,
+            "destino": self.destino,
+            "processadas": self.processadas,
+            "total": self.total,
+            "criado_em": self.criado_em,
+        }
+        if self.resultado is not None:
+            dados.update(
+                erros=[{"arquivo": a, "mensagem": m} for a, m in self.resultado.erros],
+                pdf=self.resultado.pdf_path, pdf_ok=self.resultado.pdf_ok,
+                cache={"acertos": self.resultado.cache_acertos,
+                       "falhas": self.resultado.cache_falhas},
+                estagios=self.resultado.estagios or None,
+                relatorio=(os.path.basename(self.resultado.relatorio_path)
+                           if self.resultado.relatorio_path else None))
+        if self.mensagem:
+            dados["mensagem"] = self.mensagem
+        return dados
+
+
+class ServicoProcessamento:
+    """Fila de jobs executados em segundo plano, com logos e modelos em cache
+
+    ``raiz`` é a única pasta do servidor em que os jobs podem ler e gravar
+    (origem, destino, logo_file e perfil_cores); sem ela os jobs só usam os
+    arquivos enviados no pedido e a pasta de trabalho. ``jobs_mantidos``
+    limita os jobs terminados guardados. Sem ``trabalhadores``, usa
+    engine.TRABALHADORES_PADRAO.
+    """
+
+    def __init__(self, pasta, trabalhadores=None, cache_saida=None,
+                 raiz=None, jobs_mantidos=JOBS_MANTIDOS):
+        self.pasta = pasta
+        self.trabalhadores = trabalhadores
+        self.cache_saida = cache_saida
+        self.raiz = os.path.realpath(raiz) if raiz else None
+        self.jobs_mantidos = jobs_mantidos
+        self._jobs = OrderedDict()
+        self._fila = queue.Queue()
+        self._condicao = threading.Condition()
+        self._logos = {}  # chave -> logo RGBA
+        self._modelos = OrderedDict()  # (chave do logo, chave das configurações) -> modelo
+        self._thread = threading.Thread(target=self._executar, name="servico-jobs", daemon=True)
+        self._thread.start()
+
+    # -- Criação dos jobs --------------------------------------------------
+
+    def _caminho(self, caminho, chave):
+        """Caminho do servidor informado no job, que precisa estar dentro da raiz"""
+        if self.raiz is None:
+            raise ErroJob(f"{chave} não é aceito: o serviço foi iniciado sem --raiz; "
+                          f"envie os arquivos no pedido")
+        if not isinstance(caminho, str) or not caminho:
+            raise ErroJob(f"{chave} inválido")
+        resolvido = os.path.realpath(os.path.join(self.raiz, caminho))
+        if os.path.commonpath([self.raiz, resolvido]) != self.raiz:
+            raise ErroJob(f"{chave} fora da raiz do serviço: {caminho}")
+        return resolvido
+
+    def _carregar_logo(self, spec):
+        """Logo do job, reaproveitado quando o mesmo arquivo ou conteúdo já foi usado"""
+        if "logo" in spec:
+            dados = _decodificar_base64(spec.pop("logo"), "logo")
+            chave = ("dados", hashlib.blake2b(dados, digest_size=20).hexdigest())
+            fonte = io.BytesIO(dados)
+        elif spec.get("logo_file"):
+            caminho = spec["logo_file"] = self._caminho(spec["logo_file"], "logo_file")
+            try:
+                info = os.stat(caminho)
+            except OSError as e:
+                raise ErroJob(f"logo não encontrado: {e}")
+            chave = ("arquivo", caminho, info.st_mtime_ns, info.st_size)
+            fonte = caminho
+        else:
+            raise ErroJob("informe o logo (logo_file ou logo em base64)")
+
+        with self._condicao:
+            logo = self._logos.get(chave)
+        if logo is None:
+            try:
+                logo = _engine().carregar_logo(fonte)
+            except Exception as e:
+                raise ErroJob(f"não foi possível carregar o logo: {e}")
+            with self._condicao:
+                self._logos[chave] = logo
+        return logo, chave
+
+    def _modelo(self, job):
+        engine = _engine()
+        chave = (job.chave_logo, engine.ModeloSobreposicao.chave(job.config))
+        with self._condicao:
+            modelo = self._modelos.get(chave)
+            if modelo is not None:
+                self._modelos.move_to_end(chave)
+                return modelo
+        modelo = engine.ModeloSobreposicao(job.logo, job.config)
+        with self._condicao:
+            self._modelos[chave] = modelo
+            while len(self._modelos) > MODELOS_EM_CACHE:
+                self._modelos.popitem(last=False)
+        return modelo
+
+    def submeter(self, spec):
+        """Valida o job, grava os arquivos enviados e coloca o job na fila"""
+        engine = _engine()
+        if not isinstance(spec, dict):
+            raise ErroJob("o job deve ser um objeto JSON")
+        spec = dict(spec)
+        id_job = uuid.uuid4().hex[:12]
+        pasta_job = os.path.join(self.pasta, id_job)
+        arquivos = spec.pop("arquivos", None)
+        origem = spec.pop("origem", None)
+        if origem is not None:
+            origem = self._caminho(origem, "origem")
+        destino = spec.pop("destino", None)
+        destino = self._caminho(destino, "destino") if destino else os.path.join(pasta_job, "saida")
+        ajustes = spec.pop("estagios", None) or {}
+        for chave in ("trabalhadores", "modo"):
+            spec.pop(chave, None)  # Os trabalhadores são do serviço, não de cada job
+        for chave in ("pdf_nome", "relatorio_nome"):
+            if isinstance(spec.get(chave), str):
+                # Só o nome: o PDF e o relatório ficam no destino
+                spec[chave] = os.path.basename(spec[chave].replace("\\", "/"))
+        if spec.get("perfil_cores", engine.cores.PERFIL_SRGB) != engine.cores.PERFIL_SRGB:
+            spec["perfil_cores"] = self._caminho(spec["perfil_cores"], "perfil_cores")
+
+        logo, chave_logo = self._carregar_logo(spec)
+        try:
+            config = engine.Configuracao.de_dict(spec)
+            engine.codificadores.validar(config)
+            for nome in (config.pdf_arquivo, config.relatorio_arquivo):
+                caminho = os.path.realpath(os.path.join(destino, nome))
+                if os.path.dirname(caminho) != os.path.realpath(destino):
+                    raise ValueError(f"nome de saída inválido: {nome}")
+            trabalhadores = self.trabalhadores or engine.TRABALHADORES_PADRAO
+            execucao = {"modo": "estagios", "trabalhadores": trabalhadores,
+                        "estagios": engine.trabalhadores_estagios(trabalhadores, **ajustes)}
+        except (TypeError, ValueError) as e:
+            raise ErroJob(str(e))
+
+        if arquivos is not None:
+            if origem is not None:
+                raise ErroJob("informe origem ou arquivos, não os dois")
+            if not isinstance(arquivos, dict) or not arquivos:
+                raise ErroJob("arquivos deve ser um objeto {nome: base64}")
+            for nome in arquivos:
+                if not nome or nome != os.path.basename(nome) or nome in (".", ".."):
+                    raise ErroJob(f"nome de arquivo inválido: {nome!r}")
+            origem = os.path.join(pasta_job, "origem")
+            os.makedirs(origem, exist_ok=True)
+            for nome, conteudo in arquivos.items():
+                with open(os.path.join(origem, nome), "wb") as f:
+                    f.write(_decodificar_base64(conteudo, nome))
+        elif not origem or not os.path.isdir(origem):
+            raise ErroJob("informe uma pasta de origem existente ou os arquivos")
+
+        job = Job(origem, destino, config, logo, chave_logo, execucao, id_job, pasta_job)
+        with self._condicao:
+            self._jobs[job.id] = job
+            esquecidos = self._podar_jobs()
+        self._fila.put(job)
+        for antigo in esquecidos:
+            shutil.rmtree(antigo.pasta, ignore_errors=True)
+        return job
+
+    def _podar_jobs(self):
+        """Tira da lista os jobs terminados mais antigos além de ``jobs_mantidos``
+
+        Chamado com ``_condicao`` travada; retorna os jobs esquecidos, cujas
+        pastas de trabalho devem ser apagadas.
+        """
+        terminados = [job for job in self._jobs.values() if job.estado in TERMINADOS]
+        esquecidos = terminados[:max(0, len(terminados) - self.jobs_mantidos)]
+        for job in esquecidos:
+            del self._jobs[job.id]
+        return esquecidos
+
+    # -- Execução ----------------------------------------------------------
+
+    def _publicar(self, job, evento, **dados):
+        dados["evento"] = evento
+        with self._condicao:
+            job.eventos.append(dados)
+            self._condicao.notify_all()
+
+    def _executar(self):
+        while True:
+            job = self._fila.get()
+            if job is None:
+                return
+            with self._condicao:
+                if job.estado != "na_fila":
+                    continue  # Cancelado enquanto esperava
+                job.estado = "processando"
+            self._publicar(job, "inicio", id=job.id, origem=job.origem, destino=job.destino)
+
+            def progresso(processadas, total, arquivo):
+                job.processadas = processadas
+                job.total = total
+
+            def imagem_concluida(arquivo, saida, erro):
+                self._publicar(job, "imagem", arquivo=arquivo, erro=erro,
+                               saida=None if erro else os.path.relpath(saida, job.destino))
+
+            try:
+                job.resultado = _engine().processar_lote(
+                    job.origem, job.destino, job.config, progresso=progresso,
+                    aviso=lambda mensagem: self._publicar(job, "aviso", mensagem=mensagem),
+                    logo=job.logo, cancelar=job.cancelamento.is_set, cache=self.cache_saida,
+                    modelo=self._modelo(job), imagem_concluida=imagem_concluida, **job.execucao)
+                job.estado = "cancelado" if job.resultado.cancelado else "concluido"
+            except Exception as e:
+                job.estado = "falhou"
+                job.mensagem = str(e)
+            if self.cache_saida is not None:
+                self.cache_saida.podar()
+            self._publicar(job, "fim", **job.resumo())
+            with self._condicao:
+                esquecidos = self._podar_jobs()
+            for antigo in esquecidos:
+                shutil.rmtree(antigo.pasta, ignore_errors=True)
+
+    # -- Consulta ----------------------------------------------------------
+
+    def job(self, id_job):
+        with self._condicao:
+            return self._jobs.get(id_job)
+
+    def jobs(self):
+        with self._condicao:
+            return list(self._jobs.values())
+
+    def cancelar(self, job):
+        """Cancela o job: um job na fila nem começa; um em andamento para após a imagem atual"""
+        job.cancelamento.set()
+        with self._condicao:
+            if job.estado != "na_fila":
+                return
+            job.estado = "cancelado"
+        self._publicar(job, "fim", **job.resumo())
+
+    def eventos(self, job, desde, espera=1.0):
+        """Eventos a partir do índice ``desde``; espera até ``espera`` segundos por novos
+
+        O último evento de todo job é "fim".
+        """
+        with self._condicao:
+            if len(job.eventos) <= desde:
+                self._condicao.wait(espera)
+            return job.eventos[desde:]
+
+    def encerrar(self):
+        for job in self.jobs():
+            self.cancelar(job)
+        self._fila.put(None)
+        self._thread.join()
+
+
+def _engine():
+    """O módulo engine, importado na primeira chamada (ver o início do módulo)"""
+    import engine
+    return engine
+
+
+def _decodificar_base64(conteudo, nome):
+    try:
+        return base64.b64decode(conteudo, validate=True)
+    except (binascii.Error, TypeError, ValueError):
+        raise ErroJob(f"conteúdo base64 inválido: {nome}")
+
+
+class ManipuladorHttp(BaseHTTPRequestHandler):
+    """Traduz os pedidos HTTP para o ServicoProcessamento do servidor"""
+
+    server_version = "PhotoResizer"
+
+    @property
+    def servico(self):
+        return self.server.servico
+
+    def log_message(self, formato, *args):
+        sys.stderr.write(f"{self.address_string()} {formato % args}\n")
+
+    def _responder(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _erro(self, status, mensagem):
+        self._responder(status, {"erro": mensagem})
+
+    def _partes(self):
+        return [unquote(parte) for parte in self.path.split("?", 1)[0].strip("/").split("/")]
+
+    def _host_local(self, valor, com_esquema=False):
+        """Se o Host (ou a Origin, ``com_esquema``) aponta para este servidor local"""
+        if com_esquema:
+            esquema, _, valor = valor.partition("://")
+            if esquema != "http":
+                return False
+        return valor in {f"{host}:{self.server.server_address[1]}" for host in HOSTS_LOCAIS}
+
+    def _autorizado(self):
+        """Recusa pedidos para outro Host (DNS rebinding) e, nos POST, de outra Origin"""
+        if not self._host_local(self.headers.get("Host", "")):
+            self._erro(HTTPStatus.FORBIDDEN, "Host não permitido")
+            return False
+        origem = self.headers.get("Origin")
+        if self.command == "POST" and origem is not None and not self._host_local(origem, True):
+            self._erro(HTTPStatus.FORBIDDEN, "Origin não permitida")
+            return False
+        return True
+
+    def _job(self, id_job):
+        job = self.servico.job(id_job)
+        if job is None:
+            self._erro(HTTPStatus.NOT_FOUND, f"job não encontrado: {id_job}")
+        return job
+
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        partes = self._partes()
+        if partes == ["jobs"]:
+            self._responder(HTTPStatus.OK, [job.resumo() for job in self.servico.jobs()])
+        elif len(partes) == 2 and partes[0] == "jobs":
+            job = self._job(partes[1])
+            if job:
+                self._responder(HTTPStatus.OK, job.resumo())
+        elif len(partes) == 3 and partes[0] == "jobs" and partes[2] == "eventos":
+            job = self._job(partes[1])
+            if job:
+                self._transmitir_eventos(job)
+        elif len(partes) >= 4 and partes[0] == "jobs" and partes[2] == "arquivos":
+            job = self._job(partes[1])
+            if job:
+                self._enviar_arquivo(job, "/".join(partes[3:]))
+        else:
+            self._erro(HTTPStatus.NOT_FOUND, "endpoint desconhecido")
+
+    def do_POST(self):
+        if not self._autorizado():
+            return
+        partes = self._partes()
+        if partes == ["jobs"]:
+            self._criar_job()
+        elif len(partes) == 3 and partes[0] == "jobs" and partes[2] == "cancelar":
+            job = self._job(partes[1])
+            if job:
+                self.servico.cancelar(job)
+                self._responder(HTTPStatus.ACCEPTED, job.resumo())
+        else:
+            self._erro(HTTPStatus.NOT_FOUND, "endpoint desconhecido")
+
+    def _criar_job(self):
+        tipo = self.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        if tipo != "application/json":
+            # Formulários e text/plain podem ser enviados por qualquer página sem preflight
+            self._erro(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "envie o job como application/json")
+            return
+        try:
+            tamanho = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            tamanho = -1
+        if tamanho <= 0 or tamanho > TAMANHO_MAXIMO_PEDIDO:
+            self._erro(HTTPStatus.BAD_REQUEST, "Content-Length ausente ou grande demais")
+            return
+        try:
+            spec = json.loads(self.rfile.read(tamanho))
+            job = self.servico.submeter(spec)
+        except json.JSONDecodeError as e:
+            self._erro(HTTPStatus.BAD_REQUEST, f"JSON inválido: {e}")
+        except ErroJob as e:
+            self._erro(HTTPStatus.BAD_REQUEST, str(e))
+        else:
+            self._responder(HTTPStatus.ACCEPTED, job.resumo())
+
+    def _transmitir_eventos(self, job):
+        """Envia cada evento como uma linha JSON assim que acontece, até o fim do job"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()  # Sem Content-Length: o corpo termina quando a conexão fecha
+        enviados = 0
+        try:
+            while not enviados or job.eventos[enviados - 1]["evento"] != "fim":
+                eventos = self.servico.eventos(job, enviados)
+                for evento in eventos:
+                    self.wfile.write(json.dumps(evento, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+                enviados += len(eventos)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # O cliente desistiu de acompanhar; o job continua
+
+    def _enviar_arquivo(self, job, relativo):
+        destino = os.path.realpath(job.destino)
+        caminho = os.path.realpath(os.path.join(destino, relativo))
+        if os.path.commonpath([destino, caminho]) != destino or not os.path.isfile(caminho):
+            self._erro(HTTPStatus.NOT_FOUND, f"arquivo não encontrado: {relativo}")
+            return
+        tipo = "application/pdf" if caminho.lower().endswith(".pdf") else "application/octet-stream"
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(os.path.getsize(caminho)))
+        self.end_headers()
+        with open(caminho, "rb") as f:
+            while bloco := f.read(1024 * 1024):
+                self.wfile.write(bloco)
+
+
+def criar_servidor(servico, porta=PORTA_PADRAO):
+    """Servidor HTTP em 127.0.0.1 (``porta`` 0 escolhe uma porta livre)"""
+    servidor = ThreadingHTTPServer((HOST, porta), ManipuladorHttp)
+    servidor.daemon_threads = True
+    servidor.servico = servico
+    return servidor
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Serviço HTTP local de processamento de fotos")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO,
+                        help=f"Porta em {HOST} (padrão: {PORTA_PADRAO})")
+    parser.add_argument("--pasta", help="Pasta de trabalho para os arquivos enviados "
+                                        "(padrão: uma pasta temporária)")
+    parser.add_argument("--trabalhadores", type=int,
+                        help="Trabalhadores compartilhados pelos jobs (padrão: um por núcleo)")
+    parser.add_argument("--raiz", help="Única pasta em que os jobs podem indicar origem, "
+                                       "destino e logo (padrão: só arquivos enviados no pedido)")
+    parser.add_argument("--jobs-mantidos", type=int, default=JOBS_MANTIDOS,
+                        help=f"Jobs terminados guardados para consulta (padrão: {JOBS_MANTIDOS})")
+    parser.add_argument("--cache", dest="cache_pasta",
+                        help=f"Pasta do cache de saída (padrão: {cache.pasta_padrao()})")
+    parser.add_argument("--cache-limite-mb", type=int, default=cache.LIMITE_PADRAO_MB)
+    parser.add_argument("--sem-cache", action="store_true", help="Não usa o cache de saída")
+    args = parser.parse_args(argv)
+
+    pasta = args.pasta or tempfile.mkdtemp(prefix="photoresizer-")
+    os.makedirs(pasta, exist_ok=True)
+    cache_saida = None if args.sem_cache else cache.CacheSaida(args.cache_pasta, args.cache_limite_mb)
+    servico = ServicoProcessamento(pasta, args.trabalhadores, cache_saida, args.raiz,
+                                   args.jobs_mantidos)
+    servidor = criar_servidor(servico, args.porta)
+    print(f"Servindo em http://{HOST}:{servidor.server_address[1]} (pasta de trabalho: {pasta})",
+          file=sys.stderr, flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servico.encerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def foto(tamanho=(640, 480), modo="RGB"):
+    """Imagem com gradientes e ruído, para que a redução e a codificação não sejam triviais"""
+    largura, altura = tamanho
+    imagem = Image.merge("RGB", (Image.linear_gradient("L").resize(tamanho),
+                                 Image.effect_noise(tamanho, 40).convert("L"),
+                                 Image.radial_gradient("L").resize(tamanho)))
+    return imagem.convert(modo)
+
+
+@pytest.fixture
+def origem(tmp_path):
+    """Pasta com três fotos JPEG e uma PNG"""
+    pasta = tmp_path / "origem"
+    pasta.mkdir()
+    for indice in range(3):
+        foto((640 + 32 * indice, 480)).save(pasta / f"foto{indice}.jpg", quality=90)
+    foto((480, 640)).save(pasta / "foto3.png")
+    return pasta
+
+
+@pytest.fixture
+def logo():
+    logo = Image.new("RGBA", (60, 30), (255, 255, 255, 0))
+    logo.paste((200, 0, 0, 255), (10, 5, 50, 25))
+    return logo
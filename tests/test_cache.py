@@ -0,0 +1,59 @@
+import os
+
+import engine
+from cache import CacheSaida
+
+
+def processar(origem, destino, cache, logo, **ajustes):
+    config = engine.Configuracao(exportar_pdf=False, exportar_relatorio=False, **ajustes)
+    return engine.processar_lote(str(origem), str(destino), config, logo=logo, trabalhadores=1,
+                                 modo="threads", cache=cache)
+
+
+def tamanhos(pasta):
+    from PIL import Image
+    return {nome: Image.open(os.path.join(pasta, nome)).size for nome in sorted(os.listdir(pasta))}
+
+
+def test_acerto_e_falha(origem, tmp_path, logo):
+    cache = CacheSaida(str(tmp_path / "cache"))
+    primeira = processar(origem, tmp_path / "a", cache, logo)
+    assert (primeira.cache_acertos, primeira.cache_falhas) == (0, 4)
+    segunda = processar(origem, tmp_path / "b", cache, logo)
+    assert (segunda.cache_acertos, segunda.cache_falhas) == (4, 0)
+    assert tamanhos(tmp_path / "a") == tamanhos(tmp_path / "b")
+
+    # Outra configuração não reaproveita as entradas
+    terceira = processar(origem, tmp_path / "c", cache, logo, dpi=72)
+    assert (terceira.cache_acertos, terceira.cache_falhas) == (0, 4)
+
+
+def test_poda_remove_as_menos_usadas(tmp_path):
+    cache = CacheSaida(str(tmp_path / "cache"), limite_mb=2500 / 2**20)
+    saida = tmp_path / "saida.jpg"
+    for indice in range(4):
+        saida.write_bytes(bytes([indice]) * 1000)
+        cache.guardar(f"{indice:02d}chave{indice}.jpg", str(saida))
+        caminho = os.path.join(cache.pasta, f"{indice:02d}", f"{indice:02d}chave{indice}.jpg")
+        os.utime(caminho, (1000 + indice, 1000 + indice))
+    assert cache.podar() == 2
+    assert not cache.recuperar("00chave0.jpg", str(saida))
+    assert cache.recuperar("03chave3.jpg", str(saida))
+    assert saida.read_bytes() == bytes([3]) * 1000
+
+
+def test_execucao_sem_cache_nao_altera_o_cache(origem, tmp_path, logo):
+    # A saída recuperada do cache é um hardlink para a entrada; uma execução
+    # sem cache no mesmo destino não pode escrever através dele
+    cache = CacheSaida(str(tmp_path / "cache"))
+    destino = tmp_path / "destino"
+    processar(origem, destino, cache, logo)
+    processar(origem, destino, cache, logo)  # Acertos: saídas ligadas ao cache
+    esperados = tamanhos(destino)
+
+    processar(origem, destino, None, logo, dpi=72)
+    assert tamanhos(destino) != esperados
+
+    novo = processar(origem, tmp_path / "novo", cache, logo)
+    assert novo.cache_acertos == 4
+    assert tamanhos(tmp_path / "novo") == esperados
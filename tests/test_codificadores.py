@@ -0,0 +1,93 @@
+import io
+
+import pytest
+from PIL import Image
+
+import codificadores
+from conftest import foto
+from engine import Configuracao
+
+
+def _tamanho(imagem, formato, qualidade, config):
+    buffer = io.BytesIO()
+    imagem.save(buffer, format=formato,
+                **{**codificadores.opcoes(formato, config), "quality": qualidade})
+    return len(buffer.getvalue())
+
+
+def test_limite_bytes():
+    assert codificadores.limite_bytes(Configuracao()) == 0
+    assert codificadores.limite_bytes(Configuracao(tamanho_maximo_kb=80)) == 80 * 1024
+    assert codificadores.limite_bytes(Configuracao(tamanho_maximo_kb=80, tamanho_alvo_kb=50)) == 50 * 1024
+
+
+def test_sem_limite_codifica_uma_vez():
+    dados, qualidade, tentativas = codificadores.codificar(foto(), "JPEG", Configuracao())
+    assert qualidade is None and tentativas == 1
+    assert Image.open(io.BytesIO(dados)).format == "JPEG"
+
+
+@pytest.mark.parametrize("formato, kb", [("JPEG", 60), ("JPEG", 100), ("JPEG", 200),
+                                         ("WEBP", 90), ("WEBP", 150)])
+def test_tamanho_maximo_respeitado(formato, kb):
+    if not codificadores.suportado(formato.lower()):
+        pytest.skip(f"Pillow sem suporte a {formato}")
+    imagem = foto()
+    config = Configuracao(tamanho_maximo_kb=kb)
+    dados, qualidade, _ = codificadores.codificar(imagem, formato, config)
+    assert len(dados) <= kb * 1024
+    assert config.qualidade_minima <= qualidade <= config.qualidade
+    # É a maior qualidade que cabe
+    if qualidade < config.qualidade:
+        assert _tamanho(imagem, formato, qualidade + 1, config) > kb * 1024
+
+
+@pytest.mark.parametrize("kb", [70, 150])
+def test_tamanho_alvo(kb):
+    config = Configuracao(tamanho_alvo_kb=kb)
+    dados, qualidade, _ = codificadores.codificar(foto(), "JPEG", config)
+    limite = kb * 1024
+    assert len(dados) <= limite
+    assert len(dados) >= limite * (1 - codificadores.TOLERANCIA_ALVO) or qualidade == config.qualidade
+
+
+def test_memoria_encurta_a_busca():
+    config = Configuracao(tamanho_maximo_kb=100)
+    memoria = codificadores.MemoriaQualidade()
+    primeira = codificadores.codificar(foto(), "JPEG", config, memoria)
+    segunda = codificadores.codificar(foto(), "JPEG", config, memoria)
+    assert segunda[1] == primeira[1]
+    assert segunda[2] < primeira[2]
+    assert len(segunda[0]) <= 100 * 1024
+
+
+def test_limite_impossivel():
+    config = Configuracao(tamanho_maximo_kb=1)
+    with pytest.raises(ValueError, match="Não coube"):
+        codificadores.codificar(foto(), "JPEG", config)
+
+
+def test_formato_sem_qualidade_ignora_o_limite():
+    config = Configuracao(tamanho_maximo_kb=1)
+    dados, qualidade, tentativas = codificadores.codificar(foto((64, 48)), "PNG", config)
+    assert qualidade is None and tentativas == 1
+
+
+@pytest.mark.parametrize("qualidade", [1, 30, 39])
+def test_qualidade_abaixo_da_minima_sem_limite(qualidade):
+    config = Configuracao(formato_saida="jpeg", qualidade=qualidade)
+    codificadores.validar(config)
+    dados, escolhida, _ = codificadores.codificar(foto(), "JPEG", config)
+    assert escolhida is None and dados
+
+
+def test_qualidade_abaixo_da_minima_com_limite():
+    config = Configuracao(formato_saida="jpeg", qualidade=30, tamanho_maximo_kb=200)
+    codificadores.validar(config)
+    dados, escolhida, _ = codificadores.codificar(foto(), "JPEG", config)
+    assert escolhida <= 30 and len(dados) <= 200 * 1024
+
+
+def test_qualidade_minima_invalida_com_limite():
+    with pytest.raises(ValueError, match="qualidade mínima"):
+        codificadores.validar(Configuracao(tamanho_maximo_kb=100, qualidade_minima=0))
@@ -0,0 +1,166 @@
+import struct
+
+import pytest
+from PIL import Image
+
+import cores
+import engine
+from conftest import foto
+
+ImageCms = pytest.importorskip("PIL.ImageCms")
+
+
+def _s15(valor):
+    return struct.pack(">i", round(valor * 65536))
+
+
+def _xyz(x, y, z):
+    return b"XYZ \0\0\0\0" + _s15(x) + _s15(y) + _s15(z)
+
+
+def _perfil_icc(nome, rgb=True):
+    """Perfil ICC v2 de matriz com gama 2.2: primárias do Adobe RGB, ou cinza"""
+    curva = b"curv\0\0\0\0" + struct.pack(">IH", 1, round(2.2 * 256)) + b"\0\0"
+    texto = nome.encode() + b"\0"
+    tags = [(b"desc", b"desc\0\0\0\0" + struct.pack(">I", len(texto)) + texto + b"\0" * 79),
+            (b"cprt", b"text\0\0\0\0teste\0"),
+            (b"wtpt", _xyz(0.9642, 1.0, 0.8249))]
+    if rgb:
+        tags += [(b"rXYZ", _xyz(0.6097, 0.3111, 0.0195)), (b"gXYZ", _xyz(0.2053, 0.6257, 0.0609)),
+                 (b"bXYZ", _xyz(0.1492, 0.0632, 0.7446)),
+                 (b"rTRC", curva), (b"gTRC", curva), (b"bTRC", curva)]
+    else:
+        tags += [(b"kTRC", curva)]
+    deslocamento = 128 + 4 + 12 * len(tags)
+    tabela, dados = b"", b""
+    for assinatura, conteudo in tags:
+        conteudo += b"\0" * (-len(conteudo) % 4)
+        tabela += assinatura + struct.pack(">II", deslocamento + len(dados), len(conteudo))
+        dados += conteudo
+    corpo = struct.pack(">I", len(tags)) + tabela + dados
+    cabecalho = (struct.pack(">I", 128 + len(corpo)) + b"lcms" + bytes([2, 0x10, 0, 0]) + b"mntr"
+                 + (b"RGB " if rgb else b"GRAY") + b"XYZ " + b"\0" * 12 + b"acspAPPL" + b"\0" * 24
+                 + _s15(0.9642) + _s15(1.0) + _s15(0.8249) + b"\0" * 48)
+    return cabecalho + corpo
+
+
+ADOBE_RGB = _perfil_icc("Adobe RGB (1998) teste")
+CINZA = _perfil_icc("Cinza 2.2 teste", rgb=False)
+
+
+def _lote(origem, destino, **ajustes):
+    config = engine.Configuracao(**{"dpi": 24, "exportar_pdf": False,
+                                    "exportar_relatorio": False, **ajustes})
+    logo = Image.new("RGBA", (1, 1), (0, 0, 0, 0))
+    resultado = engine.processar_lote(str(origem), str(destino), config, logo=logo,
+                                      modo="threads")
+    assert not resultado.erros
+    return resultado
+
+
+def _transparente(modo):
+    """Metade esquerda opaca (cinza 80), metade direita transparente"""
+    imagem = Image.new("LA", (8, 4), (80, 255))
+    imagem.paste((0, 0), (4, 0, 8, 4))
+    if modo == "P":
+        paleta = Image.new("L", (8, 4), 80)
+        paleta.paste(0, (4, 0, 8, 4))
+        imagem = paleta.convert("P")
+        imagem.info["transparency"] = 0
+        return imagem
+    if modo in ("RGBa", "PA"):
+        return imagem.convert("RGBA").convert(modo)
+    return imagem.convert(modo)
+
+
+@pytest.mark.parametrize("modo, esperado", [
+    ("LA", "L"), ("La", "L"), ("RGBA", "RGB"), ("RGBa", "RGB"), ("PA", "RGB"), ("P", "RGB"),
+])
+def test_transparencia_sobre_branco(modo, esperado):
+    imagem = _transparente(modo)
+    imagem.info["icc_profile"] = b"perfil"
+    normalizada = cores.normalizar(imagem)
+    assert normalizada.mode == esperado == cores.modo_normalizado(imagem)
+    branco, cinza = (255, 80) if esperado == "L" else ((255,) * 3, (80,) * 3)
+    assert normalizada.getpixel((1, 1)) == cinza and normalizada.getpixel((6, 1)) == branco
+    assert normalizada.info == {"icc_profile": b"perfil"}
+
+
+def test_16_bits_vira_8():
+    imagem = Image.new("I;16", (3, 1))
+    for x, valor in enumerate((0, 257 * 100, 65535)):
+        imagem.putpixel((x, 0), valor)
+    normalizada = cores.normalizar(imagem)
+    assert normalizada.mode == "L"
+    assert [normalizada.getpixel((x, 0)) for x in range(3)] == [0, 100, 255]
+
+
+@pytest.mark.parametrize("modo", cores.MODOS_TRABALHO)
+def test_modos_de_trabalho_nao_sao_convertidos(modo):
+    imagem = foto((16, 16), modo)
+    assert cores.normalizar(imagem) is imagem
+
+
+def test_adobe_rgb_convertido_para_srgb():
+    imagem = Image.new("RGB", (4, 4), (200, 50, 50))
+    imagem.info["icc_profile"] = ADOBE_RGB
+    convertida, descricao = cores.converter(imagem, cache=cores.CacheTransformacoes())
+    assert descricao == "Adobe RGB (1998) teste"
+    vermelho, verde, azul = convertida.getpixel((0, 0))
+    # O mesmo vermelho é mais saturado no Adobe RGB: em sRGB o canal vermelho sobe
+    assert vermelho > 220 and verde < 60 and azul < 60
+
+    sem_gerenciar, descricao = cores.converter(imagem, gerenciar=False)
+    assert sem_gerenciar.getpixel((0, 0)) == (200, 50, 50) and descricao is None
+
+
+def test_perfil_de_outro_espaco_ignorado():
+    imagem = Image.new("RGB", (4, 4), (200, 50, 50))
+    imagem.info["icc_profile"] = CINZA
+    convertida, _ = cores.converter(imagem, cache=cores.CacheTransformacoes())
+    assert convertida.getpixel((0, 0)) == (200, 50, 50)
+
+
+def test_lote_com_modos_variados(tmp_path):
+    origem = tmp_path / "origem"
+    origem.mkdir()
+    foto((120, 90), "CMYK").save(origem / "cmyk.jpg", quality=95)
+    adobe = Image.new("RGB", (120, 90), (200, 50, 50))
+    adobe.save(origem / "adobe.jpg", quality=95, icc_profile=ADOBE_RGB)
+    Image.new("L", (120, 90), 128).save(origem / "cinza.png", icc_profile=CINZA)
+    dezesseis = Image.new("I;16", (120, 90))
+    dezesseis.paste(257 * 60, (0, 0, 120, 90))
+    dezesseis.save(origem / "16bits.png")
+    _transparente("P").resize((120, 60)).save(origem / "paleta.png")
+    _transparente("LA").resize((120, 60)).save(origem / "alfa.png")
+
+    destino = tmp_path / "destino"
+    resultado = _lote(origem, destino, formato_saida="png")
+    assert resultado.processadas == 6
+    saidas = {caminho.stem: Image.open(caminho) for caminho in destino.iterdir()}
+    assert {imagem.mode for imagem in saidas.values()} == {"RGB"}
+    centro = tuple(dimensao // 2 for dimensao in saidas["adobe"].size)
+    assert saidas["adobe"].getpixel(centro)[0] > 220
+    assert saidas["16bits"].getpixel(centro) == (60, 60, 60)
+    # O lado transparente fica branco, como a tela em volta
+    largura, altura = saidas["alfa"].size
+    for nome in ("alfa", "paleta"):
+        assert saidas[nome].getpixel((largura * 3 // 4, altura // 2)) == (255, 255, 255)
+        assert saidas[nome].getpixel((largura // 4, altura // 2)) == (80, 80, 80)
+
+
+def test_perfil_de_saida_gravado_na_imagem_e_no_pdf(tmp_path):
+    perfil = tmp_path / "adobe.icc"
+    perfil.write_bytes(ADOBE_RGB)
+    origem = tmp_path / "origem"
+    origem.mkdir()
+    Image.new("RGB", (120, 90), (232, 46, 46)).save(origem / "srgb.jpg", quality=95)
+
+    destino = tmp_path / "destino"
+    _lote(origem, destino, perfil_cores=str(perfil), exportar_pdf=True)
+    with Image.open(destino / "srgb.jpg") as saida:
+        assert saida.info["icc_profile"] == cores.dados_perfil_saida(str(perfil))
+        # O vermelho sRGB saturado fica com menos vermelho no Adobe RGB
+        assert saida.getpixel((60, 45))[0] < 215
+    pdf = (destino / "fotos.pdf").read_bytes()
+    assert b"/ColorSpace [/ICCBased" in pdf and b"/ColorSpace /DeviceRGB" not in pdf
@@ -0,0 +1,59 @@
+import io
+
+import pytest
+from PIL import Image
+
+import descoberta
+import engine
+from conftest import foto
+from descoberta import identificar_formato, percorrer
+
+
+@pytest.mark.parametrize("modo", ["1", "L", "P", "RGB", "RGBA"])
+def test_bmp_reconhecido(modo):
+    buffer = io.BytesIO()
+    Image.new(modo, (5, 5)).save(buffer, "BMP")
+    assert identificar_formato(buffer.getvalue()) == "BMP"
+
+
+def test_arquivo_que_so_comeca_com_bm_nao_e_bmp():
+    assert identificar_formato(b"BM: notas sobre o lote de fotos") is None
+    assert identificar_formato(b"BM") is None
+
+
+def test_percorrer_com_e_sem_ordem(tmp_path):
+    for nome in ("c.jpg", "a.jpg", "b.jpg"):
+        (tmp_path / nome).write_bytes(b"")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "d.jpg").write_bytes(b"")
+    ordenados = [relativo for relativo, _ in percorrer(str(tmp_path), recursivo=True)]
+    assert ordenados == ["a.jpg", "b.jpg", "c.jpg", "sub/d.jpg"]
+    listados = [relativo for relativo, _ in percorrer(str(tmp_path), recursivo=True, ordenar=False)]
+    assert sorted(listados[:3]) == ordenados[:3] and listados[3] == "sub/d.jpg"
+
+
+@pytest.mark.parametrize("inverter", [False, True])
+def test_nomes_que_colidem_nao_dependem_da_listagem(tmp_path, monkeypatch, logo, inverter):
+    origem, destino = tmp_path / "origem", tmp_path / "destino"
+    origem.mkdir()
+    foto().save(origem / "foto.jpg")
+    foto().save(origem / "foto.png")
+    if inverter:
+        scandir = descoberta.os.scandir
+
+        class _Invertida(list):
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *excecao):
+                return False
+
+        def _listar(pasta):
+            with scandir(pasta) as listagem:
+                return _Invertida(sorted(listagem, key=lambda entrada: entrada.name, reverse=True))
+
+        monkeypatch.setattr(descoberta.os, "scandir", _listar)
+    config = engine.Configuracao(dpi=72, formato_saida="jpeg", exportar_pdf=False,
+                                 exportar_relatorio=False)
+    engine.processar_lote(str(origem), str(destino), config, logo=logo, modo="threads")
+    assert sorted(caminho.name for caminho in destino.iterdir()) == ["foto.jpg", "foto.png.jpg"]
@@ -0,0 +1,83 @@
+import dataclasses
+
+import pytest
+from PIL import Image, ImageChops
+
+import cores
+import engine
+import faixas
+from conftest import foto
+
+TETO = 2**20  # Bem menor que as imagens decodificadas, para forçar as faixas
+
+
+def _iguais(a, b):
+    return a.mode == b.mode and a.size == b.size and ImageChops.difference(a, b).getbbox() is None
+
+
+@pytest.mark.parametrize("reducao", ["equilibrada", "maxima"])
+@pytest.mark.parametrize("formato, modo", [("PNG", "RGB"), ("PNG", "RGBA"), ("PNG", "P"),
+                                           ("BMP", "RGB"), ("BMP", "L"),
+                                           ("TIFF", "RGB"), ("TIFF", "CMYK")])
+def test_faixas_iguais_a_decodificacao_normal(tmp_path, formato, modo, reducao):
+    caminho = tmp_path / f"grande.{formato.lower()}"
+    foto((1200, 900), modo).save(caminho, formato)
+    alvo = (150, 113)
+    gap = engine.REDUCING_GAPS[reducao]
+    with Image.open(caminho) as img:
+        assert faixas.excede(img, TETO)
+        assert faixas.como_gravada(img)
+        reduzida = faixas.decodificar(img, alvo, gap, TETO)
+    with Image.open(caminho) as img:
+        esperada = cores.normalizar(img).resize(alvo, Image.LANCZOS, reducing_gap=gap)
+    assert _iguais(reduzida, esperada)
+
+
+@pytest.mark.parametrize("orientacao", range(1, 9))
+def test_tiff_orientado_em_faixas(tmp_path, orientacao):
+    caminho = tmp_path / "orientada.tif"
+    gravada = foto((1200, 900))
+    gravada.save(caminho, tiffinfo={274: orientacao})
+    config = engine.Configuracao(largura_cm=4, altura_cm=4, dpi=100)
+    resultados = []
+    for memoria_mb in (1, 512):
+        with Image.open(caminho) as img:
+            decodificada, medidas = engine.decodificar_imagem(
+                img, dataclasses.replace(config, memoria_maxima_mb=memoria_mb))
+            resultados.append((engine.reduzir_imagem(decodificada, config, medidas), medidas))
+    (faixa, medidas_faixa), (normal, medidas_normal) = resultados
+    assert medidas_faixa.get("em_faixas") and not medidas_normal.get("em_faixas")
+
+    # Em faixas a imagem é reduzida como gravada e endireitada no fim
+    alvo = engine.tamanho_orientado(gravada.size, config.tamanho_final, orientacao)
+    esperada = gravada.resize(alvo, Image.LANCZOS, reducing_gap=engine.REDUCING_GAPS[config.reducao])
+    assert _iguais(faixa, engine.orientar(esperada, orientacao))
+
+    # No caminho normal o plugin TIFF endireita antes da redução: só o arredondamento muda
+    assert faixa.size == normal.size
+    diferenca = ImageChops.difference(faixa, normal).getextrema()
+    assert max(maximo for _, maximo in diferenca) <= 1
+
+
+def test_limite_do_pillow_so_desligado_na_decodificacao(tmp_path, monkeypatch, logo):
+    # Um limite do Pillow bem menor que a foto: o lote a abre mesmo assim,
+    # conferida só pelo limite_megapixels, e fora dele o Pillow recusa
+    assert Image.MAX_IMAGE_PIXELS is not None  # Importar o engine não o desliga
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 10_000)
+    origem = tmp_path / "origem"
+    origem.mkdir()
+    foto().save(origem / "foto.jpg")
+    config = engine.Configuracao(dpi=72, exportar_pdf=False, exportar_relatorio=False)
+    resultado = engine.processar_lote(str(origem), str(tmp_path / "destino"), config, logo=logo,
+                                      modo="threads", trabalhadores=2)
+    assert resultado.processadas == 1 and not resultado.erros
+    assert Image.MAX_IMAGE_PIXELS == 10_000
+    with pytest.raises(Image.DecompressionBombError):
+        Image.open(origem / "foto.jpg")
+
+    with pytest.raises(Image.DecompressionBombError):
+        with faixas.sem_limite_do_pillow():
+            with faixas.sem_limite_do_pillow():
+                faixas.conferir_pixels(foto(), 0.1)
+            assert Image.MAX_IMAGE_PIXELS is None
+    assert Image.MAX_IMAGE_PIXELS == 10_000
@@ -0,0 +1,49 @@
+import pytest
+from PIL import Image, ImageChops, ImageOps, ImageStat
+
+import engine
+from conftest import foto
+
+# Transposição que grava a foto endireitada como ela fica no arquivo com cada orientação
+_GRAVAR = {1: None, 2: Image.Transpose.FLIP_LEFT_RIGHT, 3: Image.Transpose.ROTATE_180,
+           4: Image.Transpose.FLIP_TOP_BOTTOM, 5: Image.Transpose.TRANSPOSE,
+           6: Image.Transpose.ROTATE_90, 7: Image.Transpose.TRANSVERSE,
+           8: Image.Transpose.ROTATE_270}
+
+
+def _endireitada():
+    """Foto em pé com um bloco vermelho no canto superior esquerdo, para achar a orientação"""
+    imagem = foto((600, 900))
+    imagem.paste((255, 0, 0), (0, 0, 150, 150))
+    return imagem
+
+
+@pytest.mark.parametrize("formato", ["JPEG", "PNG"])
+@pytest.mark.parametrize("orientacao", range(1, 9))
+def test_orientacao_depois_da_reducao(tmp_path, formato, orientacao):
+    endireitada = _endireitada()
+    transposicao = _GRAVAR[orientacao]
+    gravada = endireitada if transposicao is None else endireitada.transpose(transposicao)
+    exif = Image.Exif()
+    exif[274] = orientacao
+    caminho = tmp_path / f"foto.{formato.lower()}"
+    gravada.save(caminho, formato, exif=exif, **({"quality": 95} if formato == "JPEG" else {}))
+
+    config = engine.Configuracao(largura_cm=4, altura_cm=6, dpi=100)
+    with Image.open(caminho) as img:
+        decodificada, medidas = engine.decodificar_imagem(img, config)
+        resultado = engine.reduzir_imagem(decodificada, config, medidas)
+    assert medidas["orientacao"] == orientacao
+
+    # Mesmo tamanho que o thumbnail da foto endireitada pelo Pillow
+    with Image.open(caminho) as img:
+        esperada = ImageOps.exif_transpose(img)
+        esperada.thumbnail(config.tamanho_final, Image.LANCZOS)
+    assert resultado.size == esperada.size
+    assert resultado.size[0] < resultado.size[1]
+
+    diferenca = ImageStat.Stat(ImageChops.difference(resultado, esperada.convert("RGB"))).mean
+    assert max(diferenca) < 4
+    # A foto é quase simétrica: o bloco vermelho confere espelhamentos e giros
+    vermelho = resultado.getpixel((5, 5))
+    assert vermelho[0] > 200 and vermelho[1] < 60
@@ -0,0 +1,116 @@
+import io
+import re
+
+import pytest
+
+from conftest import foto
+from pdf import EscritorPdf, ler_info_jpeg
+
+
+def _jpeg(tamanho, modo="RGB"):
+    buffer = io.BytesIO()
+    foto(tamanho, modo).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _png(tamanho):
+    buffer = io.BytesIO()
+    foto(tamanho).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def _conferir_xref(dados):
+    """Cada entrada da tabela xref aponta para o início do objeto correspondente"""
+    inicio = int(re.search(rb"startxref\n(\d+)\n%%EOF\n$", dados).group(1))
+    assert dados[inicio:].startswith(b"xref\n0 ")
+    total = int(dados[inicio + 7:dados.index(b"\n", inicio + 5)])
+    entradas = dados[inicio:].split(b"\n")[3:2 + total]
+    assert len(entradas) == total - 1
+    for numero, entrada in enumerate(entradas, start=1):
+        deslocamento = int(entrada[:10])
+        assert dados[deslocamento:].startswith(f"{numero} 0 obj\n".encode())
+
+
+def test_ler_info_jpeg():
+    assert ler_info_jpeg(_jpeg((64, 48))) == (64, 48, 3)
+    assert ler_info_jpeg(_jpeg((30, 20), "L")) == (30, 20, 1)
+    assert ler_info_jpeg(_jpeg((30, 20), "CMYK")) == (30, 20, 4)
+    assert ler_info_jpeg(_png((30, 20))) is None
+
+
+@pytest.mark.parametrize("largura_cm, por_pagina", [(10, 2), (15, 1)])
+def test_pdf_gerado_e_valido(tmp_path, largura_cm, por_pagina):
+    caminho = tmp_path / "fotos.pdf"
+    jpegs = [_jpeg((200 + 10 * n, 300)) for n in range(3)]
+    arquivo = tmp_path / "arquivo.png"
+    foto((120, 180)).save(arquivo)
+    with EscritorPdf(str(caminho), largura_cm, 15) as pdf:
+        for jpeg in jpegs:
+            pdf.adicionar(jpeg)
+        pdf.adicionar(jpegs[0])  # Repetida: reaproveita o mesmo objeto
+        pdf.adicionar(str(arquivo))
+    assert pdf.imagens == 5
+    assert pdf.paginas == -(-5 // por_pagina)
+    dados = caminho.read_bytes()
+    assert dados.startswith(b"%PDF-1.4\n")
+    _conferir_xref(dados)
+    # Os JPEGs entram no PDF com os próprios bytes e uma única vez cada
+    for jpeg in jpegs:
+        assert dados.count(jpeg) == 1
+    assert not (tmp_path / "fotos.pdf.tmp").exists()
+
+    pypdf = pytest.importorskip("pypdf")
+    leitor = pypdf.PdfReader(io.BytesIO(dados), strict=True)
+    assert len(leitor.pages) == pdf.paginas
+    imagens = [imagem for pagina in leitor.pages for imagem in pagina.images]
+    assert len(imagens) == 5
+    tamanhos = [(200, 300), (210, 300), (220, 300), (200, 300), (120, 180)]
+    assert [imagem.image.size for imagem in imagens] == tamanhos
+
+
+def test_pdf_abortado_nao_deixa_arquivos(tmp_path):
+    caminho = tmp_path / "fotos.pdf"
+    with pytest.raises(RuntimeError):
+        with EscritorPdf(str(caminho), 10, 15) as pdf:
+            pdf.adicionar(_jpeg((100, 150)))
+            raise RuntimeError("lote cancelado")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pdf_sem_imagens(tmp_path):
+    caminho = tmp_path / "vazio.pdf"
+    with EscritorPdf(str(caminho), 10, 15):
+        pass
+    dados = caminho.read_bytes()
+    _conferir_xref(dados)
+    assert b"/Count 0" in dados
+
+
+def test_perfil_icc_gravado_uma_vez(tmp_path):
+    ImageCms = pytest.importorskip("PIL.ImageCms")
+    perfil = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    caminho = tmp_path / "perfil.pdf"
+    with EscritorPdf(str(caminho), 10, 15, perfil_icc=perfil) as pdf:
+        pdf.adicionar(_jpeg((100, 150)))
+        pdf.adicionar(_png((100, 150)))
+        pdf.adicionar(_jpeg((100, 150), "L"))
+    dados = caminho.read_bytes()
+    _conferir_xref(dados)
+    referencias = re.findall(rb"/ColorSpace (\[/ICCBased \d+ 0 R\]|/\w+)", dados)
+    assert referencias[0] == referencias[1] and referencias[0].startswith(b"[/ICCBased")
+    assert referencias[2] == b"/DeviceGray"
+    assert dados.count(b"/N 3 /Alternate /DeviceRGB") == 1
+
+    pypdf = pytest.importorskip("pypdf")
+    leitor = pypdf.PdfReader(io.BytesIO(dados), strict=True)
+    imagem = leitor.pages[0].images[0].indirect_reference.get_object()
+    espaco = imagem["/ColorSpace"]
+    assert espaco[0] == "/ICCBased" and espaco[1].get_object().get_data() == perfil
+
+
+def test_sem_perfil_icc_usa_device_rgb(tmp_path):
+    caminho = tmp_path / "srgb.pdf"
+    with EscritorPdf(str(caminho), 10, 15) as pdf:
+        pdf.adicionar(_jpeg((100, 150)))
+    dados = caminho.read_bytes()
+    assert b"/ColorSpace /DeviceRGB" in dados and b"/ICCBased" not in dados
@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+
+import pytest
+
+from pipeline import Concluido, Estagio, Pipeline
+
+
+def _threads_do_pipeline():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("pipeline-")]
+
+
+def _atrasar(funcao):
+    def estagio(item):
+        time.sleep(random.random() / 200)
+        return funcao(item)
+    return estagio
+
+
+def test_resultados_na_ordem_de_entrada():
+    pipeline = Pipeline([Estagio("dobrar", _atrasar(lambda n: n * 2), 4),
+                         Estagio("somar", _atrasar(lambda n: n + 1), 3)])
+    assert list(pipeline.executar(range(200))) == [n * 2 + 1 for n in range(200)]
+    utilizacao = pipeline.utilizacao()
+    assert utilizacao["dobrar"]["itens"] == utilizacao["somar"]["itens"] == 200
+    assert not _threads_do_pipeline()
+
+
+def test_concluido_pula_os_estagios_seguintes():
+    vistos = []
+
+    def filtrar(n):
+        return Concluido(-n) if n % 3 == 0 else n
+
+    def registrar(n):
+        vistos.append(n)
+        return n
+
+    pipeline = Pipeline([Estagio("filtrar", filtrar, 2), Estagio("registrar", registrar)])
+    assert list(pipeline.executar(range(30))) == [-n if n % 3 == 0 else n for n in range(30)]
+    assert sorted(vistos) == [n for n in range(30) if n % 3]
+
+
+def test_itens_em_andamento_limitados():
+    ativos = 0
+    maximo = 0
+    trava = threading.Lock()
+
+    def entrar(n):
+        nonlocal ativos, maximo
+        with trava:
+            ativos += 1
+            maximo = max(maximo, ativos)
+        return n
+
+    def sair(n):
+        nonlocal ativos
+        time.sleep(0.002)
+        with trava:
+            ativos -= 1
+        return n
+
+    pipeline = Pipeline([Estagio("entrar", entrar, 2), Estagio("sair", sair)], em_andamento=3)
+    for _ in pipeline.executar(range(50)):
+        time.sleep(0.001)  # Consumidor lento: os estágios param em vez de acumular itens
+    assert maximo <= 3
+
+
+def test_erro_em_um_estagio_encerra_o_pipeline():
+    def falhar(n):
+        if n == 20:
+            raise RuntimeError("falhou no item 20")
+        return n
+
+    iniciados = []
+    pipeline = Pipeline([Estagio("falhar", _atrasar(falhar), 3),
+                         Estagio("contar", lambda n: iniciados.append(n) or n)])
+    recebidos = []
+    with pytest.raises(RuntimeError, match="item 20"):
+        for valor in pipeline.executar(range(10_000)):
+            recebidos.append(valor)
+    assert recebidos == list(range(len(recebidos))) and len(recebidos) <= 20
+    assert len(iniciados) < 10_000  # A entrada parou de alimentar o pipeline
+    assert not _threads_do_pipeline()
+
+
+def test_erro_na_entrada_chega_ao_consumidor():
+    def itens():
+        yield from range(5)
+        raise OSError("origem indisponível")
+
+    pipeline = Pipeline([Estagio("copiar", lambda n: n)])
+    with pytest.raises(OSError, match="indisponível"):
+        list(pipeline.executar(itens()))
+    assert not _threads_do_pipeline()
+
+
+def test_consumidor_interrompe_a_iteracao():
+    processados = []
+    pipeline = Pipeline([Estagio("copiar", lambda n: processados.append(n) or n, 2)],
+                        em_andamento=4)
+    resultados = pipeline.executar(range(10_000))
+    assert [next(resultados) for _ in range(3)] == [0, 1, 2]
+    resultados.close()
+    assert not _threads_do_pipeline()
+    assert len(processados) < 20
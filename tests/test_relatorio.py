@@ -0,0 +1,97 @@
+import json
+import os
+import re
+
+import pytest
+
+import engine
+import relatorio as relatorio_mod
+from cache import CacheSaida
+from conftest import foto
+
+
+def _lote(origem, destino, logo, **ajustes):
+    config = engine.Configuracao(dpi=72, **ajustes)
+    return engine.processar_lote(str(origem), str(destino), config, logo=logo, modo="threads")
+
+
+@pytest.mark.parametrize("imagens, paginas", [(1, 1), (3, 2), (4, 2)])
+def test_paginas_do_pdf(tmp_path, logo, imagens, paginas):
+    origem = tmp_path / "origem"
+    origem.mkdir()
+    for indice in range(imagens):
+        foto().save(origem / f"foto{indice}.jpg")
+    resultado = _lote(origem, tmp_path / "saida", logo)
+    dados = open(resultado.pdf_path, "rb").read()
+    assert int(re.search(rb"/Type /Pages .*?/Count (\d+)", dados).group(1)) == paginas
+    assert resultado.relatorio["pdf"]["paginas"] == paginas
+    with open(resultado.relatorio_path, encoding="utf-8") as f:
+        assert json.load(f)["pdf"]["paginas"] == paginas
+
+
+def test_conteudo_do_relatorio(origem, tmp_path, logo):
+    dados = (origem / "foto0.jpg").read_bytes()
+    (origem / "quebrada.jpg").write_bytes(dados[:len(dados) // 3])
+    destino = tmp_path / "saida"
+    resultado = _lote(origem, destino, logo, tamanho_maximo_kb=60)
+    relatorio = resultado.relatorio
+    with open(resultado.relatorio_path, encoding="utf-8") as f:
+        assert json.load(f) == relatorio
+
+    assert relatorio["versao"] == relatorio_mod.VERSAO_RELATORIO
+    assert (relatorio["origem"], relatorio["destino"]) == (str(origem), str(destino))
+    assert relatorio["modo"] == "threads"
+    assert relatorio["config"] == engine.Configuracao(dpi=72, tamanho_maximo_kb=60).para_dict()
+
+    totais = relatorio["totais"]
+    assert (totais["imagens"], totais["processadas"], totais["erros"]) == (5, 4, 1)
+    assert totais["cache_acertos"] == 0 and not totais["cancelado"]
+    erro, = relatorio["erros"]
+    assert erro["arquivo"] == "quebrada.jpg" and erro["tipo"] and erro["etapa"] and erro["mensagem"]
+
+    imagens = {imagem["arquivo"]: imagem for imagem in relatorio["imagens"]}
+    assert imagens["quebrada.jpg"]["saida"] is None and imagens["quebrada.jpg"]["erro"] == erro
+    for nome in ("foto0.jpg", "foto1.jpg", "foto2.jpg", "foto3.png"):
+        imagem = imagens[nome]
+        assert imagem["bytes_lidos"] == (origem / nome).stat().st_size
+        assert imagem["bytes_gravados"] == os.path.getsize(imagem["saida"])
+        if nome.endswith(".jpg"):
+            assert imagem["bytes_gravados"] <= 60 * 1024
+            assert imagem["tentativas_codificacao"] >= 1
+        else:  # PNG não tem qualidade a ajustar ao limite
+            assert "tentativas_codificacao" not in imagem
+        assert set(imagem["tempos"]) <= set(relatorio_mod.ETAPAS)
+        assert {"ler_s", "decodificar_s", "redimensionar_s", "codificar_s"} <= set(imagem["tempos"])
+        assert imagem["total_s"] == pytest.approx(sum(imagem["tempos"].values()), abs=1e-3)
+    assert imagens["foto3.png"]["formato"] == "PNG"
+    png = imagens["foto3.png"]
+    assert (png["largura_origem"], png["altura_origem"]) == (480, 640)
+    assert totais["bytes_lidos"] == sum(imagem.get("bytes_lidos", 0) for imagem in imagens.values())
+    assert totais["tentativas_codificacao"] == sum(
+        imagem.get("tentativas_codificacao", 0) for imagem in imagens.values())
+
+    for etapa, dados_etapa in relatorio["etapas"].items():
+        assert etapa in relatorio_mod.ETAPAS
+        assert (dados_etapa["p50_s"] <= dados_etapa["p90_s"] <= dados_etapa["p99_s"]
+                <= dados_etapa["max_s"])
+    assert relatorio["etapas"]["codificar_s"]["imagens"] == 4
+    lentas = [imagem["total_s"] for imagem in relatorio["mais_lentas"]]
+    assert lentas == sorted(lentas, reverse=True) and len(lentas) == 5
+
+    assert relatorio["pdf"]["paginas"] == 2 and relatorio["pdf"]["ok"]
+    assert relatorio["pdf"]["bytes"] == os.path.getsize(resultado.pdf_path)
+    resumo = relatorio_mod.resumo(relatorio)
+    assert "Erros: 1" in resumo and "(2 páginas)" in resumo and "Limite de tamanho: 3" in resumo
+
+
+def test_imagens_do_cache_no_relatorio(origem, tmp_path, logo):
+    cache = CacheSaida(str(tmp_path / "cache"))
+    config = engine.Configuracao(dpi=72, exportar_pdf=False)
+    for destino in ("a", "b"):
+        resultado = engine.processar_lote(str(origem), str(tmp_path / destino), config, logo=logo,
+                                          modo="threads", cache=cache)
+    relatorio = resultado.relatorio
+    assert relatorio["totais"]["cache_acertos"] == 4
+    assert all(imagem["cache"] for imagem in relatorio["imagens"])
+    # Imagens vindas do cache não contam entre as mais lentas, e o lote sem PDF não o relata
+    assert relatorio["mais_lentas"] == [] and relatorio["pdf"] is None
@@ -0,0 +1,109 @@
+import base64
+import http.client
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import servico
+from conftest import foto
+
+
+@pytest.fixture
+def servidor(tmp_path):
+    raiz = tmp_path / "raiz"
+    raiz.mkdir()
+    processamento = servico.ServicoProcessamento(str(tmp_path / "trabalho"), trabalhadores=1,
+                                                 raiz=str(raiz), jobs_mantidos=2)
+    http_servidor = servico.criar_servidor(processamento, 0)
+    thread = threading.Thread(target=http_servidor.serve_forever, daemon=True)
+    thread.start()
+    yield http_servidor
+    http_servidor.shutdown()
+    http_servidor.server_close()
+    processamento.encerrar()
+
+
+def base64_imagem(imagem, formato):
+    buffer = io.BytesIO()
+    imagem.save(buffer, formato)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def job_enviado(**ajustes):
+    return {"arquivos": {"a.jpg": base64_imagem(foto(), "JPEG")},
+            "logo": base64_imagem(foto((40, 20), "RGBA"), "PNG"), **ajustes}
+
+
+def pedir(servidor, metodo, caminho, corpo=None, **cabecalhos):
+    porta = servidor.server_address[1]
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+    cabecalhos.setdefault("Content-Type", "application/json")
+    dados = json.dumps(corpo).encode("utf-8") if corpo is not None else None
+    conexao.request(metodo, caminho, body=dados, headers=cabecalhos)
+    resposta = conexao.getresponse()
+    texto = resposta.read().decode("utf-8")
+    conexao.close()
+    return resposta.status, texto
+
+
+def esperar(servidor, id_job):
+    status, texto = pedir(servidor, "GET", f"/jobs/{id_job}/eventos")
+    return json.loads(texto.strip().splitlines()[-1])
+
+
+def test_job_com_arquivos_enviados(servidor):
+    status, texto = pedir(servidor, "POST", "/jobs", job_enviado(dpi=72))
+    assert status == 202
+    fim = esperar(servidor, json.loads(texto)["id"])
+    assert fim["estado"] == "concluido" and fim["processadas"] == 1
+
+
+def test_recusa_pedidos_de_outros_sites(servidor):
+    assert pedir(servidor, "POST", "/jobs", job_enviado(),
+                 **{"Content-Type": "text/plain"})[0] == 415
+    assert pedir(servidor, "POST", "/jobs", job_enviado(), Origin="http://exemplo.com")[0] == 403
+    assert pedir(servidor, "GET", "/jobs", Host="exemplo.com")[0] == 403
+
+
+def test_nomes_de_saida_ficam_no_destino(servidor, tmp_path):
+    status, texto = pedir(servidor, "POST", "/jobs",
+                          job_enviado(pdf_nome=str(tmp_path / "fora"), relatorio_nome="../../r"))
+    assert status == 202
+    fim = esperar(servidor, json.loads(texto)["id"])
+    assert not (tmp_path / "fora.pdf").exists()
+    assert os.path.dirname(fim["pdf"]) == fim["destino"]
+    assert os.path.basename(fim["pdf"]) == "fora.pdf"
+
+
+def test_caminhos_fora_da_raiz(servidor, tmp_path):
+    (tmp_path / "raiz" / "fotos").mkdir()
+    status, texto = pedir(servidor, "POST", "/jobs", job_enviado(arquivos=None, origem="/etc"))
+    assert status == 400 and "fora da raiz" in texto
+    status, _ = pedir(servidor, "POST", "/jobs",
+                      job_enviado(arquivos=None, origem="fotos", destino="../saida"))
+    assert status == 400
+
+
+def test_jobs_terminados_sao_podados(servidor):
+    ids = []
+    for _ in range(4):
+        status, texto = pedir(servidor, "POST", "/jobs", job_enviado(dpi=72, exportar_pdf=False))
+        ids.append(json.loads(texto)["id"])
+        esperar(servidor, ids[-1])
+    status, texto = pedir(servidor, "GET", "/jobs")
+    restantes = [job["id"] for job in json.loads(texto)]
+    assert restantes == ids[-2:] or restantes == ids[-3:]
+    assert not os.path.exists(os.path.join(servidor.servico.pasta, ids[0]))
+
+
+def test_importar_servico_nao_carrega_o_motor():
+    pasta = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codigo = "import sys, servico; print(sorted({'engine', 'PIL'} & set(sys.modules)))"
+    saida = subprocess.run([sys.executable, "-c", codigo], cwd=pasta, capture_output=True,
+                           text=True, check=True).stdout
+    assert saida.strip() == "[]"
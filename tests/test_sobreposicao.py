@@ -0,0 +1,56 @@
+import pytest
+from PIL import Image, ImageChops
+
+import engine
+from conftest import foto
+
+
+def _composicao_antiga(imagem, logo, config):
+    """Tela branca, imagem centralizada, logo e por fim a borda, como antes do modelo"""
+    largura, altura = config.tamanho_final
+    final = Image.new('RGB', (largura, altura), 'white')
+    final.paste(imagem, ((largura - imagem.width) // 2, (altura - imagem.height) // 2))
+    final = engine.aplicar_logo(final, logo, config)
+    if config.borda:
+        final = engine.adicionar_borda(final, config.borda_espessura, config.borda_cor,
+                                       config.borda_pontilhada, config.borda_traco,
+                                       config.borda_intervalo, config.borda_traco_cheio)
+    return final
+
+
+def _logo_translucido():
+    """Logo com alfa em degradê, para conferir a mistura nas bordas do desenho"""
+    logo = Image.new('RGBA', (90, 40), (20, 40, 200, 0))
+    logo.putalpha(Image.linear_gradient('L').resize((90, 40)))
+    logo.paste((255, 200, 0, 255), (30, 10, 60, 30))
+    return logo
+
+
+@pytest.mark.parametrize("posicao", engine.POSICOES_LOGO)
+@pytest.mark.parametrize("borda", [
+    {"borda": False},
+    {"borda": True, "borda_espessura": 6},
+    {"borda": True, "borda_espessura": 9, "borda_pontilhada": True},
+    {"borda": True, "borda_espessura": 5, "borda_pontilhada": True, "borda_traco_cheio": True},
+])
+@pytest.mark.parametrize("tamanho", [(200, 150), (120, 200)])
+def test_modelo_igual_a_composicao_antiga(logo, posicao, borda, tamanho):
+    config = engine.Configuracao(largura_cm=8, altura_cm=6, dpi=72, logo_pos=posicao,
+                                 margem_direita=7, margem_inferior=4, ajuste_vertical=-3, **borda)
+    imagem = foto(tamanho).resize(engine.tamanho_orientado(tamanho, config.tamanho_final, None))
+    for logo_lote in (logo, _logo_translucido()):
+        modelo = engine.ModeloSobreposicao(logo_lote, config)
+        esperado = _composicao_antiga(imagem, logo_lote, config)
+        obtido = modelo.aplicar(imagem.copy())
+        assert obtido.size == esperado.size
+        assert ImageChops.difference(obtido, esperado).getbbox() is None
+
+
+def test_logo_maior_que_a_tela():
+    config = engine.Configuracao(largura_cm=2, altura_cm=2, dpi=72, borda=True,
+                                 borda_espessura=3, borda_pontilhada=True)
+    logo = _logo_translucido().resize((120, 90))
+    imagem = foto((50, 50))
+    esperado = _composicao_antiga(imagem, logo, config)
+    obtido = engine.ModeloSobreposicao(logo, config).aplicar(imagem.copy())
+    assert ImageChops.difference(obtido, esperado).getbbox() is None
@@ -0,0 +1,95 @@
+import json
+import os
+import re
+
+import pytest
+from PIL import Image, ImageChops, ImageStat
+
+import engine
+from cache import CacheSaida
+
+
+def _versoes(destino, **ajustes):
+    """Três versões de tamanhos diferentes, uma delas em outro formato e com borda"""
+    return [
+        engine.VersaoLote(str(destino / "grande"), engine.Configuracao(
+            dpi=96, exportar_pdf=False, exportar_relatorio=False, **ajustes), "grande"),
+        engine.VersaoLote(str(destino / "media"), engine.Configuracao(
+            dpi=48, formato_saida="png", borda=True, borda_espessura=4,
+            exportar_pdf=False, exportar_relatorio=False, **ajustes), "media"),
+        engine.VersaoLote(str(destino / "pequena"), engine.Configuracao(
+            dpi=24, exportar_pdf=False, exportar_relatorio=False, **ajustes), "pequena"),
+    ]
+
+
+def _processar(origem, versoes, logo, modo="threads", cache=None):
+    return engine.processar_versoes(str(origem), engine.Configuracao(), versoes,
+                                    logos={None: logo}, trabalhadores=2, modo=modo, cache=cache)
+
+
+@pytest.mark.parametrize("modo", ["threads", "estagios"])
+def test_cada_versao_igual_a_um_lote_proprio(origem, tmp_path, logo, modo):
+    versoes = _versoes(tmp_path / "versoes")
+    resultados = _processar(origem, versoes, logo, modo)
+    assert [resultado.processadas for resultado in resultados] == [4, 4, 4]
+    assert not any(resultado.erros for resultado in resultados)
+
+    for versao in versoes:
+        lote = tmp_path / "lote" / os.path.basename(versao.destino)
+        engine.processar_lote(str(origem), str(lote), versao.config, logo=logo, modo="threads")
+        nomes = sorted(os.listdir(versao.destino))
+        assert nomes == sorted(os.listdir(lote))
+        for nome in nomes:
+            with Image.open(os.path.join(versao.destino, nome)) as gerada, \
+                    Image.open(lote / nome) as esperada:
+                assert gerada.format == esperada.format and gerada.size == esperada.size
+                # As versões menores são reduzidas a partir da anterior, então
+                # podem diferir um pouco do lote que parte da origem
+                diferenca = ImageStat.Stat(ImageChops.difference(gerada.convert("RGB"),
+                                                                 esperada.convert("RGB")))
+                assert max(diferenca.mean) < 3
+
+
+def test_cache_por_versao(origem, tmp_path, logo):
+    cache = CacheSaida(str(tmp_path / "cache"))
+    primeira = _processar(origem, _versoes(tmp_path / "a"), logo, cache=cache)
+    assert [(r.cache_acertos, r.cache_falhas) for r in primeira] == [(0, 4)] * 3
+
+    segunda = _processar(origem, _versoes(tmp_path / "b"), logo, cache=cache)
+    assert [(r.cache_acertos, r.cache_falhas) for r in segunda] == [(4, 0)] * 3
+    for nome in ("grande", "media", "pequena"):
+        for arquivo in os.listdir(tmp_path / "a" / nome):
+            assert ((tmp_path / "a" / nome / arquivo).read_bytes()
+                    == (tmp_path / "b" / nome / arquivo).read_bytes())
+
+    # Só a versão alterada volta a ser gerada; as outras continuam no cache
+    versoes = _versoes(tmp_path / "c")
+    versoes[1].config.borda_cor = "#0000FF"
+    terceira = _processar(origem, versoes, logo, cache=cache)
+    assert [(r.cache_acertos, r.cache_falhas) for r in terceira] == [(4, 0), (0, 4), (4, 0)]
+
+
+def test_pdf_e_relatorio_por_versao(origem, tmp_path, logo):
+    versoes = _versoes(tmp_path / "versoes")
+    versoes[0].config.exportar_pdf = True
+    versoes[2].config.exportar_pdf = True
+    versoes[2].config.exportar_relatorio = True
+    resultados = _processar(origem, versoes, logo)
+
+    assert resultados[1].pdf_path is None
+    assert not os.path.exists(os.path.join(versoes[1].destino, "fotos.pdf"))
+    for indice in (0, 2):
+        assert resultados[indice].pdf_ok
+        dados = open(resultados[indice].pdf_path, "rb").read()
+        assert re.search(rb"/Type /Pages /Kids \[[^\]]*\] /Count 2", dados)
+        assert os.path.dirname(resultados[indice].pdf_path) == versoes[indice].destino
+
+    relatorio = json.loads(open(resultados[2].relatorio_path, encoding="utf-8").read())
+    assert relatorio["pdf"]["paginas"] == 2
+    assert len(relatorio["imagens"]) == 4
+    assert resultados[0].relatorio_path is None
+
+
+def test_sem_versoes(origem):
+    with pytest.raises(ValueError):
+        engine.processar_versoes(str(origem), engine.Configuracao(), [])
@@ -0,0 +1,31 @@
+import threading
+
+import pytest
+
+from conftest import foto
+from vigia import VigiaPasta
+
+
+@pytest.mark.parametrize("inotify", [False, True])
+def test_entregas_esquecidas_quando_o_arquivo_some(tmp_path, inotify):
+    (tmp_path / "sub").mkdir()
+    for nome in ("a.jpg", "b.jpg", "sub/c.jpg"):
+        foto((32, 24)).save(tmp_path / nome)
+    vigia = VigiaPasta(str(tmp_path), recursivo=True, estabilizacao=0, intervalo=0,
+                       inotify=inotify)
+    parar = threading.Event()
+    arquivos = vigia.arquivos(parar)
+    try:
+        entregues = {next(arquivos)[0] for _ in range(3)}
+        assert entregues == {"a.jpg", "b.jpg", "sub/c.jpg"}
+
+        (tmp_path / "a.jpg").unlink()
+        (tmp_path / "sub" / "c.jpg").unlink()
+        (tmp_path / "sub").rmdir()
+        foto((32, 24)).save(tmp_path / "d.jpg")
+        assert next(arquivos)[0] == "d.jpg"
+        assert set(vigia._entregues) == {"b.jpg", "d.jpg"}
+    finally:
+        parar.set()
+        arquivos.close()
+        vigia.fechar()
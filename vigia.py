@@ -0,0 +1,234 @@
+"""
+Pasta vigiada
+
+A VigiaPasta acompanha a pasta de origem e entrega cada imagem nova (ou
+alterada) assim que o arquivo para de crescer, para que as fotos
+copiadas ao longo do dia sejam processadas em segundos, sem alguém
+reiniciar o lote. No Linux as mudanças chegam pelo inotify; nos demais
+sistemas (ou se o inotify não estiver disponível) a pasta é varrida
+periodicamente.
+
+Um arquivo é considerado pronto quando o tamanho e a data de modificação
+não mudam por ``estabilizacao`` segundos; só então o formato é detectado
+pelo conteúdo, como na descoberta do lote.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from descoberta import (aceitar_arquivo, aceitar_pasta, detectar_formato, normalizar_pasta,
+                        percorrer)
+
+ESTABILIZACAO_S = 1.0  # Tempo sem mudanças para considerar um arquivo pronto
+INTERVALO_VARREDURA_S = 2.0  # Entre varreduras quando não há inotify
+
+# Constantes de <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_MASCARA = (_IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+            | _IN_DELETE)
+_EVENTO = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Acesso mínimo ao inotify do Linux via ctypes"""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self._pastas = {}  # descritor -> prefixo relativo ("" ou "sub/")
+
+    def adicionar(self, caminho, prefixo):
+        descritor = self._libc.inotify_add_watch(self.fd, os.fsencode(caminho), _MASCARA)
+        if descritor < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch falhou: {caminho}")
+        self._pastas[descritor] = prefixo
+
+    def ler(self, espera):
+        """Eventos como ``(relativo, eh_pasta)``; ``(None, False)`` se a fila do kernel transbordou"""
+        prontos, _, _ = select.select([self.fd], [], [], espera)
+        if not prontos:
+            return []
+        try:
+            dados = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        eventos = []
+        pos = 0
+        while pos + _EVENTO.size <= len(dados):
+            descritor, mascara, _, tamanho = _EVENTO.unpack_from(dados, pos)
+            nome = dados[pos + _EVENTO.size:pos + _EVENTO.size + tamanho].rstrip(b"\0")
+            pos += _EVENTO.size + tamanho
+            if mascara & _IN_Q_OVERFLOW:
+                eventos.append((None, False))
+            elif nome and descritor in self._pastas:
+                eventos.append((self._pastas[descritor] + os.fsdecode(nome), bool(mascara & _IN_ISDIR)))
+        return eventos
+
+    def fechar(self):
+        os.close(self.fd)
+
+
+class VigiaPasta:
+    """Entrega as imagens da origem à medida que chegam e ficam estáveis
+
+    ``recursivo``, ``incluir``, ``excluir`` e ``ignorar`` têm o mesmo
+    sentido que em descoberta.percorrer. Os arquivos que já estão na pasta
+    ao iniciar também são entregues (o cache de saída evita reprocessar os
+    que não mudaram). ``detectado_em`` guarda quando cada arquivo ainda não
+    concluído foi visto pela primeira vez, para medir a latência.
+    """
+
+    def __init__(self, origem, recursivo=False, incluir=(), excluir=(), ignorar=(),
+                 estabilizacao=ESTABILIZACAO_S, intervalo=INTERVALO_VARREDURA_S, inotify=True):
+        self.origem = origem
+        self.recursivo = recursivo
+        self.incluir = incluir
+        self.excluir = excluir
+        self.ignorar = ignorar
+        self.estabilizacao = estabilizacao
+        self.intervalo = intervalo
+        self.detectado_em = {}
+        self._ignorar_normalizado = {normalizar_pasta(pasta) for pasta in ignorar}
+        self._candidatos = {}  # relativo -> (tamanho, mtime_ns, estável desde)
+        self._entregues = {}  # relativo -> (tamanho, mtime_ns) já entregues
+
+        self._inotify = None
+        if inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self._vigiar_pasta(origem, "")
+            except (OSError, AttributeError):
+                if self._inotify is not None:
+                    self._inotify.fechar()
+                self._inotify = None
+
+    @property
+    def modo(self):
+        return "inotify" if self._inotify is not None else "varredura"
+
+    def _vigiar_pasta(self, caminho, prefixo):
+        self._inotify.adicionar(caminho, prefixo)
+        if not self.recursivo:
+            return
+        for entrada in os.scandir(caminho):
+            relativo = prefixo + entrada.name
+            if entrada.is_dir() and aceitar_pasta(relativo, entrada.path, self.excluir,
+                                                  self._ignorar_normalizado):
+                self._vigiar_pasta(entrada.path, relativo + "/")
+
+    def _varrer(self, origem=None, prefixo=""):
+        """Marca como candidatos os arquivos novos ou alterados desde a entrega"""
+        pasta = origem or self.origem
+        vistos = set()
+        for relativo, entrada in percorrer(pasta, self.recursivo, (), self.excluir, self.ignorar,
+                                           ordenar=False):
+            vistos.add(prefixo + relativo)
+            self._marcar(prefixo + relativo, entrada)
+        self._esquecer(prefixo, vistos)
+
+    def _esquecer(self, prefixo, vistos=()):
+        """Descarta as entregas sob ``prefixo`` que não estão mais na pasta
+
+        Sem isso ``_entregues`` cresceria com cada arquivo já removido da
+        origem, numa vigia que fica aberta por dias.
+        """
+        for relativo in [relativo for relativo in self._entregues
+                         if relativo.startswith(prefixo) and relativo not in vistos]:
+            del self._entregues[relativo]
+
+    def _marcar(self, relativo, entrada=None):
+        if relativo in self._candidatos or not aceitar_arquivo(relativo, self.incluir, self.excluir):
+            return
+        try:
+            # No Windows o DirEntry da varredura já traz o stat, sem outra chamada ao disco
+            info = entrada.stat() if entrada is not None else os.stat(self._caminho(relativo))
+        except OSError:
+            self._entregues.pop(relativo, None)  # Removido ou renomeado
+            return
+        if self._entregues.get(relativo) == (info.st_size, info.st_mtime_ns):
+            return
+        agora = time.monotonic()
+        self._candidatos[relativo] = (info.st_size, info.st_mtime_ns, agora)
+        self.detectado_em.setdefault(relativo, agora)
+
+    def _caminho(self, relativo):
+        return os.path.join(self.origem, *relativo.split("/"))
+
+    def _receber_eventos(self, espera):
+        for relativo, eh_pasta in self._inotify.ler(espera):
+            if relativo is None:
+                self._varrer()  # Eventos perdidos: confere a pasta inteira
+            elif eh_pasta:
+                caminho = self._caminho(relativo)
+                if not os.path.isdir(caminho):
+                    self._esquecer(relativo + "/")  # Pasta removida ou renomeada
+                elif self.recursivo and aceitar_pasta(relativo, caminho, self.excluir,
+                                                      self._ignorar_normalizado):
+                    try:
+                        self._vigiar_pasta(caminho, relativo + "/")
+                        # Arquivos copiados antes de a pasta passar a ser vigiada
+                        self._varrer(caminho, relativo + "/")
+                    except OSError:
+                        pass
+            else:
+                self._candidatos.pop(relativo, None)  # Mudou: recomeça a contagem
+                self._marcar(relativo)
+
+    def _prontos(self):
+        """Retira dos candidatos os arquivos que pararam de mudar"""
+        agora = time.monotonic()
+        prontos = []
+        for relativo, (tamanho, mtime, desde) in list(self._candidatos.items()):
+            try:
+                info = os.stat(self._caminho(relativo))
+            except OSError:
+                del self._candidatos[relativo]  # Removido ou renomeado antes de ficar pronto
+                self.detectado_em.pop(relativo, None)
+                continue
+            if (info.st_size, info.st_mtime_ns) != (tamanho, mtime):
+                self._candidatos[relativo] = (info.st_size, info.st_mtime_ns, agora)
+            elif agora - desde >= self.estabilizacao:
+                del self._candidatos[relativo]
+                self._entregues[relativo] = (tamanho, mtime)
+                prontos.append(relativo)
+        return sorted(prontos)
+
+    def arquivos(self, parar):
+        """Gera ``(relativo, formato)`` de cada imagem pronta até ``parar`` (threading.Event)"""
+        self._varrer()
+        ultima_varredura = time.monotonic()
+        # Confere os candidatos algumas vezes dentro do tempo de estabilização
+        passo = min(self.estabilizacao / 4, 0.25) or 0.05
+        while not parar.is_set():
+            if self._inotify is not None:
+                self._receber_eventos(passo if self._candidatos else 0.5)
+            else:
+                if time.monotonic() - ultima_varredura >= self.intervalo:
+                    self._varrer()
+                    ultima_varredura = time.monotonic()
+                parar.wait(passo if self._candidatos else min(self.intervalo, 0.5))
+            for relativo in self._prontos():
+                formato = detectar_formato(self._caminho(relativo))
+                if formato is None:
+                    self.detectado_em.pop(relativo, None)
+                    continue
+                yield relativo, formato
+
+    def fechar(self):
+        if self._inotify is not None:
+            self._inotify.fechar()
+            self._inotify = None
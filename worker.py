@@ -0,0 +1,159 @@
+"""
+Execução do lote fora da thread da interface gráfica
+
+O ProcessamentoWorker roda o motor em uma QThread e envia o progresso por
+sinais, limitado a INTERVALO_PROGRESSO, com vazão (imagens/s) e tempo restante.
+O PreviaWorker lista e decodifica as amostras da prévia de posicionamento.
+"""
+
+import os
+import queue
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import engine
+import previa
+import relatorio
+
+
+def formatar_eta(segundos):
+    """Formata o tempo restante como m:ss"""
+    if segundos is None:
+        return "--:--"
+    minutos, segundos = divmod(int(round(segundos)), 60)
+    return f"{minutos}:{segundos:02d}"
+
+
+def formatar_estagios(estagios):
+    """Resume a utilização de cada estágio do pipeline (ex.: leitura 12% (4))"""
+    return ", ".join(f"{nome} {dados['utilizacao']:.0%} ({dados['trabalhadores']})"
+                     for nome, dados in estagios.items())
+
+
+def formatar_relatorio(resultado):
+    """Resumo do relatório da execução para a mensagem de conclusão ("" se não houver)"""
+    if not resultado.relatorio:
+        return ""
+    texto = relatorio.resumo(resultado.relatorio)
+    if resultado.relatorio_path:
+        texto += f"\nRelatório: {os.path.basename(resultado.relatorio_path)}"
+    return f"\n\n{texto}"
+
+
+class ProcessamentoWorker(QThread):
+    """Processa um lote em segundo plano, com suporte a cancelamento"""
+
+    # processadas, concluídas (inclui erros), total, imagens/s, segundos restantes (-1 = desconhecido)
+    progresso = pyqtSignal(int, int, int, float, float)
+    aviso = pyqtSignal(str)
+    concluido = pyqtSignal(object)
+    falhou = pyqtSignal(str)
+
+    def __init__(self, origem, destino, config, logo, trabalhadores=1, cache=None,
+                 modo="estagios", parent=None):
+        super().__init__(parent)
+        self.origem = origem
+        self.destino = destino
+        self.config = config
+        self.logo = logo
+        self.trabalhadores = trabalhadores
+        self.cache = cache
+        self.modo = modo
+        self._cancelar = threading.Event()
+
+    def cancelar(self):
+        """Pede o cancelamento; o lote para depois da imagem atual"""
+        self._cancelar.set()
+
+    def run(self):
+        medidor = None
+
+        def progresso(processadas, total, arquivo):
+            nonlocal medidor
+            if medidor is None:
+                medidor = engine.MedidorProgresso(total)
+            medidor.total = total  # Cresce enquanto a origem é percorrida
+            if medidor.registrar():
+                eta = medidor.eta
+                self.progresso.emit(processadas, medidor.concluidas, total, medidor.taxa,
+                                    -1.0 if eta is None else eta)
+
+        try:
+            resultado = engine.processar_lote(self.origem, self.destino, self.config,
+                                              progresso=progresso, aviso=self.aviso.emit,
+                                              logo=self.logo, trabalhadores=self.trabalhadores,
+                                              modo=self.modo,
+                                              cancelar=self._cancelar.is_set, cache=self.cache)
+        except Exception as e:
+            self.falhou.emit(str(e))
+            return
+        self.concluido.emit(resultado)
+
+
+class PreviaWorker(QThread):
+    """Carrega as amostras da prévia em segundo plano
+
+    ``listar`` procura as primeiras imagens da origem (sinal ``amostras``);
+    ``carregar`` decodifica uma amostra e, em seguida, a próxima e a
+    anterior, deixando-as no CachePrevia (sinal ``pronta`` quando a primeira
+    fica disponível). Só o pedido mais recente é atendido: ao trocar de foto
+    rapidamente, as intermediárias não são decodificadas.
+    """
+
+    amostras = pyqtSignal(str, list)  # origem, caminhos
+    pronta = pyqtSignal(str)  # caminho
+    falhou = pyqtSignal(str, str)  # caminho, mensagem
+
+    def __init__(self, cache_previa, parent=None):
+        super().__init__(parent)
+        self.cache_previa = cache_previa
+        self._pedidos = queue.Queue()
+
+    def listar(self, origem, config):
+        self._pedidos.put(("listar", origem, config))
+
+    def carregar(self, caminhos, config):
+        """Carrega ``caminhos[0]`` (a amostra mostrada) e pré-carrega os demais"""
+        self._pedidos.put(("carregar", caminhos, config))
+
+    def parar(self):
+        self._pedidos.put(None)
+        self.wait()
+
+    def _proximos(self):
+        """Pedidos mais recentes de cada tipo (None ao parar)"""
+        pedido = self._pedidos.get()
+        pedidos = {}
+        while pedido is not None:
+            pedidos[pedido[0]] = pedido
+            try:
+                pedido = self._pedidos.get_nowait()
+            except queue.Empty:
+                return pedidos
+        return None  # parar
+
+    def run(self):
+        while True:
+            pedidos = self._proximos()
+            if pedidos is None:
+                return
+            if "listar" in pedidos:
+                _, origem, config = pedidos["listar"]
+                try:
+                    self.amostras.emit(origem, previa.listar_amostras(origem, config))
+                except OSError as e:
+                    self.falhou.emit(origem, str(e))
+            if "carregar" in pedidos:
+                _, caminhos, config = pedidos["carregar"]
+                for indice, caminho in enumerate(caminhos):
+                    if indice and not self._pedidos.empty():
+                        break  # Há um pedido mais novo: o pré-carregamento pode esperar
+                    try:
+                        self.cache_previa.carregar(caminho, config)
+                    except Exception as e:
+                        if indice == 0:
+                            self.falhou.emit(caminho, str(e))
+                        continue
+                    if indice == 0:
+                        self.pronta.emit(caminho)